@@ -0,0 +1,161 @@
+import asyncio
+import functools
+import threading
+import time
+from collections import deque
+
+from flask import jsonify
+
+# Admission control for the HTTP endpoints. Each endpoint class gets its own
+# bounded pool: at most ``max_concurrent`` requests run at once and at most
+# ``max_queue`` wait for a slot. Anything beyond that is rejected immediately
+# with 429 and a Retry-After hint instead of tying up a server thread, and
+# because pools are independent, slow speech calls can never delay agent
+# control endpoints such as /stop.
+
+
+class AdmissionPool:
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float = 10.0):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        # recent queue wait times (seconds) and service times for metrics
+        self._waits = deque(maxlen=512)
+        self._service = deque(maxlen=512)
+
+    def try_acquire(self) -> float | None:
+        """Wait for a slot. Returns the queue time, or None when rejected."""
+        start = time.monotonic()
+        with self._cond:
+            if self.active >= self.max_concurrent:
+                if self.waiting >= self.max_queue:
+                    self.rejected += 1
+                    return None
+                self.waiting += 1
+                try:
+                    deadline = start + self.queue_timeout
+                    while self.active >= self.max_concurrent:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.timed_out += 1
+                            self.rejected += 1
+                            return None
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.active += 1
+            self.admitted += 1
+            waited = time.monotonic() - start
+            self._waits.append(waited)
+            return waited
+
+    async def acquire_async(self, poll_interval: float = 0.02) -> float | None:
+        """asyncio version of try_acquire that never blocks the event loop."""
+        start = time.monotonic()
+        with self._cond:
+            if self.active < self.max_concurrent:
+                self.active += 1
+                self.admitted += 1
+                self._waits.append(0.0)
+                return 0.0
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                return None
+            self.waiting += 1
+        try:
+            while True:
+                await asyncio.sleep(poll_interval)
+                with self._cond:
+                    if self.active < self.max_concurrent:
+                        self.active += 1
+                        self.admitted += 1
+                        waited = time.monotonic() - start
+                        self._waits.append(waited)
+                        return waited
+                    if time.monotonic() - start >= self.queue_timeout:
+                        self.timed_out += 1
+                        self.rejected += 1
+                        return None
+        finally:
+            with self._cond:
+                self.waiting -= 1
+
+    def release(self, service_time: float):
+        with self._cond:
+            self.active -= 1
+            self._service.append(service_time)
+            self._cond.notify()
+
+    def retry_after(self) -> int:
+        """Rough seconds until a queued request would be served."""
+        with self._cond:
+            service = sorted(self._service)
+            typical = service[len(service) // 2] if service else 1.0
+            backlog = (self.waiting + 1) / max(1, self.max_concurrent)
+        return max(1, int(round(typical * backlog)))
+
+    def stats(self) -> dict:
+        with self._cond:
+            waits = sorted(self._waits)
+            service = sorted(self._service)
+
+        def pct(values, q):
+            return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 1) if values else None
+
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "queue_ms_p50": pct(waits, 0.5),
+            "queue_ms_p95": pct(waits, 0.95),
+            "queue_ms_max": pct(waits, 1.0),
+            "service_ms_p50": pct(service, 0.5),
+        }
+
+
+class AdmissionController:
+    def __init__(self):
+        self.pools: dict[str, AdmissionPool] = {}
+
+    def add_pool(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float = 10.0):
+        self.pools[name] = AdmissionPool(name, max_concurrent, max_queue, queue_timeout)
+
+    def limit(self, pool_name: str):
+        """Decorator for Flask views that run inside ``pool_name``.
+
+        Streaming responses release their slot as soon as the view returns;
+        long-lived streams are bounded by their own viewer/stream limits.
+        """
+        pool = self.pools[pool_name]
+
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                waited = pool.try_acquire()
+                if waited is None:
+                    retry = pool.retry_after()
+                    resp = jsonify({"error": f"{pool.name} endpoints are busy", "retry_after": retry})
+                    resp.status_code = 429
+                    resp.headers["Retry-After"] = str(retry)
+                    return resp
+                start = time.monotonic()
+                try:
+                    return view(*args, **kwargs)
+                finally:
+                    pool.release(time.monotonic() - start)
+            return wrapper
+        return decorator
+
+    def stats(self) -> dict:
+        return {name: pool.stats() for name, pool in self.pools.items()}
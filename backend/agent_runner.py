@@ -11,17 +11,33 @@ env_path = project_root / '.env'
 load_dotenv(dotenv_path=env_path)
 
 import time
-from playwright.sync_api import sync_playwright
-from google.genai import errors as genai_errors
-from google import genai
-import re
-from google.genai import types
-from google.genai.types import Content, Part
+import functools
+from typing import TYPE_CHECKING
 from browser_computer import BrowserComputer
 from action_handler import ActionHandler
+from browser_provider import browser_provider_from_env
+import render_profile
+from screencast import ScreencastCapture, capture_backend_from_env, capture_observation
+from spill_store import SpillStore, compact_result, materialize, spill_content
+from loop_detector import ESCALATE, STOP, LoopDetector
+from fanout import (
+    BRANCH_SETTLE_SECONDS, CANCELLED, DONE, FAILED, PENDING, RUNNING, FanOutConfig, FanOutRun, plan_subgoals,
+)
+from tracing import debug_event, get_logger, new_trace_id, set_trace_id, span
+from model_router import ModelRouter
+from checkpoint import SessionCheckpointer
+from page_manager import PageManager
+from genai_client import get_genai_client
 import threading
 import queue
 
+# google.genai and playwright are imported where they are used so importing
+# this module (and booting the API) stays fast.
+if TYPE_CHECKING:
+    from google.genai.types import Content
+
+logger = get_logger("agent")
+
 # default excluded functions list (can be overridden by main if needed)
 excluded_functions = []
 
@@ -29,37 +45,49 @@ excluded_functions = []
 SCREEN_WIDTH = 1440
 SCREEN_HEIGHT = 900
 
-# Playwright/browser placeholders (initialized on FastAPI startup to avoid event-loop conflicts)
-playwright = None
-browser = None
-context = None
-page = None
-
-generate_content_config = genai.types.GenerateContentConfig(
-    tools=[  # type: ignore
-        types.Tool(
-            computerUse=types.ComputerUse(  # type: ignore
-                environment=types.Environment.ENVIRONMENT_BROWSER,
-                excludedPredefinedFunctions=excluded_functions,  # type: ignore
-            )
-        )
-    ]
+# Previous goals kept for the status API
+MAX_GOALS_HISTORY = 20
+
+# Crashes of the agent thread recovered from checkpoints before giving up
+MAX_RECOVERIES = 3
+
+RESUME_NOTE = (
+    "The browser was restarted and the session restored from a checkpoint. "
+    "This is the current screen; continue with the goal from here."
 )
 
-def get_function_responses(page, results):
-    # take a screenshot if possible; failures shouldn't crash the agent
+@functools.lru_cache(maxsize=1)
+def get_generate_content_config():
+    from google.genai import types
+
+    return types.GenerateContentConfig(
+        tools=[  # type: ignore
+            types.Tool(
+                computerUse=types.ComputerUse(  # type: ignore
+                    environment=types.Environment.ENVIRONMENT_BROWSER,
+                    excludedPredefinedFunctions=excluded_functions,  # type: ignore
+                )
+            )
+        ]
+    )
+
+def get_function_responses(page, results, capture=None):
+    from google.genai import types
+
+    # take a screenshot if possible (or reuse the latest screencast frame when
+    # a capture is running); failures shouldn't crash the agent
     try:
-        screenshot_bytes = page.screenshot(type="png")
+        screenshot_bytes, mime_type = capture_observation(page, capture)
     except Exception as e:
-        print("Warning: failed to capture screenshot:", e)
-        screenshot_bytes = b""
+        logger.warning("failed to capture screenshot: %s", e)
+        screenshot_bytes, mime_type = b"", "image/png"
     try:
         current_url = page.url
     except Exception:
         current_url = ""
     function_responses = []
     for name, result in results:
-        print(result)
+        debug_event(logger, "function result", lambda: {"function": name, "result": result})
         response_data = {"url": current_url}
         response_data.update(result)
         function_responses.append(
@@ -69,7 +97,7 @@ def get_function_responses(page, results):
                 parts=[
                     types.FunctionResponsePart(
                         inline_data=types.FunctionResponseBlob(
-                            mime_type="image/png", data=screenshot_bytes
+                            mime_type=mime_type, data=screenshot_bytes
                         )
                     )
                 ]
@@ -92,8 +120,12 @@ def get_safety_confirmation(safety_decision):
     # yea...
     return "CONTINUE"
 
-def execute_function_calls(candidate, page, screen_width, screen_height):
-    """Collects function calls from candidate and executes them using ActionHandler."""
+def execute_function_calls(candidate, page, screen_width, screen_height, settle_last: bool = True):
+    """Collects function calls from candidate and executes them using ActionHandler.
+
+    With ``settle_last=False`` the caller waits for the page to settle after
+    the last action itself (fan-out branches do so without blocking).
+    """
     results = []
     # Safely collect any function_call parts (guard against None/malformed parts)
     parts = getattr(candidate.content, "parts", []) or []
@@ -102,30 +134,34 @@ def execute_function_calls(candidate, page, screen_width, screen_height):
     browser_computer = BrowserComputer(page)
     handler = ActionHandler(browser_computer, screen_width, screen_height)
 
-    for function_call in function_calls:
+    for n, function_call in enumerate(function_calls, 1):
         extra_fr_fields = {}
         action_result = {}
         fname = function_call.name
         args = function_call.args or {}
-        print(f"  -> Executing: {fname} {args}")
+        debug_event(logger, "executing action", lambda: {"function": fname, "args": dict(args)})
 
         # Safety confirmation: if the model included a safety_decision, prompt the user
         if "safety_decision" in args:
             decision = get_safety_confirmation(args["safety_decision"]) if isinstance(args.get("safety_decision"), dict) else get_safety_confirmation(args["safety_decision"])  # type: ignore
             if decision == "TERMINATE":
-                print("Terminating agent loop")
+                logger.info("safety check declined; terminating agent loop")
                 return results, True
             extra_fr_fields["safety_acknowledgement"] = True
 
         try:
-            action_result = handler.handle_action(function_call)
+            with span(logger, "action", function=fname):
+                action_result = handler.handle_action(function_call)
 
-            # Wait for potential navigations/renders
-            page.wait_for_load_state(timeout=5000)
-            time.sleep(1)
+            # Wait for potential navigations/renders. wait_for_timeout (unlike
+            # time.sleep) keeps dispatching Playwright events, so screencast
+            # frames keep arriving while we wait.
+            if settle_last or n < len(function_calls):
+                page.wait_for_load_state(timeout=5000)
+                page.wait_for_timeout(1000)
 
         except Exception as e:
-            print(f"Error executing {fname}: {e}")
+            logger.warning("error executing %s: %s", fname, e)
             action_result = {"error": str(e)}
 
         if extra_fr_fields:
@@ -135,75 +171,11 @@ def execute_function_calls(candidate, page, screen_width, screen_height):
 
     return results, False
 
-# Generate content with the configured settings
-def _extract_retry_seconds_from_error(err_json: dict) -> float | None:
-    # Look for RetryInfo in the error details and parse retryDelay like '30s' or '30.905037304s'
-    try:
-        details = err_json.get("error", {}).get("details", [])
-        for d in details:
-            if d.get("@type", "").endswith("RetryInfo") and "retryDelay" in d:
-                delay = d["retryDelay"]
-                m = re.match(r"([0-9.]+)s", delay)
-                if m:
-                    return float(m.group(1))
-    except Exception:
-        return None
-    return None
-
-def generate_content_with_retries(client, max_attempts: int = 5, **kwargs):
-    backoff = 1.0
-    for attempt in range(1, max_attempts + 1):
-        try:
-            # Debug: print a short summary of the outgoing request to help
-            # diagnose why the Computer Use tool might not be accepted by the API.
-            try:
-                cfg = kwargs.get("config")
-                tools = None
-                tools_desc = None
-                if cfg is not None:
-                    # print a short repr of the config object and its attributes
-                    tools = getattr(cfg, "tools", None) or getattr(cfg, "tool", None) or getattr(cfg, "tools_list", None)
-                    tools_desc = []
-                    if tools:
-                        for t in tools:
-                            # try multiple attribute names that may indicate computer use
-                            if getattr(t, "computerUse", None) is not None or getattr(t, "computer_use", None) is not None:
-                                tools_desc.append("computerUse")
-                            else:
-                                # inspect attributes for useful hints
-                                attrs = [a for a in dir(t) if not a.startswith("__")]
-                                tools_desc.append({"repr": repr(t), "attrs": attrs[:6]})
-                else:
-                    tools_desc = None
-            except Exception as ex:
-                tools_desc = f"error:{ex}"
-            try:
-                kw_keys = list(kwargs.keys())
-            except Exception:
-                kw_keys = None
-            print(f"Calling generate_content: model={kwargs.get('model')} contents_len={len(kwargs.get('contents') or [])} kwargs_keys={kw_keys} config_repr={repr(cfg)[:400]} tools={tools_desc}") # type: ignore
-            return client.models.generate_content(**kwargs)
-        except genai_errors.ClientError as e:
-            # Try to extract a suggested retry delay from the server response
-            resp_json = getattr(e, "response_json", None) or {}
-            retry_seconds = _extract_retry_seconds_from_error(resp_json)
-            if attempt == max_attempts:
-                # Re-raise the exception after max attempts
-                raise
-            wait = retry_seconds if retry_seconds is not None else backoff
-            print(
-                f"API returned {e}. Retrying in {wait:.1f}s (attempt {attempt}/{max_attempts})"
-            )
-            time.sleep(wait)
-            backoff = min(backoff * 2, 60)
-        except Exception:
-            # Non-API errors should bubble up
-            raise
-
 class AgentRunner:
     """Runs the agent loop in a background thread and accepts commands via a queue."""
 
-    def __init__(self, client, page=None, screen_width: int = SCREEN_WIDTH, screen_height: int = SCREEN_HEIGHT):
+    def __init__(self, client=None, page=None, screen_width: int = SCREEN_WIDTH, screen_height: int = SCREEN_HEIGHT,
+                 checkpoint_name: str = "session"):
         self.client = client
         # page will be created inside the agent thread to keep Playwright calls
         # pinned to the same thread/greenlet that starts playwright.
@@ -214,8 +186,13 @@ class AgentRunner:
         self._stop_event = threading.Event()
         self._command_queue: queue.Queue[str] = queue.Queue()
         self._lock = threading.Lock()
-        # conversation contents sent to the model
-        self.contents: list[Content] = []
+        # conversation contents sent to the model; screenshots in it are
+        # markers into ``images`` (see spill_store)
+        self.contents: "list[Content]" = []
+        self.images = SpillStore()
+        # set by update_goal: the agent thread drops images the new
+        # conversation no longer references (see _drop_stale_images)
+        self._images_stale = threading.Event()
         self.running = False
         self.last_results = []
         # Short text summary of the most relevant recent update (finish message or errors)
@@ -223,6 +200,8 @@ class AgentRunner:
         self.current_url = ""
         # Goal tracking: allow updates while agent is running and keep history
         self.current_goal: str | None = None
+        # site scope the current goal was submitted with (answer cache key)
+        self.current_site: str | None = None
         self.goals_history: list[str] = []
         # when True the agent is idle (finished its work) and will wait for new goals
         self.idle = False
@@ -230,18 +209,87 @@ class AgentRunner:
         self._wake_event = threading.Event()
         # Monotonic counter that frontend can poll to detect changes
         self.update_id = 0
+        # Optional CDP screencast capture (CAPTURE_BACKEND=screencast); created
+        # on the agent thread once the page exists.
+        self.capture_backend = capture_backend_from_env()
+        # FAST_RENDER=1: no animations/transitions/smooth scrolling in agent pages
+        self.fast_render = render_profile.fast_render_from_env()
+        # Loop/stall detection per goal (LOOP_DETECTOR=0 disables). After an
+        # escalation observations bypass the screencast and use screenshots.
+        self.loop_detector = LoopDetector.from_env()
+        self._fresh_observations = False
+        # Sub-goal fan-out (FANOUT=1): each new goal is offered to the planner
+        # once; ``fanout_run`` holds the branches of the current goal.
+        self.fanout = FanOutConfig.from_env()
+        # picks model and generation settings per call (MODEL_ROUTES etc.)
+        self.models = ModelRouter.from_env()
+        # Session checkpoints (CHECKPOINT_EVERY=0 disables); ``_resume_state``
+        # is a loaded checkpoint the agent thread restores on startup.
+        self.checkpoints = SessionCheckpointer.from_env(checkpoint_name)
+        self._resume_state: dict | None = None
+        self._session_turns = 0
+        # tabs of the agent's context (TAB_TRACKING=0 disables); ``page``
+        # follows its active page
+        self.pages: PageManager | None = None
+        self.fanout_run: FanOutRun | None = None
+        self._fanout_requested = threading.Event()
+        self.frame_capture: ScreencastCapture | None = None
+        # Frame listeners (e.g. the live view hub) and a flag set by request
+        # threads that want frames even when observations use screenshots.
+        self._frame_listeners = []
+        self._capture_requested = threading.Event()
+        # Trace id of the current session; stamped on every log record the
+        # agent thread emits.
+        self.trace_id: str | None = None
+        # Answer listeners get (goal, finish_text, summary, site) when a goal
+        # finishes successfully without extra commands (feeds the answer
+        # cache). A goal
+        # answered from that cache parks the loop via ``_park_requested``.
+        self._answer_listeners = []
+        # Update listeners get (update_id, text) whenever the text shown to
+        # the student settles (after summarization), e.g. to pre-generate TTS.
+        self._update_listeners = []
+        self._goal_commands = 0
+        self._park_requested = threading.Event()
+        # when the agent thread last made progress; None while it waits on
+        # the model (see progress_age)
+        self._progress_at: float | None = time.monotonic()
 
-    def start(self, initial_goal: str | None = None):
+    def start(self, initial_goal: str | None = None, resume: bool = False, site: str | None = None):
+        """Start the agent thread. With ``resume`` the session continues
+        from the last checkpoint if there is one (its goal wins over
+        ``initial_goal``)."""
         with self._lock:
             if self.running:
                 raise RuntimeError("Agent already running")
+            if self.client is None:
+                # raises RuntimeError when GOOGLE_API_KEY is missing
+                self.client = get_genai_client()
+            self._resume_state = None
+            if self.checkpoints is not None:
+                if resume:
+                    self._resume_state = self.checkpoints.load()
+                else:
+                    # a new session must never recover into an old one
+                    self.checkpoints.discard()
+            if self._resume_state is not None:
+                initial_goal = self._resume_state.get("current_goal")
+                site = self._resume_state.get("current_site")
             # set the current goal (initial contents will be created by the
             # agent thread once Playwright/page are initialized)
             self.current_goal = initial_goal
+            self.current_site = site
+            self._reset_goal_tracking()
             if initial_goal:
                 self.goals_history = [initial_goal]
             # mark start requested and launch thread which will create page
             self._stop_event.clear()
+            self._mark_progress()
+            # a resumed session keeps its trace id, which also identifies its
+            # checkpoints (see _load_checkpoint)
+            resumed_id = self._resume_state.get("trace_id") if self._resume_state is not None else None
+            self.trace_id = resumed_id or new_trace_id()
+            logger.info("starting agent session", extra={"fields": {"session_trace_id": self.trace_id}})
             self._thread = threading.Thread(target=self._run_loop, daemon=True)
             self._thread.start()
             self.running = True
@@ -251,6 +299,169 @@ class AgentRunner:
         if self._thread:
             self._thread.join(timeout=5)
         self.running = False
+        # the session was ended on purpose: nothing to resume
+        if self.checkpoints is not None:
+            self.checkpoints.discard()
+
+    def _mark_progress(self):
+        self._progress_at = time.monotonic()
+
+    def progress_age(self) -> float:
+        """Seconds the agent thread has spent in its current browser step;
+        0 while idle, stopped or waiting on the model. A hung Chromium or a
+        stuck page call shows up here (used as the worker heartbeat)."""
+        at = self._progress_at
+        if not self.running or self.idle or at is None:
+            return 0.0
+        return time.monotonic() - at
+
+    def add_frame_listener(self, fn):
+        """Register ``fn(frame)`` to receive screencast frames of the agent page."""
+        self._frame_listeners.append(fn)
+        if self.frame_capture is not None:
+            self.frame_capture.add_listener(fn)
+
+    def request_capture(self):
+        """Ask the agent thread to start the screencast (used by live viewers)."""
+        self._capture_requested.set()
+
+    def release_capture(self):
+        """The last live viewer left; the agent thread stops a screencast
+        that only ran for viewers."""
+        self._capture_requested.clear()
+
+    def _ensure_capture(self):
+        # Must run on the agent thread: CDP sessions are Playwright objects.
+        wanted = self.capture_backend == "screencast" or self._capture_requested.is_set()
+        if self.frame_capture is not None and not wanted:
+            self.frame_capture.stop()
+            self.frame_capture = None
+            return
+        if self.frame_capture is not None or self.page is None or not wanted:
+            return
+        capture = ScreencastCapture(self.page, image_format=os.getenv("SCREENCAST_FORMAT", "png"))
+        for fn in self._frame_listeners:
+            capture.add_listener(fn)
+        if capture.start():
+            self.frame_capture = capture
+
+    def _observation_capture(self):
+        """Capture to read observations from, or None to use page.screenshot."""
+        if self._fresh_observations:
+            return None
+        return self.frame_capture if self.capture_backend == "screencast" else None
+
+    def _reset_goal_tracking(self):
+        self._goal_commands = 0
+        self._park_requested.clear()
+        self._fresh_observations = False
+        if self.loop_detector is not None:
+            self.loop_detector.reset()
+        self.fanout_run = None
+        self._fanout_requested.clear()
+        if self.fanout is not None and self.fanout.qualifies(self.current_goal):
+            self._fanout_requested.set()
+
+    def _check_progress(self, candidate, function_responses):
+        """Feed this turn to the loop detector; returns its verdict or None."""
+        if self.loop_detector is None:
+            return None
+        parts = getattr(candidate.content, "parts", []) or []
+        actions = [
+            (p.function_call.name, dict(p.function_call.args or {}))
+            for p in parts if getattr(p, "function_call", None)
+        ]
+        screenshot = b""
+        url = ""
+        for fr in function_responses:
+            url = (fr.response or {}).get("url", url)
+            for fr_part in fr.parts or []:
+                if fr_part.inline_data is not None and fr_part.inline_data.data:
+                    screenshot = fr_part.inline_data.data
+        verdict = self.loop_detector.observe(actions, screenshot, url)
+        if verdict is not None:
+            logger.info("no progress detected", extra={"fields": {"level": verdict.level, "reason": verdict.reason}})
+            if verdict.level == ESCALATE:
+                self._fresh_observations = True
+        return verdict
+
+    def _turn_type(self) -> str:
+        """Routing feature of the next turn: "first", "command", "error" or "continue"."""
+        if len(self.contents) <= 1:
+            return "first"
+        last = self.contents[-1]
+        if last.role == "user" and not any(getattr(p, "function_response", None) for p in last.parts or []):
+            return "command"
+        if any(isinstance(res, dict) and res.get("error") for _, res in self.last_results):
+            return "error"
+        return "continue"
+
+    def _pump_events(self):
+        # Let Playwright dispatch pending CDP events (screencast frames) while
+        # the agent thread is otherwise blocked outside Playwright.
+        if self.frame_capture is not None and self.page is not None:
+            try:
+                self.page.wait_for_timeout(1)
+            except Exception:
+                pass
+
+    def snapshot(self, debug: bool = False) -> dict:
+        """Return a JSON-serializable view of the agent state for the API."""
+        page = getattr(self, "page", None)
+        try:
+            page_url = page.url if page is not None else ""
+        except Exception:
+            page_url = ""
+        snap = {
+            "running": self.running,
+            "last_results": self.last_results,
+            "current_url": page_url,
+            "current_goal": self.current_goal,
+            "goals_history": self.goals_history,
+            "update_id": self.update_id,
+            "relevant_update": self.relevant_update,
+            "trace_id": self.trace_id,
+            "fanout": self.fanout_run.view() if self.fanout_run is not None else None,
+            "tabs": self.pages.view() if self.pages is not None else None,
+        }
+        if not debug:
+            return snap
+
+        thread_alive = False
+        try:
+            t = self._thread
+            thread_alive = bool(t is not None and t.is_alive())
+        except Exception:
+            thread_alive = False
+
+        # Build a small preview of the latest contents (texts only)
+        preview = []
+        try:
+            for c in (self.contents or [])[-6:]:
+                # collect text parts where available
+                parts = []
+                for p in getattr(c, 'parts', []) or []:
+                    t = getattr(p, 'text', None)
+                    if t:
+                        parts.append(t)
+                preview.append({'role': getattr(c, 'role', None), 'texts': parts})
+        except Exception:
+            preview = []
+
+        snap.update({
+            "thread_alive": thread_alive,
+            "contents_len": len(self.contents) if self.contents is not None else 0,
+            "contents_preview": preview,
+            "frame_capture": self.frame_capture.stats() if self.frame_capture is not None else None,
+            "browser": self.browser_provider.stats() if getattr(self, "browser_provider", None) is not None else None,
+            "images": self.images.stats(),
+            "fast_render": self.fast_render,
+            "loop_detector": self.loop_detector.stats() if self.loop_detector is not None else None,
+            "models": self.models.stats(),
+            "checkpoint": self.checkpoints.stats() if self.checkpoints is not None else None,
+            "page_url": page_url,
+        })
+        return snap
 
     def enqueue_command(self, cmd: str):
         self._command_queue.put(cmd)
@@ -258,17 +469,26 @@ class AgentRunner:
         with self._lock:
             self.update_id += 1
 
-    def update_goal(self, new_goal: str):
+    def update_goal(self, new_goal: str, site: str | None = None):
         """Update the agent's current goal while it's running. Keeps history and
         appends the new goal to the conversation so the model will see it.
         """
         # Reset the agent's conversation to only include the newest goal so
         # the model focuses on the new instruction. Wake the agent if it was idle.
+        from google.genai.types import Content, Part
+
         screenshot_bytes = b""
+        mime_type = "image/png"
         try:
-            # try to capture a fresh screenshot if the page is available
+            # Prefer the latest screencast frame: it needs no Playwright call,
+            # which matters because this runs on a request thread, not the
+            # agent thread. Otherwise try a fresh screenshot.
+            capture = self._observation_capture()
+            frame = capture.latest() if capture is not None else None
             p = getattr(self, 'page', None)
-            if p is not None and hasattr(p, 'screenshot'):
+            if frame is not None:
+                screenshot_bytes, mime_type = frame.data, frame.mime_type
+            elif p is not None and hasattr(p, 'screenshot'):
                 try:
                     screenshot_bytes = p.screenshot(type="png")
                 except Exception:
@@ -281,17 +501,85 @@ class AgentRunner:
             # only append previous goal if it's different from the new one
             if prev is not None and prev != new_goal:
                 self.goals_history.append(prev)
+                del self.goals_history[:-MAX_GOALS_HISTORY]
             self.current_goal = new_goal
+            self.current_site = site
             # reset conversation contents to only the new goal (and screenshot)
             parts = [Part.from_text(text=new_goal)]
             if screenshot_bytes:
-                parts.append(Part.from_bytes(data=screenshot_bytes, mime_type="image/png"))
+                parts.append(Part.from_bytes(data=screenshot_bytes, mime_type=mime_type))
+            # the agent thread may be using the store; it spills this content
+            # and drops the old images itself at its next turn
             self.contents = [Content(role="user", parts=parts)]
+            self._images_stale.set()
+            self._reset_goal_tracking()
             # mark agent as active (wake) and bump update id
             self.idle = False
             self._wake_event.set()
             self.update_id += 1
 
+    def add_answer_listener(self, fn):
+        """Register ``fn(goal, finish_text, summary, site)`` for successfully
+        finished goals."""
+        self._answer_listeners.append(fn)
+
+    def add_update_listener(self, fn):
+        """Register ``fn(update_id, text)`` for settled relevant_updates."""
+        self._update_listeners.append(fn)
+
+    def _notify_update(self, update_id: int, text: str):
+        for fn in list(self._update_listeners):
+            try:
+                fn(update_id, text)
+            except Exception as e:
+                logger.warning("update listener failed: %s", e)
+
+    def publish_answer(self, goal: str, answer: str):
+        """Make ``goal`` current and show ``answer`` for it without running
+        the model (answer cache hit). A running agent stops working on its
+        previous goal and waits for the next one."""
+        with self._lock:
+            prev = self.current_goal
+            if prev is not None and prev != goal:
+                self.goals_history.append(prev)
+                del self.goals_history[:-MAX_GOALS_HISTORY]
+            self.current_goal = goal
+            self.relevant_update = answer
+            self.update_id += 1
+            update_id = self.update_id
+            if self.running and not self.idle:
+                self._park_requested.set()
+        self._notify_update(update_id, answer)
+
+    def _emit_answer(self, finish_text: str):
+        with self._lock:
+            goal, site = self.current_goal, self.current_site
+        if not goal or self._goal_commands or self._park_requested.is_set():
+            return
+        for fn in list(self._answer_listeners):
+            try:
+                fn(goal, finish_text, self.relevant_update, site)
+            except Exception as e:
+                logger.warning("answer listener failed: %s", e)
+
+    def _wait_for_new_goal(self):
+        """Idle until update_goal wakes the agent (or it is stopped)."""
+        with self._lock:
+            self.idle = True
+        self._park_requested.clear()
+        # clear any previous wake event then wait (wake by update_goal)
+        self._wake_event.clear()
+        # wait until wake or stop; timeout to re-check stop_event periodically
+        while not self._stop_event.is_set():
+            # keep live viewers fed while idle
+            self._ensure_capture()
+            self._pump_events()
+            # wait returns True if event is set
+            if self._wake_event.wait(timeout=0.2 if self.frame_capture is not None else 1.0):
+                break
+        with self._lock:
+            self.idle = False
+
     def _set_relevant_update(self, msg: str | None):
         """Set a short, de-duplicated relevant_update and bump update_id.
 
@@ -321,24 +609,31 @@ class AgentRunner:
                 return
             self.relevant_update = s
             self.update_id += 1
+            update_id = self.update_id
+
+        if skip_summarize:
+            self._notify_update(update_id, s)
+            return
 
         # After releasing the lock, call the regular (non-computer-use) Gemini
         # model to produce a concise, student-focused summary of the relevant
         # update. Avoid recursion by allowing this call to set the summary
         # with skip_summarize=True.
-        if not skip_summarize:
-            try:
-                summary = self._summarize_relevant_update(s)
-                if summary:
-                    # Only set if the summary meaningfully differs to avoid
-                    # extra API calls / update churn. Use skip_summarize to
-                    # prevent re-entering this block.
-                    if summary.strip() and summary.strip() != s:
-                        # Use tuple form to pass skip flag
-                        self._set_relevant_update((summary, True)) # type: ignore
-            except Exception as e:
-                # Don't let summarization failures break the agent; just log
-                print(f"Warning: summarization failed: {e}")
+        try:
+            summary = self._summarize_relevant_update(s)
+            if summary:
+                # Only set if the summary meaningfully differs to avoid
+                # extra API calls / update churn. Use skip_summarize to
+                # prevent re-entering this block.
+                if summary.strip() and summary.strip() != s:
+                    # Use tuple form to pass skip flag
+                    self._set_relevant_update((summary, True)) # type: ignore
+                    return
+        except Exception as e:
+            # Don't let summarization failures break the agent; just log
+            logger.warning("summarization failed: %s", e)
+        # no summary replaced the text: it is what the student will hear
+        self._notify_update(update_id, s)
 
     def _summarize_relevant_update(self, text: str) -> str | None:
         """Call the regular Gemini API to produce a concise summary.
@@ -354,94 +649,457 @@ class AgentRunner:
                 "Remove any unnecessary jargon such as related to completing steps, repetition, or filler words. Focus on clarity and conciseness." \
             )
 
-            contents = [
-                Content(role="system", parts=[Part.from_text(text=system_instr)]),
-                Content(role="user", parts=[Part.from_text(text=text)]),
-            ]
-
-            api_key = os.getenv("GOOGLE_API_KEY")
-            client = genai.Client(api_key=api_key)
+            client = get_genai_client()
 
-            response = client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=system_instr + "\n" + text
-            )
+            with span(logger, "summarize"):
+                response = self.models.generate(
+                    client, "summary", contents=system_instr + "\n" + text, max_attempts=1
+                )
 
             return response.text
         except Exception as e:
-            print(f"Error summarizing relevant_update: {e}")
+            logger.warning("error summarizing relevant_update: %s", e)
+            return None
+
+    def _new_context(self, storage_state: dict | None = None):
+        options = render_profile.context_options(self.fast_render)
+        if storage_state:
+            options["storage_state"] = storage_state
+        context = self.browser.new_context(  # type: ignore
+            viewport={"width": self.screen_width, "height": self.screen_height},
+            **options,
+        )
+        render_profile.apply_to_context(context, self.fast_render)
+        return context
+
+    def _open_browser(self, url: str | None, storage_state: dict | None = None):
+        """Acquire a browser from the provider and open a fresh page on ``url``
+        (with the cookies/local storage of ``storage_state``, if given)."""
+        self.browser = self.browser_provider.acquire()  # type: ignore
+        self.context = self._new_context(storage_state)
+        self.page = self.context.new_page()
+        self.pages = PageManager.from_env(self.context, self.page)
+        if url:
+            try:
+                self.page.goto(url)
+            except Exception as e:
+                logger.warning("failed to open %s: %s", url, e)
+        self._ensure_capture()
+
+    def _reconnect_browser_if_needed(self):
+        """Replace a crashed or disconnected browser, resuming at the last URL."""
+        try:
+            if self.browser is not None and self.browser.is_connected():
+                return
+        except Exception:
+            pass
+        logger.warning("browser disconnected; acquiring a new one")
+        try:
+            last_url = self.page.url if self.page is not None else None
+        except Exception:
+            last_url = None
+        if self.frame_capture is not None:
+            self.frame_capture.stop()
+            self.frame_capture = None
+        if self.browser is not None:
+            self.browser_provider.release(self.browser, failed=True)  # type: ignore
+        self.browser = self.context = self.page = self.pages = None
+        checkpoint = self._load_checkpoint()
+        self._open_browser(
+            last_url or "https://www.google.com/",
+            storage_state=checkpoint.get("storage_state") if checkpoint else None,
+        )
+        if self.contents:
+            # show the model the fresh page before its next turn
+            self.contents.append(self._resume_content())
+        self._set_relevant_update(("Browser connection was lost and has been restored.", True))  # type: ignore
+
+    def _sync_pages(self) -> dict | None:
+        """Point ``page`` (and the screencast) at the active tab; returns
+        the switch when a popup or new tab took over or the tab closed."""
+        if self.pages is None:
+            return None
+        switch = self.pages.sync()
+        if self.pages.active is not self.page:
+            self.page = self.pages.active
+            if self.frame_capture is not None:
+                self.frame_capture.stop()
+                self.frame_capture = None
+            self._ensure_capture()
+        return switch
+
+    def _resume_content(self) -> "Content":
+        from google.genai.types import Content, Part
+
+        try:
+            screenshot, mime_type = capture_observation(self.page, None)
+        except Exception as e:
+            logger.warning("failed to take resume screenshot: %s", e)
+            screenshot, mime_type = b"", "image/png"
+        parts = [Part.from_text(text=RESUME_NOTE)]
+        if screenshot:
+            parts.append(Part.from_bytes(data=screenshot, mime_type=mime_type))
+        return spill_content(Content(role="user", parts=parts), self.images)
+
+    def _load_checkpoint(self) -> dict | None:
+        """This session's last checkpoint; None if there is none or it was
+        written by another session."""
+        if self.checkpoints is None:
             return None
+        return self.checkpoints.load(session_id=self.trace_id)
+
+    def _save_checkpoint(self, idle: bool = False):
+        """Write a checkpoint of the session (agent thread only)."""
+        if self.checkpoints is None:
+            return
+        try:
+            storage_state = self.context.storage_state() if self.context is not None else None
+        except Exception as e:
+            logger.warning("failed to read storage state: %s", e)
+            storage_state = None
+        try:
+            url = self.page.url if self.page is not None else ""
+        except Exception:
+            url = ""
+        with span(logger, "checkpoint"):
+            self.checkpoints.save({
+                "trace_id": self.trace_id,
+                "current_goal": self.current_goal,
+                "current_site": self.current_site,
+                "goals_history": list(self.goals_history),
+                "relevant_update": self.relevant_update,
+                "url": url,
+                "storage_state": storage_state,
+                "commands": list(self._command_queue.queue),
+                "idle": idle,
+                "contents": list(self.contents),
+            })
+
+    def _restore_session(self, state: dict):
+        """Continue a checkpointed session in the freshly opened page."""
+        from google.genai.types import Content, Part
+
+        with self._lock:
+            self.current_goal = state.get("current_goal")
+            self.current_site = state.get("current_site")
+            self.goals_history = state.get("goals_history") or []
+            self.relevant_update = state.get("relevant_update")
+            self.images.clear()
+            contents = state.get("contents") or [Content(role="user", parts=[Part.from_text(text=self.current_goal or "")])]
+            self.contents = contents + [self._resume_content()]
+            self.update_id += 1
+        for cmd in state.get("commands") or []:
+            self._command_queue.put(cmd)
+        logger.info("session restored from checkpoint", extra={"fields": {
+            "contents_len": len(self.contents),
+            "age_s": round(time.time() - state.get("saved_at", time.time()), 1),
+        }})
+
+    def _drop_stale_images(self):
+        """Reset the spill store to the images of the current conversation
+        after a goal update (agent thread only)."""
+        if not self._images_stale.is_set():
+            return
+        with self._lock:
+            self._images_stale.clear()
+            contents = materialize(self.contents, self.images)
+            self.images.clear()
+            self.contents = [spill_content(c, self.images) for c in contents]
+
+    def _fanout_abandoned(self, goal: str | None) -> bool:
+        return self._stop_event.is_set() or self._park_requested.is_set() or self.current_goal != goal
+
+    def _run_fanout(self, goal: str | None) -> bool:
+        """Run ``goal`` as parallel sub-goals if the planner splits it.
+
+        Returns False when the goal should run as one conversation. Branch
+        pages are only touched on this (the agent) thread, so the branches'
+        actions run one after another; their model calls run in a small
+        thread pool meanwhile, and the wait for a page to settle after its
+        actions does not hold up the other branches.
+        """
+        from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+        self._progress_at = None
+        subgoals = plan_subgoals(self.models, self.client, goal, self.fanout.max_branches)  # type: ignore
+        self._mark_progress()
+        if not subgoals or self._fanout_abandoned(goal):
+            return False
+        run = FanOutRun(goal, subgoals)  # type: ignore
+        with self._lock:
+            self.fanout_run = run
+            self.update_id += 1
+        logger.info("fanning out goal", extra={"fields": {"branches": len(subgoals)}})
+        pending = list(run.branches)
+        active = []
+        executor = ThreadPoolExecutor(max_workers=self.fanout.parallelism, thread_name_prefix="fanout")  # type: ignore
+        try:
+            while (pending or active) and not self._fanout_abandoned(goal):
+                while pending and len(active) < self.fanout.parallelism:  # type: ignore
+                    branch = pending.pop(0)
+                    self._start_branch(run, branch, executor)
+                    if branch.status == RUNNING:
+                        active.append(branch)
+                if not active:
+                    continue
+                timeout = 0.2
+                settling = [b.settle_until for b in active if b.settle_until is not None]
+                if settling:
+                    timeout = min(timeout, max(0.0, min(settling) - time.monotonic()))
+                futures = [b.future for b in active if b.settle_until is None]
+                if futures:
+                    done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+                else:
+                    done = set()
+                    time.sleep(timeout)
+                self._mark_progress()
+                self._pump_events()
+                now = time.monotonic()
+                for branch in [b for b in active if b.settle_until is not None and b.settle_until <= now]:
+                    self._observe_branch(run, branch, executor)
+                for branch in [b for b in active if b.settle_until is None and b.future in done]:
+                    if not self._step_branch(run, branch, executor):
+                        active.remove(branch)
+                        self._close_branch(branch)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            for branch in run.branches:
+                if branch.status in (PENDING, RUNNING):
+                    run.finish(branch, CANCELLED)
+                self._close_branch(branch)
+            run.elapsed = time.monotonic() - run.started
+            with self._lock:
+                self.update_id += 1
+
+        logger.info("fan-out finished", extra={"fields": {
+            "branches": len(run.branches),
+            "done": sum(1 for b in run.branches if b.status == DONE),
+            "elapsed_s": round(run.elapsed, 2),
+        }})
+        if self._fanout_abandoned(goal):
+            return True
+        from google.genai.types import Content, Part
+
+        merged = run.merged_text()
+        # keep the merged result in the main conversation for follow-ups
+        self.contents.append(Content(role="model", parts=[Part.from_text(text=merged)]))
+        self._set_relevant_update(merged)
+        # only a complete result is worth serving again
+        if all(branch.status == DONE for branch in run.branches):
+            self._emit_answer(merged)
+        return True
+
+    def _submit_branch_turn(self, branch, executor):
+        contents = materialize(branch.contents, self.images)
+        branch.future = executor.submit(
+            self.models.generate,
+            self.client,
+            "turn",
+            contents=contents,
+            config=get_generate_content_config(),
+            turn_type="first" if branch.turns == 0 else "continue",
+        )
+
+    def _start_branch(self, run: FanOutRun, branch, executor):
+        """Open the branch's context and submit its first model turn."""
+        from google.genai.types import Content, Part
+
+        try:
+            context = self._new_context()
+            page = context.new_page()
+            run.update(branch, context=context, page=page, pages=PageManager.from_env(context, page),
+                       status=RUNNING, started=time.monotonic())
+            page.goto("https://www.google.com/")
+            screenshot, mime_type = capture_observation(page, None)
+        except Exception as e:
+            logger.warning("failed to open branch %d: %s", branch.index, e)
+            run.finish(branch, FAILED, error=str(e))
+            self._close_branch(branch)
+            return
+        branch.contents = [spill_content(Content(role="user", parts=[
+            Part.from_text(text=branch.goal),
+            Part.from_bytes(data=screenshot, mime_type=mime_type),
+        ]), self.images)]
+        self._submit_branch_turn(branch, executor)
+
+    def _step_branch(self, run: FanOutRun, branch, executor) -> bool:
+        """Apply a branch's model response: run its actions and let the page
+        settle (see _observe_branch). Returns False once the branch has
+        finished."""
+        try:
+            candidate = branch.future.result().candidates[0]
+        except Exception as e:
+            logger.warning("branch %d model call failed: %s", branch.index, e)
+            run.finish(branch, FAILED, error=str(e))
+            return False
+        branch.contents.append(candidate.content)
+        parts = getattr(candidate.content, "parts", []) or []
+        if not any(part.function_call for part in parts):
+            run.finish(branch, DONE, text=" ".join(part.text for part in parts if part.text))
+            return False
+        if branch.turns >= self.fanout.branch_turns:  # type: ignore
+            run.finish(branch, FAILED, error="turn limit reached")
+            return False
+        results, terminated = execute_function_calls(
+            candidate, branch.page, self.screen_width, self.screen_height, settle_last=False
+        )
+        if terminated:
+            run.finish(branch, FAILED, error="declined by safety decision")
+            return False
+        run.update(branch, results=results, settle_until=time.monotonic() + BRANCH_SETTLE_SECONDS)
+        return True
+
+    def _observe_branch(self, run: FanOutRun, branch, executor):
+        """Send a settled branch page back to the model as its next turn."""
+        from google.genai.types import Content, Part
+
+        try:
+            branch.page.wait_for_load_state(timeout=5000)
+        except Exception:
+            pass
+        results, branch.results = branch.results, []
+        if branch.pages is not None:
+            branch.pages.sync()
+            run.update(branch, page=branch.pages.active)
+        function_responses = get_function_responses(branch.page, results)
+        branch.contents.append(spill_content(Content(role="user", parts=[
+            Part.from_function_response(name=fr.name, response=fr.response, parts=getattr(fr, "parts", None))
+            for fr in function_responses
+        ]), self.images))
+        run.update(branch, turns=branch.turns + 1, settle_until=None)
+        with self._lock:
+            self.update_id += 1
+        self._submit_branch_turn(branch, executor)
+
+    def _close_branch(self, branch):
+        context, page = branch.context, branch.page
+        if page is not None:
+            try:
+                branch.url = page.url
+            except Exception:
+                pass
+        branch.context = branch.page = branch.pages = None
+        if context is not None:
+            try:
+                context.close()
+            except Exception:
+                pass
 
     def _run_loop(self):
+        set_trace_id(self.trace_id)
+        recoveries = 0
+        while True:
+            try:
+                self._run_session()
+                return
+            except Exception as e:
+                logger.exception("agent session crashed")
+                state = self._load_checkpoint()
+                if state is None or self._stop_event.is_set() or recoveries >= MAX_RECOVERIES:
+                    self._set_relevant_update((f"The agent stopped after an error: {e}", True))  # type: ignore
+                    self.running = False
+                    return
+                recoveries += 1
+                logger.warning("resuming session from checkpoint (recovery %d/%d)", recoveries, MAX_RECOVERIES)
+                self._resume_state = state
+
+    def _run_session(self):
         # persistent loop: try to complete current goal, and accept commands
         # Initialize Playwright and the page inside this thread so all
         # Playwright sync calls are made from the same thread/greenlet.
         self.playwright = None
+        self.browser_provider = None
         self.browser = None
         self.context = None
+        self.frame_capture = None
         try:
-            print("Agent thread: initializing Playwright...")
+            from google.genai.types import Content, Part
+            from playwright.sync_api import sync_playwright
+
+            logger.info("agent thread: initializing Playwright")
             self.playwright = sync_playwright().start()
-            # Allow running headless via environment to support containers/CI.
-            headless_env = os.getenv("HEADLESS", "0")
-            print(f"HEADLESS env var: '{headless_env}'")
-            headless_flag = not (headless_env.lower() in ("0", "false", "no"))
-            print(f"Launching browser with headless={headless_flag}")
-            self.browser = self.playwright.chromium.launch(headless=headless_flag)
-            self.context = self.browser.new_context(viewport={"width": self.screen_width, "height": self.screen_height})
-            self.page = self.context.new_page()
-            try:
-                self.page.goto("https://www.google.com/")
-            except Exception as e:
-                print(f"Warning: failed to open google.com on startup: {e}")
+            # Browsers are launched locally (HEADLESS controls headless mode)
+            # or taken from the BROWSER_ENDPOINTS pool of browser servers.
+            self.browser_provider = browser_provider_from_env(
+                self.playwright, launch_args=render_profile.launch_args(self.fast_render)
+            )
+            resume, self._resume_state = self._resume_state, None
+            if resume is not None:
+                self._open_browser(resume.get("url") or "https://www.google.com/", resume.get("storage_state"))
+                self._restore_session(resume)
+            else:
+                self._open_browser("https://www.google.com/")
 
-            # Build initial contents using a fresh screenshot taken on this thread
-            try:
-                initial_screenshot = self.page.screenshot(type="png")
-            except Exception as e:
-                print("Warning: failed to take initial screenshot:", e)
-                initial_screenshot = b""
+                # Build initial contents using a fresh screenshot taken on this thread
+                try:
+                    initial_screenshot, initial_mime = capture_observation(self.page, self._observation_capture())
+                except Exception as e:
+                    logger.warning("failed to take initial screenshot: %s", e)
+                    initial_screenshot, initial_mime = b"", "image/png"
 
-            # Prepare initial conversation contents
-            if self.current_goal:
-                self.contents = [
-                    Content(role="user", parts=[
-                        Part.from_text(text=self.current_goal),
-                        Part.from_bytes(data=initial_screenshot, mime_type="image/png"),
-                    ])
-                ]
-            else:
+                # Prepare initial conversation contents
+                self.images.clear()
                 self.contents = [
-                    Content(role="user", parts=[
-                        Part.from_text(text=""),
-                        Part.from_bytes(data=initial_screenshot, mime_type="image/png"),
-                    ])
+                    spill_content(Content(role="user", parts=[
+                        Part.from_text(text=self.current_goal or ""),
+                        Part.from_bytes(data=initial_screenshot, mime_type=initial_mime),
+                    ]), self.images)
                 ]
-            # bump update_id to reflect new initial state
-            with self._lock:
-                self.update_id += 1
+                # bump update_id to reflect new initial state
+                with self._lock:
+                    self.update_id += 1
+            if resume is not None and resume.get("idle"):
+                # the checkpointed goal had already finished
+                self._wait_for_new_goal()
 
             while not self._stop_event.is_set():
                 turn_limit = 100
                 for i in range(turn_limit):
                     if self._stop_event.is_set():
                         break
-                    print(f"\n--- Turn {i+1} ---")
-                    print("Thinking...")
+                    self._mark_progress()
+                    self._drop_stale_images()
+                    try:
+                        self._reconnect_browser_if_needed()
+                    except Exception as e:
+                        err_msg = f"Error reconnecting browser: {e}"
+                        logger.error(err_msg)
+                        self._set_relevant_update(err_msg)
+                        time.sleep(2)
+                        continue
+                    self._sync_pages()
+                    self._ensure_capture()
+                    if self._park_requested.is_set():
+                        # the new goal was answered from the cache
+                        self._wait_for_new_goal()
+                        continue
+                    if self._fanout_requested.is_set():
+                        self._fanout_requested.clear()
+                        goal = self.current_goal
+                        if self._run_fanout(goal):
+                            if not self._fanout_abandoned(goal):
+                                self._save_checkpoint(idle=True)
+                                self._wait_for_new_goal()
+                            continue
+                    logger.debug("turn %d: thinking", i + 1)
+                    # model calls have their own timeouts and retries
+                    self._progress_at = None
                     try:
-                        response = generate_content_with_retries(
+                        response = self.models.generate(
                             self.client,
-                            model="gemini-2.5-computer-use-preview-10-2025",
-                            contents=self.contents,  # type: ignore
-                            config=generate_content_config,
+                            "turn",
+                            contents=materialize(self.contents, self.images),  # type: ignore
+                            config=get_generate_content_config(),
+                            turn_type=self._turn_type(),
                         )
                     except Exception as e:
                                 err_msg = f"Error generating content: {e}"
-                                print(err_msg)
+                                logger.error(err_msg)
                                 # publish a concise relevant update for the frontend
                                 self._set_relevant_update(err_msg)
                                 time.sleep(1)
                                 continue
+                    self._mark_progress()
 
                     candidate = response.candidates[0]  # type: ignore
                     # new model candidate arrived
@@ -454,69 +1112,83 @@ class AgentRunner:
                     has_function_calls = any(part.function_call for part in content_parts)
                     if not has_function_calls:
                         text_response = " ".join([part.text for part in content_parts if part.text])
-                        print("Agent finished:", text_response)
-                        # set relevant_update to the finishing text so frontend can surface it
-                        self._set_relevant_update(text_response)
-                        # mark idle and wait until a new goal wakes the agent
-                        with self._lock:
-                            self.idle = True
-                        # clear any previous wake event then wait (wake by update_goal)
-                        self._wake_event.clear()
-                        # wait until wake or stop; timeout to re-check stop_event periodically
-                        while not self._stop_event.is_set():
-                            # wait returns True if event is set
-                            if self._wake_event.wait(timeout=1.0):
-                                break
-                        # woke up -> continue outer loop to handle new goal
-                        with self._lock:
-                            self.idle = False
+                        logger.info("agent finished", extra={"fields": {
+                            "turn": i + 1,
+                            "response_chars": len(text_response),
+                            "wasted_turns": self.loop_detector.wasted_turns if self.loop_detector is not None else None,
+                        }})
+                        # a cached answer for a newer goal is already showing
+                        if not self._park_requested.is_set():
+                            # set relevant_update to the finishing text so frontend can surface it
+                            self._set_relevant_update(text_response)
+                            # a truncated or blocked finish is not an answer
+                            finish_reason = getattr(candidate, "finish_reason", None)
+                            if getattr(finish_reason, "name", finish_reason) in (None, "STOP"):
+                                self._emit_answer(text_response)
+                        self._save_checkpoint(idle=True)
+                        # mark idle and wait until a new goal wakes the agent,
+                        # then continue the outer loop to handle it
+                        self._wait_for_new_goal()
                         continue
 
-                    print("Executing actions...")
                     results, terminated = execute_function_calls(
                         candidate, self.page, self.screen_width, self.screen_height
                     )
-                    self.last_results = results
+                    switch = self._sync_pages()
+                    if switch is not None and results:
+                        # tell the model the screen now shows another tab
+                        results[-1][1]["tab_switch"] = switch
+                    self.last_results = [(fname, compact_result(res)) for fname, res in results]
                     # If any function execution returned an error, publish a short relevant_update
                     try:
                         for fname, res in results:
                             if isinstance(res, dict) and res.get("error"):
                                 err_msg = f"Error executing {fname}: {res.get('error')}"
-                                print(err_msg)
+                                logger.warning(err_msg)
                                 self._set_relevant_update(err_msg)
                                 break
                     except Exception:
                         pass
                     if terminated:
                         term_msg = "Agent loop terminated by user safety decision."
-                        print(term_msg)
+                        logger.info(term_msg)
                         self._set_relevant_update(term_msg)
                         break
 
-                    print("Capturing state...")
-                    function_responses = get_function_responses(self.page, results)
-
-                    self.contents.append(
-                        Content(
-                            role="user",
-                            parts=[
-                                Part.from_function_response(
-                                    name=fr.name, response=fr.response, parts=getattr(fr, "parts", None)
-                                )
-                                for fr in function_responses
-                            ],
+                    self._mark_progress()
+                    with span(logger, "observe", turn=i + 1):
+                        function_responses = get_function_responses(self.page, results, self._observation_capture())
+                    verdict = self._check_progress(candidate, function_responses)
+
+                    response_parts = [
+                        Part.from_function_response(
+                            name=fr.name, response=fr.response, parts=getattr(fr, "parts", None)
                         )
-                    )
+                        for fr in function_responses
+                    ]
+                    if verdict is not None and verdict.level != STOP:
+                        # corrective note for the model's next turn
+                        response_parts.append(Part.from_text(text=verdict.message))
+                    self.contents.append(spill_content(Content(role="user", parts=response_parts), self.images))
                     # the agent appended new function responses -> update id
                     with self._lock:
                         self.update_id += 1
+                    self._session_turns += 1
+                    if self.checkpoints is not None and self.checkpoints.due(self._session_turns):
+                        self._save_checkpoint()
+
+                    if verdict is not None and verdict.level == STOP:
+                        self._set_relevant_update((verdict.message, True))  # type: ignore
+                        self._wait_for_new_goal()
+                        continue
 
                     # immediately handle any queued commands by appending them as new user content
                     while not self._command_queue.empty():
                         try:
                             cmd = self._command_queue.get_nowait()
-                            print("Received command:", cmd)
+                            logger.info("received command", extra={"fields": {"command_chars": len(cmd)}})
                             self.contents.append(Content(role="user", parts=[Part.from_text(text=cmd)]))
+                            self._goal_commands += 1
                             # notify frontend that commands were applied
                             with self._lock:
                                 self.update_id += 1
@@ -526,7 +1198,11 @@ class AgentRunner:
                 # small sleep to avoid tight loop
                 time.sleep(0.5)
         finally:
-            print("Agent runner exiting loop")
+            logger.info("agent runner exiting loop")
+            self.images.close()
+            if self.frame_capture is not None:
+                self.frame_capture.stop()
+                self.frame_capture = None
             try:
                 if self.context:
                     self.context.close()
@@ -534,7 +1210,10 @@ class AgentRunner:
                 pass
             try:
                 if self.browser:
-                    self.browser.close()
+                    if self.browser_provider is not None:
+                        self.browser_provider.release(self.browser)
+                    else:
+                        self.browser.close()
             except Exception:
                 pass
             try:
@@ -0,0 +1,132 @@
+import time
+
+# Entry point of agent worker processes (see worker_pool for the protocol).
+# Spawned workers import this module and, through multiprocessing, the
+# parent's __main__; neither may start anything at import time.
+
+HEARTBEAT_INTERVAL = 1.0
+# how often the snapshot is rebuilt to look for changes besides running and
+# update_id (e.g. current URL, stats)
+SNAPSHOT_INTERVAL = 1.0
+FRAME_INTERVAL = 0.2
+
+
+def worker_main(conn, screen_width: int, screen_height: int):
+    """Entry point of a worker process: owns one AgentRunner per session."""
+    # Heavy imports happen here so the supervisor process never pays for them.
+    from agent_runner import AgentRunner
+
+    agent = None
+    latest = {"frame": None}
+    capture_wanted = False
+    sent_state = None
+    sent_snap = None
+    built_at = 0.0
+    beat_at = 0.0
+    sent_frame_seq = None
+    frame_at = 0.0
+
+    def keep_frame(frame):
+        latest["frame"] = frame
+
+    # finished-goal answers and settled updates, sent from this loop (the
+    # pipe is not thread-safe)
+    outbox = []
+
+    def keep_answer(goal, finish_text, summary, site):
+        outbox.append({"type": "answer", "goal": goal, "finish_text": finish_text, "summary": summary, "site": site})
+
+    def keep_update(update_id, text):
+        outbox.append({"type": "relevant_update", "update_id": update_id, "text": text})
+
+    while True:
+        try:
+            if conn.poll(0.05):
+                msg = conn.recv()
+                op = msg.get("op")
+                reply = {"type": "reply", "id": msg.get("id"), "op": op}
+                try:
+                    if op == "start":
+                        if agent is not None and agent.running:
+                            raise RuntimeError("Agent already running")
+                        agent = AgentRunner(
+                            screen_width=screen_width,
+                            screen_height=screen_height,
+                            checkpoint_name=msg.get("checkpoint") or "session",
+                        )
+                        agent.add_frame_listener(keep_frame)
+                        agent.add_answer_listener(keep_answer)
+                        agent.add_update_listener(keep_update)
+                        if capture_wanted:
+                            agent.request_capture()
+                        agent.start(msg.get("goal"), resume=bool(msg.get("resume")), site=msg.get("site"))
+                    elif op == "command":
+                        if agent is not None:
+                            agent.enqueue_command(msg.get("text", ""))
+                    elif op == "update_goal":
+                        if agent is not None:
+                            agent.update_goal(msg.get("goal", ""), site=msg.get("site"))
+                    elif op == "publish_answer":
+                        if agent is not None:
+                            agent.publish_answer(msg.get("goal", ""), msg.get("answer", ""))
+                    elif op == "request_capture":
+                        capture_wanted = True
+                        if agent is not None:
+                            agent.request_capture()
+                    elif op == "release_capture":
+                        capture_wanted = False
+                        if agent is not None:
+                            agent.release_capture()
+                    elif op == "stop":
+                        if agent is not None:
+                            agent.stop()
+                        latest["frame"] = None
+                    elif op == "shutdown":
+                        if agent is not None and agent.running:
+                            agent.stop()
+                        conn.send(reply)
+                        return
+                except Exception as e:
+                    reply["error"] = str(e)
+                conn.send(reply)
+
+            while outbox:
+                conn.send(outbox.pop(0))
+
+            now = time.monotonic()
+            if agent is not None:
+                state = (agent.running, agent.update_id)
+            else:
+                state = (False, 0)
+            if state != sent_state or now - built_at >= SNAPSHOT_INTERVAL:
+                snap = agent.snapshot(debug=True) if agent is not None else {"running": False, "update_id": 0}
+                built_at = now
+                sent_state = state
+                if snap != sent_snap:
+                    conn.send({"type": "snapshot", "data": snap})
+                    sent_snap = snap
+            if now - beat_at >= HEARTBEAT_INTERVAL:
+                # how long the agent has been stuck in one browser step; the
+                # supervisor treats that as the time since the last heartbeat
+                conn.send({"type": "heartbeat", "progress_age": agent.progress_age() if agent is not None else 0.0})
+                beat_at = now
+
+            frame = latest["frame"]
+            if capture_wanted and frame is not None and frame.seq != sent_frame_seq and now >= frame_at:
+                conn.send({
+                    "type": "frame",
+                    "seq": frame.seq,
+                    "timestamp": frame.timestamp,
+                    "mime_type": frame.mime_type,
+                    "b64": frame._b64,
+                })
+                sent_frame_seq = frame.seq
+                frame_at = now + FRAME_INTERVAL
+        except (EOFError, OSError, KeyboardInterrupt):
+            # parent went away: tear down the browser and exit
+            try:
+                if agent is not None and agent.running:
+                    agent.stop()
+            except Exception:
+                pass
+            return
@@ -0,0 +1,152 @@
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+# Goal-level answer cache. Students often ask the same information-seeking
+# question; when a goal finishes, its final answer (the model's finish text
+# and the spoken summary) is stored under the normalized goal text, optionally
+# scoped to a site, and /start or /update_goal with the same goal is answered
+# straight from the cache without a browser session or any model call.
+# Only successful finishes are stored: the agent reports complete answers
+# only, and texts that read as a failure ("I couldn't find ...", errors) are
+# rejected here as well.
+#
+# ANSWER_CACHE_TTL   seconds an answer stays valid (default 900; 0 disables)
+# ANSWER_CACHE_SIZE  max cached answers (default 256, least recently used
+#                    are evicted first)
+
+_LEADING_FILLER = {"please", "pls", "hey", "hi", "ok", "okay", "can", "could", "would", "you"}
+
+_FAILURE = re.compile(
+    r"\b(?:i (?:was|am|'m) (?:not able|unable)|i (?:could not|couldn't|cannot|can't|wasn't able)"
+    r"|unable to|failed to|error (?:generating|reconnecting)|something went wrong)\b"
+)
+
+
+def normalize_goal(goal: str) -> str:
+    text = unicodedata.normalize("NFKC", goal or "").lower()
+    words = re.sub(r"[^\w\s]", " ", text).split()
+    while words and words[0] in _LEADING_FILLER:
+        words.pop(0)
+    return " ".join(words)
+
+
+def normalize_site(site: str | None) -> str:
+    if not site:
+        return ""
+    site = site.strip().lower()
+    host = urlparse(site if "//" in site else "//" + site).hostname or ""
+    return host[4:] if host.startswith("www.") else host
+
+
+def looks_failed(text: str | None) -> bool:
+    """True when an answer text reports that the agent did not succeed."""
+    return bool(_FAILURE.search(unicodedata.normalize("NFKC", text or "").lower().replace("\u2019", "'")))
+
+
+class CachedAnswer:
+    __slots__ = ("goal", "site", "finish_text", "summary", "created", "hits")
+
+    def __init__(self, goal: str, site: str, finish_text: str, summary: str | None):
+        self.goal = goal
+        self.site = site
+        self.finish_text = finish_text
+        self.summary = summary
+        self.created = time.time()
+        self.hits = 0
+
+    @property
+    def answer(self) -> str:
+        return self.summary or self.finish_text
+
+    def as_dict(self) -> dict:
+        return {
+            "goal": self.goal,
+            "site": self.site or None,
+            "answer": self.answer,
+            "finish_text": self.finish_text,
+            "age_s": round(time.time() - self.created, 1),
+        }
+
+
+class AnswerCache:
+    def __init__(self, ttl: float = 900.0, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple[str, str], CachedAnswer] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.rejected = 0
+        self.expired = 0
+        self.evicted = 0
+
+    @classmethod
+    def from_env(cls) -> "AnswerCache":
+        return cls(
+            ttl=float(os.getenv("ANSWER_CACHE_TTL", "900")),
+            max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "256")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, goal: str, site: str | None = None) -> CachedAnswer | None:
+        if not self.enabled:
+            return None
+        key = (normalize_site(site), normalize_goal(goal))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry.created > self.ttl:
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            entry.hits += 1
+            self.hits += 1
+            return entry
+
+    def put(self, goal: str, finish_text: str, summary: str | None = None, site: str | None = None):
+        key = (normalize_site(site), normalize_goal(goal))
+        if not self.enabled or not key[1] or not (finish_text or summary):
+            return
+        if looks_failed(finish_text) or looks_failed(summary):
+            with self._lock:
+                self.rejected += 1
+            return
+        with self._lock:
+            self._entries[key] = CachedAnswer(goal, key[0], finish_text, summary)
+            self._entries.move_to_end(key)
+            self.stores += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+
+    def invalidate(self, goal: str, site: str | None = None):
+        with self._lock:
+            self._entries.pop((normalize_site(site), normalize_goal(goal)), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "ttl_s": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "stores": self.stores,
+                "rejected": self.rejected,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
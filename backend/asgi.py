@@ -0,0 +1,223 @@
+"""Production entry point: serves the API as an ASGI app.
+
+    uvicorn --app-dir backend asgi:app --host 0.0.0.0 --port 8000
+
+Speech proxying (/text_to_speech, /text_to_speech_stream, /transcribe_audio),
+the live view (/live) and the status event stream (/events) are native async
+handlers, so waiting on ElevenLabs or on new frames holds no thread. All
+other routes are served by the Flask app from main.py through a WSGI adapter,
+so both entry points share one agent and one set of routes.
+
+Run a single worker process: agent state lives in this process (use
+AGENT_ISOLATION=process to spread sessions across cores). With a shared
+STATE_STORE, several such replicas can sit behind one load balancer. On shutdown
+(SIGTERM/SIGINT) the agent is stopped and its browser closed.
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+import main
+from audio_preprocess import preprocess_audio_file
+from live_stream import BOUNDARY as LIVE_BOUNDARY
+from speech_providers import SpeechProviderError
+from tracing import get_logger
+
+DEFAULT_VOICE_ID = "JBFqnCBsd6RMkjVDRZzb"  # George
+
+logger = get_logger("asgi")
+
+
+async def _admit(pool_name: str):
+    """Acquire a slot in an admission pool; returns (pool, response_if_rejected)."""
+    pool = main.admission.pools[pool_name]
+    waited = await pool.acquire_async()
+    if waited is None:
+        retry = pool.retry_after()
+        return pool, JSONResponse(
+            {"error": f"{pool.name} endpoints are busy", "retry_after": retry},
+            status_code=429,
+            headers={"Retry-After": str(retry)},
+        )
+    return pool, None
+
+
+async def text_to_speech(request):
+    pool, rejected = await _admit("speech")
+    if rejected is not None:
+        return rejected
+    start = time.monotonic()
+    try:
+        payload = await request.json()
+        text = payload.get("text")
+        if not text:
+            return JSONResponse({"error": "missing text"}, status_code=400)
+        voice_id = payload.get("voice_id", DEFAULT_VOICE_ID)
+        audio = None
+        if main.tts_prefetch is not None:
+            # may wait for an in-flight pre-generation: keep it off the loop
+            audio = await asyncio.to_thread(
+                main.tts_prefetch.lookup, text, voice_id, payload.get("output_format"), payload.get("update_id")
+            )
+        prefetched = audio is not None
+        if audio is None:
+            try:
+                audio = await main.speech.asynthesize(text, voice_id, output_format=payload.get("output_format"))
+            except SpeechProviderError as e:
+                logger.error("text-to-speech failed: %s", e)
+                return JSONResponse({"error": "Failed to generate audio"}, status_code=500)
+        return Response(
+            audio.data,
+            media_type=audio.mime_type,
+            headers={
+                "Content-Disposition": 'inline; filename="speech"',
+                "X-Speech-Provider": audio.provider,
+                "X-Speech-Prefetched": "1" if prefetched else "0",
+            },
+        )
+    finally:
+        pool.release(time.monotonic() - start)
+
+
+async def text_to_speech_stream(request):
+    pool, rejected = await _admit("speech")
+    if rejected is not None:
+        return rejected
+    start = time.monotonic()
+    try:
+        payload = await request.json()
+        text = payload.get("text")
+        if not text:
+            return JSONResponse({"error": "missing text"}, status_code=400)
+        try:
+            mime_type, chunks = await main.speech.astream(
+                text, payload.get("voice_id", DEFAULT_VOICE_ID), output_format=payload.get("output_format")
+            )
+        except SpeechProviderError as e:
+            logger.error("text-to-speech streaming failed: %s", e)
+            return JSONResponse({"error": "Failed to generate audio"}, status_code=500)
+        return StreamingResponse(chunks, media_type=mime_type, headers={"Cache-Control": "no-cache"})
+    finally:
+        pool.release(time.monotonic() - start)
+
+
+async def transcribe_audio(request):
+    pool, rejected = await _admit("speech")
+    if rejected is not None:
+        return rejected
+    start = time.monotonic()
+    temp_path = None
+    processed = None
+    try:
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            return JSONResponse({"error": "No file provided"}, status_code=400)
+        fd, temp_path = tempfile.mkstemp(suffix=os.path.splitext(upload.filename or "")[1])
+        with os.fdopen(fd, "wb") as f:
+            f.write(await upload.read())
+
+        # decoding/trimming is CPU and subprocess work: keep it off the loop
+        processed = await asyncio.to_thread(preprocess_audio_file, temp_path)
+        if not processed.speech:
+            return JSONResponse({"status": "no_speech", "text": "", "audio": processed.stats})
+        try:
+            transcription = await main.speech.atranscribe(processed.path)
+        except SpeechProviderError as e:
+            logger.error("transcription failed: %s", e)
+            transcription = ""
+        if main.agent.running and transcription:
+            main.agent.enqueue_command(transcription)
+        return JSONResponse({"status": "transcribed", "text": transcription, "audio": processed.stats})
+    finally:
+        if processed is not None:
+            processed.cleanup()
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+        pool.release(time.monotonic() - start)
+
+
+async def live(request):
+    if not main.agent.running:
+        return JSONResponse({"error": "Agent not running"}, status_code=503)
+    hub = main.live_hub
+    slot = hub.attach_viewer()
+    if slot is None:
+        return JSONResponse({"error": "too many live viewers"}, status_code=429)
+    main.agent.request_capture()
+    try:
+        fps = float(request.query_params.get("fps", hub.max_fps))
+    except ValueError:
+        fps = hub.max_fps
+    return StreamingResponse(
+        hub.astream(slot, fps=fps, alive=lambda: main.agent.running),
+        media_type=f"multipart/x-mixed-replace; boundary={LIVE_BOUNDARY}",
+        headers={"Cache-Control": "no-cache"},
+        # frees the slot even if the body is never iterated
+        background=BackgroundTask(slot.release),
+    )
+
+
+async def events(request):
+    """Server-sent events from the session's event log in the state store:
+    ``status`` (a snapshot per update) and ``control`` (forwarded requests),
+    from whichever replica runs the session. A new client first gets the
+    current status; a reconnecting one resumes after Last-Event-ID."""
+    try:
+        after = int(request.headers.get("last-event-id") or 0)
+    except ValueError:
+        after = 0
+
+    async def stream():
+        nonlocal after
+        if not after:
+            after = await asyncio.to_thread(main.replication.last_event_seq)
+            snap = await asyncio.to_thread(main.replication.snapshot)
+            yield f"id: {after}\nevent: status\ndata: {json.dumps(snap, default=str)}\n\n"
+        last_sent = time.monotonic()
+        while not await request.is_disconnected():
+            for event in await asyncio.to_thread(main.replication.events, after):
+                after = event["seq"]
+                last_sent = time.monotonic()
+                yield f"id: {after}\nevent: {event['kind']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+            if time.monotonic() - last_sent > 15:
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(0.25)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await asyncio.to_thread(main.start_services)
+    yield
+    # graceful shutdown: stop the agent and close its browser before exit
+    await asyncio.to_thread(main.shutdown)
+
+
+app = Starlette(
+    routes=[
+        Route("/text_to_speech", text_to_speech, methods=["POST"]),
+        Route("/text_to_speech_stream", text_to_speech_stream, methods=["POST"]),
+        Route("/transcribe_audio", transcribe_audio, methods=["POST"]),
+        Route("/live", live, methods=["GET"]),
+        Route("/events", events, methods=["GET"]),
+        Mount("/", WSGIMiddleware(main.app)),  # type: ignore
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"], expose_headers=["Retry-After"]),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,232 @@
+import math
+import os
+import shutil
+import subprocess
+import threading
+import wave
+from array import array
+
+# Server-side cleanup of recorded audio before it is sent to speech-to-text:
+# decode, downmix/resample to 16 kHz mono, trim leading/trailing silence with
+# a frame-energy detector and re-encode compactly. Uploads without any speech
+# are reported so the STT call can be skipped.
+#
+# Browsers record webm/opus (whatever MediaRecorder picks), so decoding needs
+# ffmpeg on PATH. Without ffmpeg only WAV uploads are processed; anything else
+# is passed through untouched.
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+# Keep a little audio around the detected speech so word edges are not cut.
+PAD_MS = 200
+# Less audio above MIN_RMS than this counts as "no speech".
+MIN_SPEECH_MS = 250
+# Absolute floor (16-bit RMS) below which a frame is always silence.
+MIN_RMS = 300.0
+
+
+class ProcessedAudio:
+    """Result of preprocessing one upload."""
+
+    def __init__(self, path: str, speech: bool, stats: dict, created: bool):
+        self.path = path
+        self.speech = speech
+        self.stats = stats
+        # True when ``path`` is a new file the caller should delete
+        self.created = created
+
+    def cleanup(self):
+        if self.created and os.path.exists(self.path):
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+_stats_lock = threading.Lock()
+_totals = {
+    "uploads": 0,
+    "processed": 0,
+    "no_speech": 0,
+    "bytes_in": 0,
+    "bytes_out": 0,
+    "seconds_in": 0.0,
+    "seconds_out": 0.0,
+}
+
+
+def audio_stats() -> dict:
+    """Aggregate before/after totals since process start."""
+    with _stats_lock:
+        return dict(_totals)
+
+
+def _record(stats: dict, speech: bool):
+    with _stats_lock:
+        _totals["uploads"] += 1
+        _totals["bytes_in"] += stats.get("bytes_in", 0)
+        _totals["bytes_out"] += stats.get("bytes_out", 0)
+        if stats.get("decoder") != "passthrough":
+            _totals["processed"] += 1
+            _totals["seconds_in"] += stats.get("seconds_in", 0.0)
+            _totals["seconds_out"] += stats.get("seconds_out", 0.0)
+        if not speech:
+            _totals["no_speech"] += 1
+
+
+def _ffmpeg() -> str | None:
+    return shutil.which(os.getenv("FFMPEG_BINARY", "ffmpeg"))
+
+
+def _decode_ffmpeg(path: str, ffmpeg: str) -> array:
+    proc = subprocess.run(
+        [ffmpeg, "-nostdin", "-loglevel", "error", "-i", path,
+         "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "-"],
+        capture_output=True, timeout=30, check=True,
+    )
+    samples = array("h")
+    samples.frombytes(proc.stdout[: len(proc.stdout) // 2 * 2])
+    return samples
+
+
+def _decode_wav(path: str) -> array:
+    with wave.open(path, "rb") as w:
+        channels = w.getnchannels()
+        width = w.getsampwidth()
+        rate = w.getframerate()
+        raw = w.readframes(w.getnframes())
+    if width != 2:
+        raise ValueError(f"unsupported WAV sample width: {width * 8} bit")
+    samples = array("h")
+    samples.frombytes(raw)
+    if channels > 1:
+        mono = array("h", bytes(2 * (len(samples) // channels)))
+        for i in range(len(mono)):
+            frame = samples[i * channels:(i + 1) * channels]
+            mono[i] = int(sum(frame) / channels)
+        samples = mono
+    if rate != SAMPLE_RATE and samples:
+        # linear interpolation is plenty for speech recognition input
+        n_out = int(len(samples) * SAMPLE_RATE / rate)
+        step = rate / SAMPLE_RATE
+        last = len(samples) - 1
+        out = array("h", bytes(2 * n_out))
+        for i in range(n_out):
+            pos = i * step
+            j = int(pos)
+            k = min(j + 1, last)
+            frac = pos - j
+            out[i] = int(samples[j] + (samples[k] - samples[j]) * frac)
+        samples = out
+    return samples
+
+
+def decode_audio_file(path: str) -> array:
+    """Decode any audio file to 16 kHz mono samples (WAV only without ffmpeg)."""
+    ffmpeg = _ffmpeg()
+    return _decode_ffmpeg(path, ffmpeg) if ffmpeg else _decode_wav(path)
+
+
+def write_wav(samples: array, path: str):
+    """Write 16 kHz mono samples as a 16-bit WAV file."""
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(SAMPLE_RATE)
+        w.writeframes(samples.tobytes())
+
+
+def frame_energies(samples: array, frame_ms: int = FRAME_MS) -> list[float]:
+    """RMS level of consecutive ``frame_ms`` frames."""
+    size = SAMPLE_RATE * frame_ms // 1000
+    energies = []
+    for start in range(0, len(samples) - size + 1, size):
+        frame = samples[start:start + size]
+        energies.append(math.sqrt(sum(s * s for s in frame) / size))
+    return energies
+
+
+def detect_speech(samples: array) -> tuple[int, int] | None:
+    """Return the (start, end) sample range containing speech, or None.
+
+    None only means the recording never rises above MIN_RMS for long enough.
+    Otherwise the threshold adapts to the recording: a frame is voiced when
+    it is well above the quietest frames (the noise floor), capped relative
+    to the loudest frame so clips without any silence still trim to their
+    speech. When that finds too little, the whole clip is kept and left to
+    STT rather than dropped.
+    """
+    energies = frame_energies(samples)
+    if not energies:
+        return None
+    if sum(e >= MIN_RMS for e in energies) * FRAME_MS < MIN_SPEECH_MS:
+        return None
+    ordered = sorted(energies)
+    noise_floor = ordered[len(ordered) // 10]
+    threshold = max(MIN_RMS, min(noise_floor * 3.0, ordered[-1] * 0.25))
+    voiced = [i for i, e in enumerate(energies) if e >= threshold]
+    if len(voiced) * FRAME_MS < MIN_SPEECH_MS:
+        return 0, len(samples)
+    frame_len = SAMPLE_RATE * FRAME_MS // 1000
+    pad = SAMPLE_RATE * PAD_MS // 1000
+    start = max(0, voiced[0] * frame_len - pad)
+    end = min(len(samples), (voiced[-1] + 1) * frame_len + pad)
+    return start, end
+
+
+def _encode(samples: array, base_path: str, ffmpeg: str | None) -> str:
+    if ffmpeg:
+        out_path = base_path + ".trimmed.ogg"
+        subprocess.run(
+            [ffmpeg, "-nostdin", "-loglevel", "error", "-y",
+             "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", "1", "-i", "-",
+             "-c:a", "libopus", "-b:a", "24k", "-application", "voip", out_path],
+            input=samples.tobytes(), capture_output=True, timeout=30, check=True,
+        )
+        return out_path
+    out_path = base_path + ".16k.wav"
+    write_wav(samples, out_path)
+    return out_path
+
+
+def preprocess_audio_file(path: str) -> ProcessedAudio:
+    """Decode, trim and re-encode ``path``.
+
+    Never raises: if the audio cannot be decoded the original file is passed
+    through and assumed to contain speech.
+    """
+    bytes_in = os.path.getsize(path) if os.path.exists(path) else 0
+    stats = {"bytes_in": bytes_in, "bytes_out": bytes_in, "decoder": "passthrough"}
+    ffmpeg = _ffmpeg()
+    try:
+        if ffmpeg:
+            samples = _decode_ffmpeg(path, ffmpeg)
+            stats["decoder"] = "ffmpeg"
+        else:
+            samples = _decode_wav(path)
+            stats["decoder"] = "wav"
+    except Exception as e:
+        stats["decoder"] = "passthrough"
+        stats["error"] = str(e)
+        _record(stats, True)
+        return ProcessedAudio(path, True, stats, created=False)
+
+    stats["seconds_in"] = round(len(samples) / SAMPLE_RATE, 3)
+    span = detect_speech(samples)
+    if span is None:
+        stats.update({"seconds_out": 0.0, "bytes_out": 0})
+        _record(stats, False)
+        return ProcessedAudio(path, False, stats, created=False)
+
+    trimmed = samples[span[0]:span[1]]
+    stats["seconds_out"] = round(len(trimmed) / SAMPLE_RATE, 3)
+    try:
+        out_path = _encode(trimmed, os.path.splitext(path)[0], ffmpeg)
+    except Exception as e:
+        stats["error"] = str(e)
+        _record(stats, True)
+        return ProcessedAudio(path, True, stats, created=False)
+    stats["bytes_out"] = os.path.getsize(out_path)
+    stats["encoding"] = "opus" if out_path.endswith(".ogg") else "wav"
+    _record(stats, True)
+    return ProcessedAudio(out_path, True, stats, created=True)
@@ -0,0 +1,98 @@
+"""Measure how long pages take to become screenshot-stable after an action,
+with and without the fast-render profile (render_profile.py).
+
+    python backend/bench_render.py [--runs 5] [--headed]
+
+Each fixture is a small local page with one source of motion. After the
+action, screenshots are taken until two consecutive ones are identical;
+the time until then is the settle time (capped at --timeout seconds).
+"""
+import argparse
+import statistics
+import time
+
+from playwright.sync_api import sync_playwright
+
+import render_profile
+from browser_computer import BrowserComputer
+
+LONG_PAGE = "".join(f"<p>Paragraph {i}</p>" for i in range(400))
+
+FIXTURES = {
+    "transition": (
+        """<style>
+        #panel { height: 0; overflow: hidden; background: #369; transition: height 1.2s ease; }
+        #panel.open { height: 500px; }
+        </style>
+        <button id="b" style="width:200px;height:60px"
+          onclick="document.getElementById('panel').classList.toggle('open')">Toggle</button>
+        <div id="panel"><p>Assignment details</p></div>""",
+        lambda bc: bc.click_at(100, 30),
+    ),
+    "smooth_scroll": (
+        "<style>html { scroll-behavior: smooth; }</style>" + LONG_PAGE,
+        lambda bc: bc.scroll_at(700, 450, "down", 3000),
+    ),
+    "scripted_smooth_scroll": (
+        LONG_PAGE + """<button id="b" style="position:fixed;top:0;left:0;width:200px;height:60px"
+          onclick="window.scrollTo({top: 6000, behavior: 'smooth'})">Down</button>""",
+        lambda bc: bc.click_at(100, 30),
+    ),
+    "carousel": (
+        """<style>
+        @keyframes slide { from { transform: translateX(0); } to { transform: translateX(-600px); } }
+        .track { display: flex; width: 1800px; animation: slide 3s infinite alternate; }
+        .track div { width: 600px; height: 300px; }
+        </style>
+        <div class="track"><div style="background:#c33"></div><div style="background:#3c3"></div>
+        <div style="background:#33c"></div></div>""",
+        lambda bc: bc.hover_at(10, 10),
+    ),
+}
+
+
+def settle_time(page, timeout: float) -> float:
+    start = time.perf_counter()
+    previous = page.screenshot(type="png")
+    while time.perf_counter() - start < timeout:
+        page.wait_for_timeout(50)
+        current = page.screenshot(type="png")
+        if current == previous:
+            return time.perf_counter() - start
+        previous = current
+    return timeout
+
+
+def run(runs: int, headless: bool, timeout: float):
+    results = {}
+    with sync_playwright() as p:
+        for fast in (False, True):
+            browser = p.chromium.launch(headless=headless, args=render_profile.launch_args(fast))
+            for name, (html, action) in FIXTURES.items():
+                times = []
+                for _ in range(runs):
+                    context = browser.new_context(viewport={"width": 1440, "height": 900}, **render_profile.context_options(fast))
+                    render_profile.apply_to_context(context, fast)
+                    page = context.new_page()
+                    page.set_content(html)
+                    page.wait_for_load_state()
+                    action(BrowserComputer(page))
+                    times.append(settle_time(page, timeout))
+                    context.close()
+                results[(name, fast)] = times
+            browser.close()
+
+    print(f"{'fixture':<24}{'default (ms)':>14}{'fast (ms)':>12}")
+    for name in FIXTURES:
+        slow = statistics.median(results[(name, False)]) * 1000
+        fast = statistics.median(results[(name, True)]) * 1000
+        print(f"{name:<24}{slow:>14.0f}{fast:>12.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=5.0)
+    parser.add_argument("--headed", action="store_true")
+    args = parser.parse_args()
+    run(args.runs, not args.headed, args.timeout)
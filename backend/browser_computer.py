@@ -1,9 +1,55 @@
 import time
 
+from hit_index import HitIndex
+from page_waiter import wait_until_settled
+
+# Texts at least this long are inserted in one operation instead of being
+# typed key by key (short ones keep real key events, e.g. for autocompletes).
+BULK_INSERT_MIN_CHARS = 8
+
+# Describe the focused element (through open shadow roots) and, if asked,
+# select its contents so the next key press replaces them:
+# kind is "field" (text input/textarea), "contenteditable" or "other".
+_FOCUSED_TARGET_JS = """
+(select) => {
+  let el = document.activeElement;
+  while (el && el.shadowRoot && el.shadowRoot.activeElement) el = el.shadowRoot.activeElement;
+  if (!el) return {kind: 'other'};
+  const textTypes = ['', 'text', 'search', 'email', 'url', 'tel', 'password', 'number'];
+  let kind = 'other';
+  if (el.tagName === 'TEXTAREA' ||
+      (el.tagName === 'INPUT' && textTypes.includes((el.getAttribute('type') || '').toLowerCase()))) {
+    kind = el.readOnly || el.disabled ? 'other' : 'field';
+  } else if (el.isContentEditable) {
+    kind = 'contenteditable';
+  }
+  if (select && kind === 'field') {
+    try { el.select(); } catch (e) { kind = 'other'; }
+  } else if (select && kind === 'contenteditable') {
+    const range = document.createRange();
+    range.selectNodeContents(el);
+    const sel = window.getSelection();
+    sel.removeAllRanges();
+    sel.addRange(range);
+  }
+  return {kind};
+}
+"""
+
+_FOCUSED_LENGTH_JS = """
+() => {
+  let el = document.activeElement;
+  while (el && el.shadowRoot && el.shadowRoot.activeElement) el = el.shadowRoot.activeElement;
+  if (!el) return null;
+  return 'value' in el && typeof el.value === 'string' ? el.value.length : (el.textContent || '').length;
+}
+"""
+
 class BrowserComputer:
     """Adapter around a Playwright page exposing higher-level actions."""
     def __init__(self, page):
         self.page = page
+        self._select_all = None
         # If page has a viewport size, use it for clamping; otherwise default
         try:
             vp = getattr(self.page, 'viewport_size', None)
@@ -20,12 +66,29 @@ class BrowserComputer:
     def open_web_browser(self):
         return {"status": "already_open"}
 
+    def _snap(self, x, y):
+        index = HitIndex.for_page(self.page)
+        if index is None:
+            return None
+        try:
+            return index.snap_click(self.page, x, y)
+        except Exception:
+            # snapping is best effort; click where the model asked
+            return None
+
     def click_at(self, x, y):
         try:
             cx = max(0, min(int(x), self._width - 1))
             cy = max(0, min(int(y), self._height - 1))
+            snap = self._snap(cx, cy)
+            if snap is not None:
+                requested = [cx, cy]
+                cx, cy = snap["x"], snap["y"]
             self.page.mouse.click(cx, cy)
-            return {"clicked": [cx, cy]}
+            result = {"clicked": [cx, cy]}
+            if snap is not None:
+                result["snapped"] = {"from": requested, "distance_px": snap["distance"], "target": snap["target"]}
+            return result
         except Exception as e:
             return {"error": str(e)}
 
@@ -38,29 +101,78 @@ class BrowserComputer:
         except Exception as e:
             return {"error": str(e)}
 
+    def _select_all_keys(self):
+        # select-all is Meta+A only on macOS; elsewhere (e.g. Linux Chromium)
+        # Meta+A does nothing and stale text would be left in the field
+        if self._select_all is None:
+            try:
+                mac = "Mac" in (self.page.evaluate("navigator.platform") or "")
+            except Exception:
+                mac = False
+            self._select_all = "Meta+A" if mac else "Control+A"
+        return self._select_all
+
     def type_text_at(self, x, y, text, press_enter=False, clear_before_typing=True):
+        """Click (x, y) and enter ``text``. Text fields and contenteditable
+        elements get the whole text in one insert; other widgets (canvas
+        editors, key-driven controls) get per-key typing. The result reports
+        the path taken and how long input took."""
         try:
             tx = max(0, min(int(x), self._width - 1))
             ty = max(0, min(int(y), self._height - 1))
+            text = str(text)
+            start = time.perf_counter()
             self.page.mouse.click(tx, ty)
+            try:
+                target = self.page.evaluate(_FOCUSED_TARGET_JS, bool(clear_before_typing))
+            except Exception:
+                target = {"kind": "other"}
+            cleared = None
             if clear_before_typing:
                 try:
-                    self.page.keyboard.press("Meta+A")
+                    if target["kind"] == "other":
+                        self.page.keyboard.press(self._select_all_keys())
+                        cleared = "select_all_keys"
+                    else:
+                        cleared = "selection"
+                    # deleting the selection fires the usual input events
                     self.page.keyboard.press("Backspace")
                 except Exception:
-                    # fallback: select-all may not exist on some platforms
                     pass
-            self.page.keyboard.type(str(text))
+            path = "type"
+            if target["kind"] != "other" and len(text) >= BULK_INSERT_MIN_CHARS:
+                before = self._focused_length()
+                self.page.keyboard.insert_text(text)
+                # a widget that ignored the insert still needs key events
+                if before is None or self._focused_length() != before:
+                    path = "insert_text"
+            if path == "type":
+                self.page.keyboard.type(text)
+            input_ms = (time.perf_counter() - start) * 1000
             if press_enter:
                 try:
                     self.page.keyboard.press("Enter")
                 except Exception:
                     pass
-            return {"typed": text}
+            return {
+                "typed": text,
+                "input_path": path,
+                "target": target["kind"],
+                "cleared": cleared,
+                "input_ms": round(input_ms, 1),
+            }
         except Exception as e:
             return {"error": str(e)}
 
+    def _focused_length(self):
+        try:
+            return self.page.evaluate(_FOCUSED_LENGTH_JS)
+        except Exception:
+            return None
+
     def scroll_document(self, direction="down"):
+        # with FAST_RENDER=1 the render profile makes these scrolls instant
+        # (CSS scroll-behavior is forced to auto)
         if direction in ("top", "start", "0"):
             self.page.evaluate("window.scrollTo(0,0)")
             return {"scrolled_to": "top"}
@@ -90,8 +202,12 @@ class BrowserComputer:
             return {"error": str(e)}
 
     def wait_5_seconds(self):
-        time.sleep(5)
-        return {"waited_seconds": 5}
+        # returns early once the page has settled; still capped at 5 seconds
+        try:
+            return wait_until_settled(self.page, max_seconds=5.0)
+        except Exception:
+            time.sleep(5)
+            return {"waited_seconds": 5}
 
     def go_back(self):
         try:
@@ -0,0 +1,223 @@
+import os
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+from tracing import get_logger
+
+# Where agent browsers come from.
+#
+# - LocalBrowserProvider launches Chromium on this host (the default).
+# - RemoteBrowserProvider connects to a pool of Playwright browser servers
+#   listed in BROWSER_ENDPOINTS (comma separated ws:// URLs) and places each
+#   session on the least-loaded healthy endpoint.
+#
+# A browser server for local testing can be started with
+#   python -m playwright run-server --port 3000 --host 127.0.0.1
+# and used with BROWSER_ENDPOINTS=ws://127.0.0.1:3000/
+# (the Node API's browserType.launchServer() endpoints work the same way).
+#
+# Providers are used from the agent thread only (Playwright sync objects are
+# thread bound); the endpoint pool itself is shared by every agent in the
+# process and is thread-safe.
+
+logger = get_logger("browser")
+
+
+def _headless_from_env() -> bool:
+    headless_env = os.getenv("HEADLESS", "0")
+    return not (headless_env.lower() in ("0", "false", "no"))
+
+
+class LocalBrowserProvider:
+    """Launches a Chromium instance on this host for every session."""
+
+    name = "local"
+
+    def __init__(self, playwright, headless: bool | None = None, launch_args: list[str] | None = None):
+        self.playwright = playwright
+        self.headless = _headless_from_env() if headless is None else headless
+        self.launch_args = launch_args or []
+
+    def acquire(self):
+        logger.info("launching browser", extra={"fields": {"headless": self.headless}})
+        return self.playwright.chromium.launch(headless=self.headless, args=self.launch_args)
+
+    def release(self, browser, failed: bool = False):
+        try:
+            browser.close()
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        return {"provider": self.name, "headless": self.headless}
+
+
+class BrowserEndpointPool:
+    """Health and load bookkeeping for a set of browser-server endpoints.
+
+    Health is checked with a cheap TCP probe in a background thread, so it
+    needs no Playwright objects. An endpoint that fails a probe or a connect
+    is skipped until it passes a probe again (at most every ``cooldown``
+    seconds after a failure).
+    """
+
+    def __init__(self, endpoints: list[str], probe_interval: float = 10.0, cooldown: float = 15.0, probe_timeout: float = 1.0):
+        self.probe_interval = probe_interval
+        self.cooldown = cooldown
+        self.probe_timeout = probe_timeout
+        self._lock = threading.Lock()
+        self._endpoints = {
+            url: {"healthy": True, "leases": 0, "failures": 0, "last_error": None, "failed_at": 0.0}
+            for url in endpoints
+        }
+        self._prober = None
+
+    @property
+    def endpoints(self) -> list[str]:
+        return list(self._endpoints)
+
+    def _probe(self, url: str) -> bool:
+        parsed = urlparse(url)
+        port = parsed.port or (443 if parsed.scheme in ("wss", "https") else 80)
+        try:
+            with socket.create_connection((parsed.hostname, port), timeout=self.probe_timeout):
+                return True
+        except OSError:
+            return False
+
+    def _probe_loop(self):
+        while True:
+            for url in self.endpoints:
+                with self._lock:
+                    state = self._endpoints[url]
+                    cooling = not state["healthy"] and time.monotonic() - state["failed_at"] < self.cooldown
+                if cooling:
+                    continue
+                ok = self._probe(url)
+                with self._lock:
+                    if ok:
+                        state["healthy"] = True
+                    elif state["healthy"]:
+                        state["healthy"] = False
+                        state["failed_at"] = time.monotonic()
+                        state["last_error"] = "health probe failed"
+            time.sleep(self.probe_interval)
+
+    def _ensure_prober(self):
+        with self._lock:
+            if self._prober is None:
+                self._prober = threading.Thread(target=self._probe_loop, daemon=True)
+                self._prober.start()
+
+    def pick(self, exclude=()) -> str | None:
+        """Return the healthy endpoint with the fewest active leases."""
+        self._ensure_prober()
+        with self._lock:
+            candidates = [
+                (s["leases"], s["failures"], url)
+                for url, s in self._endpoints.items()
+                if s["healthy"] and url not in exclude
+            ]
+        if not candidates:
+            return None
+        return min(candidates)[2]
+
+    def lease(self, url: str):
+        with self._lock:
+            self._endpoints[url]["leases"] += 1
+
+    def unlease(self, url: str):
+        with self._lock:
+            state = self._endpoints[url]
+            state["leases"] = max(0, state["leases"] - 1)
+
+    def mark_failed(self, url: str, error: str):
+        with self._lock:
+            state = self._endpoints[url]
+            state["healthy"] = False
+            state["failures"] += 1
+            state["failed_at"] = time.monotonic()
+            state["last_error"] = error
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                url: {k: v for k, v in state.items() if k != "failed_at"}
+                for url, state in self._endpoints.items()
+            }
+
+
+class RemoteBrowserProvider:
+    """Connects to the least-loaded healthy endpoint of a BrowserEndpointPool."""
+
+    name = "remote"
+
+    def __init__(self, playwright, pool: BrowserEndpointPool, connect_timeout: float = 10.0):
+        self.playwright = playwright
+        self.pool = pool
+        self.connect_timeout = connect_timeout
+        self._leases: dict[int, str] = {}
+
+    def acquire(self):
+        tried = []
+        last_error = None
+        while len(tried) < len(self.pool.endpoints):
+            url = self.pool.pick(exclude=tried)
+            if url is None:
+                break
+            tried.append(url)
+            try:
+                logger.info("connecting to browser server %s", url)
+                browser = self.playwright.chromium.connect(url, timeout=self.connect_timeout * 1000)
+            except Exception as e:
+                last_error = e
+                logger.warning("browser server %s unavailable: %s", url, e)
+                self.pool.mark_failed(url, str(e))
+                continue
+            self.pool.lease(url)
+            self._leases[id(browser)] = url
+            return browser
+        raise RuntimeError(f"no healthy browser endpoints available (last error: {last_error})")
+
+    def release(self, browser, failed: bool = False):
+        url = self._leases.pop(id(browser), None)
+        try:
+            browser.close()
+        except Exception:
+            pass
+        if url is not None:
+            self.pool.unlease(url)
+            if failed:
+                self.pool.mark_failed(url, "browser disconnected")
+
+    def endpoint_for(self, browser) -> str | None:
+        return self._leases.get(id(browser))
+
+    def stats(self) -> dict:
+        return {"provider": self.name, "endpoints": self.pool.stats()}
+
+
+_shared_pool: BrowserEndpointPool | None = None
+_shared_pool_lock = threading.Lock()
+
+
+def shared_endpoint_pool() -> BrowserEndpointPool | None:
+    """Process-wide pool built from BROWSER_ENDPOINTS, or None if unset."""
+    global _shared_pool
+    endpoints = [e.strip() for e in os.getenv("BROWSER_ENDPOINTS", "").split(",") if e.strip()]
+    if not endpoints:
+        return None
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = BrowserEndpointPool(endpoints)
+        return _shared_pool
+
+
+def browser_provider_from_env(playwright, launch_args: list[str] | None = None):
+    """Remote provider when BROWSER_ENDPOINTS is set, local launch otherwise."""
+    pool = shared_endpoint_pool()
+    if pool is not None:
+        return RemoteBrowserProvider(playwright, pool)
+    return LocalBrowserProvider(playwright, launch_args=launch_args)
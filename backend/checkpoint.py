@@ -0,0 +1,154 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+from tracing import get_logger
+
+# Session checkpoints: every few turns the agent writes its session to disk
+# (history without screenshots, current URL, the browser context's cookies
+# and local storage, goals and queued commands). After a browser crash, a
+# crash of the agent thread or a restart of the process (CHECKPOINT_RESUME=1)
+# or of its worker, the session is restored into a fresh context and
+# continues from the last checkpoint with a fresh screenshot instead of
+# starting the goal over. A checkpoint belongs to the session that wrote it
+# (its trace id): starting a new session discards it, and recovery never
+# loads another session's history, commands or cookies.
+#
+# CHECKPOINT_EVERY     turns between checkpoints (default 3; 0 disables)
+# CHECKPOINT_DIR       where checkpoints are kept (default: system temp dir)
+# CHECKPOINT_MAX_AGE   seconds a checkpoint stays resumable (default 3600)
+# CHECKPOINT_HISTORY   contents kept in a checkpoint (default 60)
+
+logger = get_logger("checkpoint")
+
+VERSION = 1
+
+
+def compact_contents(contents: list, max_contents: int = 60) -> list[dict]:
+    """JSON-ready copy of ``contents`` without image data. The first
+    content (the goal) is always kept; older turns beyond ``max_contents``
+    are dropped so the kept tail starts at a model turn."""
+    if len(contents) > max_contents:
+        tail = contents[-(max_contents - 1):]
+        while tail and getattr(tail[0], "role", None) != "model":
+            tail = tail[1:]
+        contents = contents[:1] + tail
+    compacted = []
+    for content in contents:
+        data = content.model_dump(mode="json", exclude_none=True)
+        parts = []
+        for part in data.get("parts") or []:
+            if "inline_data" in part:
+                continue
+            response = part.get("function_response")
+            if response is not None:
+                response.pop("parts", None)
+            parts.append(part)
+        if parts:
+            compacted.append(dict(data, parts=parts))
+    return compacted
+
+
+def restore_contents(data: list[dict]) -> list:
+    from google.genai.types import Content
+
+    return [Content.model_validate(c) for c in data]
+
+
+class SessionCheckpointer:
+    def __init__(self, path: str, every: int = 3, max_age: float = 3600.0, max_contents: int = 60):
+        self.path = path
+        self.every = max(1, every)
+        self.max_age = max_age
+        self.max_contents = max_contents
+        self._lock = threading.Lock()
+        self.saved = 0
+        self.restored = 0
+        self.failed = 0
+        self.last_saved: float | None = None
+        self.last_bytes = 0
+
+    @classmethod
+    def from_env(cls, name: str = "session") -> "SessionCheckpointer | None":
+        every = int(os.getenv("CHECKPOINT_EVERY", "3"))
+        if every <= 0:
+            return None
+        directory = os.getenv("CHECKPOINT_DIR") or os.path.join(tempfile.gettempdir(), "emberhacks-checkpoints")
+        return cls(
+            os.path.join(directory, f"{name}.json"),
+            every=every,
+            max_age=float(os.getenv("CHECKPOINT_MAX_AGE", "3600")),
+            max_contents=int(os.getenv("CHECKPOINT_HISTORY", "60")),
+        )
+
+    def due(self, turns: int) -> bool:
+        return turns > 0 and turns % self.every == 0
+
+    def save(self, state: dict):
+        """Write ``state`` (a dict whose "contents" are genai Contents) atomically."""
+        data = dict(state, version=VERSION, saved_at=time.time())
+        data["contents"] = compact_contents(state.get("contents") or [], self.max_contents)
+        try:
+            payload = json.dumps(data, default=str).encode()
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with self._lock:
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(payload)
+                os.replace(tmp, self.path)
+                self.saved += 1
+                self.last_saved = data["saved_at"]
+                self.last_bytes = len(payload)
+        except OSError as e:
+            self.failed += 1
+            logger.warning("failed to write checkpoint: %s", e)
+
+    def load(self, session_id: str | None = None) -> dict | None:
+        """The last checkpoint, or None if there is none or it is too old.
+        With ``session_id`` a checkpoint of another session (its
+        "trace_id") is ignored as well."""
+        try:
+            with self._lock, open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("ignoring unreadable checkpoint: %s", e)
+            return None
+        if data.get("version") != VERSION or time.time() - data.get("saved_at", 0) > self.max_age:
+            return None
+        if session_id is not None and data.get("trace_id") != session_id:
+            logger.warning("ignoring checkpoint of another session")
+            return None
+        try:
+            data["contents"] = restore_contents(data.get("contents") or [])
+        except Exception as e:
+            logger.warning("ignoring checkpoint with invalid history: %s", e)
+            return None
+        with self._lock:
+            self.restored += 1
+        return data
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def discard(self):
+        with self._lock:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "path": self.path,
+                "every_turns": self.every,
+                "saved": self.saved,
+                "restored": self.restored,
+                "failed": self.failed,
+                "last_saved": self.last_saved,
+                "last_bytes": self.last_bytes,
+            }
@@ -1,17 +1,73 @@
 import os
+import threading
 from pathlib import Path
 from dotenv import load_dotenv
-from elevenlabs.client import ElevenLabs
+from elevenlabs.client import AsyncElevenLabs, ElevenLabs
+
+from tracing import get_logger
 
 # Load environment variables from project root
 project_root = Path(__file__).parent.parent
 env_path = project_root / '.env'
 load_dotenv(dotenv_path=env_path)
 
-# Initialize ElevenLabs client
-elevenlabs_client = ElevenLabs(
-    api_key=os.getenv("ELEVENLABS_API_KEY"),
-)
+logger = get_logger("tts")
+
+DEFAULT_MODEL_ID = "eleven_multilingual_v2"
+DEFAULT_OUTPUT_FORMAT = "mp3_44100_128"
+
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> ElevenLabs:
+    """Return the shared ElevenLabs client, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            api_key = os.getenv("ELEVENLABS_API_KEY")
+            if not api_key:
+                raise RuntimeError("Missing ELEVENLABS_API_KEY environment variable")
+            _client = ElevenLabs(api_key=api_key)
+        return _client
+
+
+def get_async_client() -> AsyncElevenLabs:
+    """Return the shared asyncio ElevenLabs client (used by the ASGI app)."""
+    global _async_client
+    with _client_lock:
+        if _async_client is None:
+            api_key = os.getenv("ELEVENLABS_API_KEY")
+            if not api_key:
+                raise RuntimeError("Missing ELEVENLABS_API_KEY environment variable")
+            _async_client = AsyncElevenLabs(api_key=api_key)
+        return _async_client
+
+
+def synthesize(text: str, voice_id: str, model_id: str = DEFAULT_MODEL_ID, output_format: str = DEFAULT_OUTPUT_FORMAT):
+    """Start a synthesis and return the generator of audio chunks.
+
+    Unlike text_to_speech/text_to_speech_stream this raises on failure so
+    callers can fail over to another provider.
+    """
+    return get_client().text_to_speech.convert(
+        text=text,
+        voice_id=voice_id,
+        model_id=model_id,
+        output_format=output_format,
+    )
+
+
+def asynthesize(text: str, voice_id: str, model_id: str = DEFAULT_MODEL_ID, output_format: str = DEFAULT_OUTPUT_FORMAT):
+    """Async variant of synthesize: returns an async iterator of audio chunks."""
+    return get_async_client().text_to_speech.convert(
+        voice_id,
+        text=text,
+        model_id=model_id,
+        output_format=output_format,  # type: ignore
+    )
+
 
 def text_to_speech(text: str, voice_id: str = "JBFqnCBsd6RMkjVDRZzb") -> bytes:
     """
@@ -25,19 +81,14 @@ def text_to_speech(text: str, voice_id: str = "JBFqnCBsd6RMkjVDRZzb") -> bytes:
         Audio data as bytes (MP3 format)
     """
     try:
-        audio_generator = elevenlabs_client.text_to_speech.convert(
-            text=text,
-            voice_id=voice_id,
-            model_id="eleven_multilingual_v2",
-            output_format="mp3_44100_128",
-        )
+        audio_generator = synthesize(text, voice_id)
         
         # Convert generator to bytes
         audio_bytes = b"".join(audio_generator)
         return audio_bytes
     
     except Exception as e:
-        print(f"❌ Text-to-speech failed: {e}")
+        logger.error("text-to-speech failed: %s", e)
         return b""
 
 def text_to_speech_stream(text: str, voice_id: str = "JBFqnCBsd6RMkjVDRZzb"):
@@ -52,16 +103,11 @@ def text_to_speech_stream(text: str, voice_id: str = "JBFqnCBsd6RMkjVDRZzb"):
         Generator yielding audio chunks
     """
     try:
-        audio_generator = elevenlabs_client.text_to_speech.convert(
-            text=text,
-            voice_id=voice_id,
-            model_id="eleven_multilingual_v2",
-            output_format="mp3_44100_128",
-        )
+        audio_generator = synthesize(text, voice_id)
         
         return audio_generator
     
     except Exception as e:
-        print(f"❌ Text-to-speech streaming failed: {e}")
+        logger.error("text-to-speech streaming failed: %s", e)
         return iter([])
 
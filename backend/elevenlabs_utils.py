@@ -1,17 +1,68 @@
+import logging
 import os
 import requests
 from pathlib import Path
 from dotenv import load_dotenv
 from flask import jsonify
 
+from tracing import get_logger
+
 # Load environment variables from project root
 project_root = Path(__file__).parent.parent
 env_path = project_root / '.env'
 load_dotenv(dotenv_path=env_path)
 
+logger = get_logger("elevenlabs")
+
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
 if not ELEVENLABS_API_KEY:
-    raise RuntimeError("Missing ELEVENLABS_API_KEY environment variable")
+    # Don't take the whole backend down: speech requests fail (and can fail
+    # over to another provider) while everything else keeps working.
+    logger.warning("ELEVENLABS_API_KEY is not set; ElevenLabs speech-to-text is unavailable")
+
+
+class TranscriptionError(RuntimeError):
+    """ElevenLabs rejected or failed a transcription request."""
+
+    def __init__(self, message: str, status_code: int | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def request_transcription(audio_file_path: str, model_id: str = "scribe_v1") -> str:
+    """Transcribe a file with ElevenLabs STT, raising TranscriptionError on failure."""
+    if not ELEVENLABS_API_KEY:
+        raise TranscriptionError("Missing ELEVENLABS_API_KEY environment variable")
+    url = "https://api.elevenlabs.io/v1/speech-to-text"
+    headers = {"xi-api-key": ELEVENLABS_API_KEY}
+    with open(audio_file_path, 'rb') as f:
+        response = requests.post(url, headers=headers, files={"file": f}, data={"model_id": model_id}, timeout=60)
+    if response.status_code != 200:
+        raise TranscriptionError(f"ElevenLabs transcription failed: {response.text[:300]}", response.status_code)
+    return response.json().get("text", "")
+
+
+async def arequest_transcription(audio_file_path: str, model_id: str = "scribe_v1") -> str:
+    """Async variant of request_transcription (used by the ASGI app)."""
+    import httpx
+
+    if not ELEVENLABS_API_KEY:
+        raise TranscriptionError("Missing ELEVENLABS_API_KEY environment variable")
+    url = "https://api.elevenlabs.io/v1/speech-to-text"
+    headers = {"xi-api-key": ELEVENLABS_API_KEY}
+    with open(audio_file_path, 'rb') as f:
+        audio = f.read()
+    async with httpx.AsyncClient(timeout=60) as client:
+        response = await client.post(
+            url,
+            headers=headers,
+            files={"file": (os.path.basename(audio_file_path), audio)},
+            data={"model_id": model_id},
+        )
+    if response.status_code != 200:
+        raise TranscriptionError(f"ElevenLabs transcription failed: {response.text[:300]}", response.status_code)
+    return response.json().get("text", "")
+
 
 def transcribe_audio_file(audio_file_path) -> str:
     """
@@ -19,37 +70,34 @@ def transcribe_audio_file(audio_file_path) -> str:
     Accepts either a file path (string) or a Flask FileStorage object.
     """
     if not audio_file_path:
-        print("⚠️ No audio file provided")
+        logger.warning("no audio file provided")
+        return ""
+
+    if not ELEVENLABS_API_KEY:
+        logger.error("ElevenLabs transcription unavailable: ELEVENLABS_API_KEY is not set")
         return ""
 
-    print(f"🎤 Transcribing audio file: {audio_file_path}")
     url = "https://api.elevenlabs.io/v1/speech-to-text"
     headers = {"xi-api-key": ELEVENLABS_API_KEY}
     
     # Handle both file path and FileStorage object
     if isinstance(audio_file_path, str):
-        print(f"📂 Reading file from path: {audio_file_path}")
         with open(audio_file_path, 'rb') as f:
             files = {"audio": f}
             response = requests.post(url, headers=headers, files=files)
     else:
-        print(f"📤 Uploading file from stream: {audio_file_path.filename}")
         files = {"audio": (audio_file_path.filename, audio_file_path.stream, audio_file_path.content_type)}
         response = requests.post(url, headers=headers, files=files)
 
-    print(f"📡 ElevenLabs response status: {response.status_code}")
-    
     if response.status_code != 200:
-        print(f"❌ ElevenLabs transcription failed: {response.text}")
+        logger.error("ElevenLabs transcription failed (%s): %s", response.status_code, response.text[:300])
         return ""
 
     try:
-        response_json = response.json()
-        print(f"📝 Response JSON: {response_json}")
-        transcription = response_json.get("text", "")
-        print(f"✅ Transcription: {transcription}")
+        transcription = response.json().get("text", "")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("transcription received", extra={"fields": {"chars": len(transcription)}})
         return transcription
     except Exception as e:
-        print(f"❌ Failed to parse transcription response: {e}")
-        print(f"Raw response: {response.text}")
+        logger.error("failed to parse transcription response: %s", e)
         return ""
@@ -0,0 +1,198 @@
+import json
+import os
+import re
+import threading
+import time
+
+from tracing import get_logger, span
+
+# Sub-goal fan-out (FANOUT=1). Research-style goals ("compare the late
+# policies of my three courses", "collect the due dates from these pages")
+# are split by a planning model call (routed as "plan", see model_router)
+# into independent sub-goals. Only goals that look multi-part (see
+# ``looks_multi_part``) are sent to the planner; everything else runs as
+# one conversation without the extra model call.
+#
+# Each sub-goal runs as its own branch: its own browser context on the
+# shared browser and its own conversation. Playwright stays on the agent
+# thread, so branch actions run one at a time; the model calls of up to
+# FANOUT_PARALLELISM branches run concurrently, and a branch waiting for its
+# page to settle after acting (BRANCH_SETTLE_SECONDS) does not block the
+# others. The branches' finish texts are merged into one relevant_update,
+# and /status lists per-branch progress.
+#
+# FANOUT_MAX_BRANCHES caps the number of sub-goals (default 4),
+# FANOUT_BRANCH_TURNS the turns each branch may take (default 30) and
+# FANOUT_MIN_WORDS the length of a goal worth planning (default 6).
+
+logger = get_logger("fanout")
+
+PLANNER_PROMPT = """You plan work for a browser agent that helps a student.
+Decide whether the goal below consists of independent parts that could be
+done at the same time in separate browser tabs (for example visiting several
+sites or pages and collecting or comparing information). Parts must not
+depend on each other's results.
+
+Answer with JSON only: {"subgoals": ["...", "..."]}. Each sub-goal must be a
+complete, self-contained instruction. Use at most %d sub-goals. If the goal
+is a single sequential task, answer {"subgoals": []}.
+
+Goal: %s"""
+
+# pause after a branch's actions before its page is observed again (the
+# single conversation waits as long after each action)
+BRANCH_SETTLE_SECONDS = 1.0
+
+# words that suggest a goal covers several independent things
+_MULTI_PART = re.compile(
+    r"\b(?:compare|comparing|comparison|versus|vs|each|every|all (?:of )?(?:my|the)|both|several|multiple"
+    r"|two|three|four|five|collect|gather)\b"
+)
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class FanOutConfig:
+    def __init__(self, max_branches: int = 4, parallelism: int = 3, branch_turns: int = 30, min_words: int = 6):
+        self.max_branches = max(2, max_branches)
+        self.parallelism = max(1, parallelism)
+        self.branch_turns = branch_turns
+        self.min_words = min_words
+
+    @classmethod
+    def from_env(cls) -> "FanOutConfig | None":
+        if os.getenv("FANOUT", "0").lower() not in ("1", "true", "yes"):
+            return None
+        return cls(
+            max_branches=int(os.getenv("FANOUT_MAX_BRANCHES", "4")),
+            parallelism=int(os.getenv("FANOUT_PARALLELISM", "3")),
+            branch_turns=int(os.getenv("FANOUT_BRANCH_TURNS", "30")),
+            min_words=int(os.getenv("FANOUT_MIN_WORDS", "6")),
+        )
+
+    def qualifies(self, goal: str | None) -> bool:
+        """Whether ``goal`` is worth a planning call."""
+        return bool(goal) and len(goal.split()) >= self.min_words and looks_multi_part(goal)
+
+
+def looks_multi_part(goal: str) -> bool:
+    """Cheap check for goals naming several things: a comparison or
+    quantifier, a list of three or more items, or several links."""
+    text = goal.lower()
+    if _MULTI_PART.search(text):
+        return True
+    if text.count(",") >= 2 or text.count("\n") >= 1:
+        return True
+    return len(re.findall(r"https?://|www\.", text)) >= 2
+
+
+def _parse_subgoals(text: str, max_branches: int) -> list[str]:
+    match = re.search(r"\{.*\}", text or "", re.S)
+    if not match:
+        return []
+    try:
+        data = json.loads(match.group(0))
+    except ValueError:
+        return []
+    subgoals = [s.strip() for s in data.get("subgoals") or [] if isinstance(s, str) and s.strip()]
+    return subgoals[:max_branches]
+
+
+def plan_subgoals(models, client, goal: str, max_branches: int) -> list[str]:
+    """Split ``goal`` into independent sub-goals; [] when it should run as
+    a single sequential task (or planning fails)."""
+    if not goal:
+        return []
+    try:
+        with span(logger, "plan"):
+            response = models.generate(client, "plan", contents=PLANNER_PROMPT % (max_branches, goal), max_attempts=1)
+        subgoals = _parse_subgoals(response.text, max_branches)
+    except Exception as e:
+        logger.warning("fan-out planning failed: %s", e)
+        return []
+    return subgoals if len(subgoals) >= 2 else []
+
+
+class Branch:
+    """One sub-goal: its conversation, page and progress."""
+
+    def __init__(self, index: int, goal: str):
+        self.index = index
+        self.goal = goal
+        self.status = PENDING
+        self.turns = 0
+        self.contents = []
+        self.context = None
+        self.page = None
+        self.pages = None
+        self.url = ""
+        self.future = None
+        # actions of the current turn, observed once the page has settled
+        self.results = []
+        self.settle_until: float | None = None
+        self.finish_text: str | None = None
+        self.error: str | None = None
+        self.started: float | None = None
+        self.elapsed: float | None = None
+
+    def view(self) -> dict:
+        try:
+            url = self.page.url if self.page is not None else self.url
+        except Exception:
+            url = self.url
+        return {
+            "index": self.index,
+            "goal": self.goal,
+            "status": self.status,
+            "turns": self.turns,
+            "url": url,
+            "finish_text": self.finish_text,
+            "error": self.error,
+            "elapsed_s": round(self.elapsed, 2) if self.elapsed is not None else None,
+        }
+
+
+class FanOutRun:
+    """Branches of one fanned-out goal; ``view`` is read by request threads."""
+
+    def __init__(self, goal: str, subgoals: list[str]):
+        self.goal = goal
+        self.branches = [Branch(i, g) for i, g in enumerate(subgoals)]
+        self.started = time.monotonic()
+        self.elapsed: float | None = None
+        self._lock = threading.Lock()
+
+    def update(self, branch: Branch, **changes):
+        with self._lock:
+            for key, value in changes.items():
+                setattr(branch, key, value)
+
+    def finish(self, branch: Branch, status: str, text: str | None = None, error: str | None = None):
+        with self._lock:
+            branch.status = status
+            branch.finish_text = text
+            branch.error = error
+            if branch.started is not None:
+                branch.elapsed = time.monotonic() - branch.started
+
+    def merged_text(self) -> str:
+        """The branches' results as one answer, in sub-goal order."""
+        lines = []
+        for b in self.branches:
+            if b.status == DONE:
+                lines.append(f"{b.goal}: {b.finish_text or 'done'}")
+            else:
+                lines.append(f"{b.goal}: not completed ({b.error or b.status})")
+        return "\n".join(lines)
+
+    def view(self) -> dict:
+        with self._lock:
+            return {
+                "goal": self.goal,
+                "elapsed_s": round(self.elapsed if self.elapsed is not None else time.monotonic() - self.started, 2),
+                "branches": [b.view() for b in self.branches],
+            }
@@ -0,0 +1,38 @@
+import os
+import threading
+
+# The google-genai SDK takes most of a second to import, so the client is
+# built on first use (or during warm-up) instead of at startup.
+
+_client = None
+_client_lock = threading.Lock()
+
+MISSING_KEY_MESSAGE = (
+    "Missing API credentials for Google GenAI. "
+    "Set the environment variable GOOGLE_API_KEY with your API key."
+)
+
+
+def genai_configured() -> bool:
+    return bool(os.getenv("GOOGLE_API_KEY"))
+
+
+def genai_initialized() -> bool:
+    return _client is not None
+
+
+def get_genai_client():
+    """Return the shared Gemini client, creating it on first use.
+
+    Raises RuntimeError when GOOGLE_API_KEY is not set.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            api_key = os.getenv("GOOGLE_API_KEY")
+            if not api_key:
+                raise RuntimeError(MISSING_KEY_MESSAGE)
+            from google import genai
+
+            _client = genai.Client(api_key=api_key)
+        return _client
@@ -0,0 +1,169 @@
+import math
+import os
+import weakref
+
+# Click-target snapping. The model's clicks often land a few pixels beside
+# small links, checkboxes and buttons, which costs a whole turn to retry.
+# A per-page index of the bounding boxes of clickable elements (grid
+# buckets over viewport coordinates) moves a click that hits no target onto
+# the nearest one within CLICK_SNAP_TOLERANCE pixels (default 12). Clicks
+# are left alone when the element under them is clickable anyway (pointer
+# cursor included, so handlers added with addEventListener count), when two
+# candidates are about equally close, or when the candidate is covered by
+# another element at the snap point.
+#
+# Each click costs one evaluate that probes the point and compares a key
+# (URL, a MutationObserver version counter, scroll position and viewport
+# size); the rects are only collected again when the key changed.
+# CLICK_SNAP=0 disables snapping.
+
+CELL = 64
+# candidates closer than this to each other make a snap ambiguous
+AMBIGUITY_PX = 3
+
+_CLICKABLE = (
+    "a[href], button, input:not([type=hidden]), select, textarea, summary, label[for], "
+    "[role=button], [role=link], [role=checkbox], [role=radio], [role=tab], [role=menuitem], "
+    "[role=option], [role=switch], [onclick], [tabindex]:not([tabindex='-1']), [contenteditable=''], "
+    "[contenteditable=true]"
+)
+
+# One round trip per click. Tells whether the element under (x, y) is
+# clickable itself (a clickable ancestor, or cursor:pointer, which also
+# covers elements with addEventListener handlers) and returns {key} when the
+# page still matches ``known``, else also the rects of clickable elements as
+# [left, top, width, height, tag, label] in viewport pixels.
+_PROBE_JS = """
+({x, y, known}) => {
+  const selector = %s;
+  if (!window.__hitIndex) {
+    window.__hitIndex = {version: 0};
+    new MutationObserver(() => { window.__hitIndex.version++; }).observe(document, {
+      subtree: true, childList: true, attributes: true,
+      attributeFilter: ['class', 'style', 'hidden', 'disabled', 'aria-hidden', 'href'],
+    });
+  }
+  const hit = document.elementFromPoint(x, y);
+  const onTarget = !!hit && (!!hit.closest(selector) || getComputedStyle(hit).cursor === 'pointer');
+  const key = [location.href, window.__hitIndex.version, scrollX, scrollY, innerWidth, innerHeight].join('|');
+  if (key === known) return {key, onTarget};
+  const rects = [];
+  for (const el of document.querySelectorAll(selector)) {
+    const r = el.getBoundingClientRect();
+    if (r.width < 1 || r.height < 1 || r.bottom < 0 || r.right < 0 || r.top > innerHeight || r.left > innerWidth) continue;
+    const style = getComputedStyle(el);
+    if (style.visibility === 'hidden' || style.pointerEvents === 'none') continue;
+    const label = (el.getAttribute('aria-label') || el.innerText || el.value || el.getAttribute('title') || '')
+      .trim().replace(/\\s+/g, ' ').slice(0, 40);
+    rects.push([r.left, r.top, r.width, r.height, el.tagName.toLowerCase(), label]);
+    if (rects.length >= 2000) break;
+  }
+  return {key, onTarget, rects};
+}
+""" % repr(_CLICKABLE)
+
+# Whether the clickable element with bounding box ``rect`` is the topmost
+# element at (x, y), i.e. not covered by an overlay or another element.
+_TOPMOST_JS = """
+({x, y, rect}) => {
+  const hit = document.elementFromPoint(x, y);
+  const el = hit && hit.closest(%s);
+  if (!el) return false;
+  const r = el.getBoundingClientRect();
+  return Math.abs(r.left - rect[0]) < 1 && Math.abs(r.top - rect[1]) < 1
+    && Math.abs(r.width - rect[2]) < 1 && Math.abs(r.height - rect[3]) < 1;
+}
+""" % repr(_CLICKABLE)
+
+_indexes = weakref.WeakKeyDictionary()
+
+
+class HitIndex:
+    def __init__(self, tolerance: float = 12.0):
+        self.tolerance = tolerance
+        self.key = None
+        self.rects = []
+        self._grid: dict[tuple[int, int], list[int]] = {}
+        self.rebuilds = 0
+        self.snaps = 0
+
+    @classmethod
+    def for_page(cls, page) -> "HitIndex | None":
+        """The index of ``page`` (created on first use); None if disabled."""
+        if os.getenv("CLICK_SNAP", "1").lower() in ("0", "false", "no"):
+            return None
+        index = _indexes.get(page)
+        if index is None:
+            index = cls(tolerance=float(os.getenv("CLICK_SNAP_TOLERANCE", "12")))
+            _indexes[page] = index
+        return index
+
+    def probe(self, page, x: int, y: int) -> bool:
+        """Whether (x, y) is on a clickable element; rebuilds the index if
+        the page changed since the last probe (new URL, DOM mutation,
+        scroll or resize)."""
+        data = page.evaluate(_PROBE_JS, {"x": x, "y": y, "known": self.key})
+        if "rects" in data:
+            self._build(data["key"], data["rects"])
+        return bool(data.get("onTarget"))
+
+    def _build(self, key: str, rects: list):
+        self.key = key
+        self.rects = rects
+        self._grid = {}
+        pad = self.tolerance
+        for i, (left, top, width, height, _, _) in enumerate(self.rects):
+            for cx in range(int((left - pad) // CELL), int((left + width + pad) // CELL) + 1):
+                for cy in range(int((top - pad) // CELL), int((top + height + pad) // CELL) + 1):
+                    self._grid.setdefault((cx, cy), []).append(i)
+        self.rebuilds += 1
+
+    def snap_click(self, page, x: int, y: int) -> dict | None:
+        """Where to click instead of (x, y) on ``page``, or None. Clicks on
+        anything clickable (including unindexed elements with a pointer
+        cursor) stay put, and so do snaps onto covered elements."""
+        if self.probe(page, x, y):
+            return None
+        target = self.snap(x, y)
+        if target is None:
+            return None
+        if not page.evaluate(_TOPMOST_JS, {"x": target["x"], "y": target["y"], "rect": target["rect"]}):
+            return None
+        self.snaps += 1
+        return target
+
+    def snap(self, x: int, y: int) -> dict | None:
+        """The indexed target to click instead of (x, y), or None to click
+        as is: the point is on a target, no target is within tolerance, or
+        two targets are about equally close."""
+        candidates = []
+        for i in self._grid.get((int(x // CELL), int(y // CELL)), ()):
+            left, top, width, height, tag, label = self.rects[i]
+            dx = max(left - x, 0, x - (left + width))
+            dy = max(top - y, 0, y - (top + height))
+            distance = math.hypot(dx, dy)
+            if distance == 0:
+                return None
+            if distance <= self.tolerance:
+                candidates.append((distance, i))
+        if not candidates:
+            return None
+        candidates.sort()
+        if len(candidates) > 1 and candidates[1][0] - candidates[0][0] < AMBIGUITY_PX:
+            # a different element may be just as close; let it be
+            if self.rects[candidates[0][1]][:4] != self.rects[candidates[1][1]][:4]:
+                return None
+        distance, i = candidates[0]
+        left, top, width, height, tag, label = self.rects[i]
+        # land a little inside the target, not on its border
+        inset_x = min(4, width / 2)
+        inset_y = min(4, height / 2)
+        sx = min(max(x, left + inset_x), left + width - inset_x)
+        sy = min(max(y, top + inset_y), top + height - inset_y)
+        return {
+            "x": int(round(sx)),
+            "y": int(round(sy)),
+            "distance": round(distance, 1),
+            "target": f"{tag} {label!r}" if label else tag,
+            "rect": [left, top, width, height],
+        }
@@ -0,0 +1,179 @@
+import asyncio
+import threading
+import time
+
+BOUNDARY = "frame"
+
+
+class LiveStreamHub:
+    """Fans the agent's screencast frames out to any number of live viewers.
+
+    The hub is fed by a ScreencastCapture listener, which only swaps a
+    reference and notifies waiters, so it adds no work to the agent's turn
+    loop. Each frame is wrapped into its multipart chunk at most once and that
+    chunk is shared by every viewer. Viewers always take the newest frame when
+    they are ready for one, so slow consumers simply skip frames, and each
+    viewer is capped at ``max_fps``.
+
+    ``on_idle`` is called once nobody watches any more: the last viewer left
+    and no single-frame request (see ``hold``) is recent. The API uses it to
+    stop the screencast it started for viewers.
+    """
+
+    def __init__(self, max_fps: float = 5.0, max_viewers: int = 16, on_idle=None, hold_seconds: float = 10.0):
+        self.max_fps = max_fps
+        self.max_viewers = max_viewers
+        self.on_idle = on_idle
+        self.hold_seconds = hold_seconds
+        self._held_until = 0.0
+        self._cond = threading.Condition()
+        self._frame = None
+        self._chunk = None
+        self._chunk_frame = None
+        self.viewers = 0
+        self.frames_published = 0
+        self.chunks_encoded = 0
+
+    def publish(self, frame):
+        """Capture listener: remember the newest frame and wake viewers."""
+        with self._cond:
+            self._frame = frame
+            self.frames_published += 1
+            self._cond.notify_all()
+
+    def latest(self):
+        with self._cond:
+            return self._frame
+
+    def _chunk_for(self, frame) -> bytes:
+        # caller holds self._cond
+        # compare by identity: sequence numbers restart with every capture
+        if self._chunk_frame is not frame:
+            data = frame.data
+            header = (
+                f"--{BOUNDARY}\r\n"
+                f"Content-Type: {frame.mime_type}\r\n"
+                f"Content-Length: {len(data)}\r\n\r\n"
+            ).encode("ascii")
+            self._chunk = header + data + b"\r\n"
+            self._chunk_frame = frame
+            self.chunks_encoded += 1
+        return self._chunk  # type: ignore
+
+    def clamp_fps(self, fps: float | None) -> float:
+        """Frame rate for a viewer asking for ``fps``: within (0, max_fps]."""
+        if fps is None or not fps > 0:  # also rejects NaN
+            return self.max_fps
+        return min(fps, self.max_fps)
+
+    def attach_viewer(self) -> "ViewerSlot | None":
+        """Take a viewer slot, or None when ``max_viewers`` are watching."""
+        with self._cond:
+            if self.viewers >= self.max_viewers:
+                return None
+            self.viewers += 1
+            return ViewerSlot(self)
+
+    def _detach_viewer(self):
+        with self._cond:
+            self.viewers = max(0, self.viewers - 1)
+        self._check_idle()
+
+    def hold(self):
+        """Keep frames coming for ``hold_seconds`` without a viewer (the
+        single-frame endpoint, which is polled)."""
+        with self._cond:
+            self._held_until = time.monotonic() + self.hold_seconds
+        timer = threading.Timer(self.hold_seconds, self._check_idle)
+        timer.daemon = True
+        timer.start()
+
+    def _check_idle(self):
+        # under the lock, so a viewer attaching meanwhile is not cut off
+        with self._cond:
+            if self.on_idle is not None and self.viewers == 0 and time.monotonic() >= self._held_until:
+                self.on_idle()
+
+    def stream(self, slot: "ViewerSlot", fps: float | None = None, idle_timeout: float = 10.0, alive=None):
+        """Generator yielding multipart chunks for the viewer holding ``slot``.
+
+        The slot is released when the generator ends; callers should also
+        release it when the response is closed, in case it is never
+        iterated. The stream ends once ``alive()`` returns False (e.g. the
+        agent stopped). When no new frame arrives within ``idle_timeout``
+        the last frame is re-sent so proxies and browsers keep the
+        connection open.
+        """
+        interval = 1.0 / self.clamp_fps(fps)
+        last = None
+        sent_at = 0.0
+        with slot:
+            while alive is None or alive():
+                delay = sent_at + interval - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                with self._cond:
+                    if self._frame is None or self._frame is last:
+                        # wake up now and then to notice the agent stopping
+                        self._cond.wait(timeout=min(idle_timeout, 1.0))
+                    frame = self._frame
+                    if frame is None or (frame is last and time.monotonic() - sent_at < idle_timeout):
+                        continue
+                    chunk = self._chunk_for(frame)
+                last = frame
+                sent_at = time.monotonic()
+                yield chunk
+
+    async def astream(self, slot: "ViewerSlot", fps: float | None = None, idle_timeout: float = 10.0, alive=None):
+        """asyncio version of ``stream`` for the ASGI app (no thread per viewer)."""
+        interval = 1.0 / self.clamp_fps(fps)
+        last = None
+        last_sent_at = 0.0
+        with slot:
+            while alive is None or alive():
+                with self._cond:
+                    frame = self._frame
+                    stale = frame is None or frame is last
+                    if frame is not None and (not stale or time.monotonic() - last_sent_at >= idle_timeout):
+                        chunk = self._chunk_for(frame)
+                    else:
+                        chunk = None
+                if chunk is not None:
+                    last = frame
+                    last_sent_at = time.monotonic()
+                    yield chunk
+                await asyncio.sleep(interval)
+
+    def stats(self) -> dict:
+        with self._cond:
+            frame = self._frame
+            return {
+                "viewers": self.viewers,
+                "max_fps": self.max_fps,
+                "frames_published": self.frames_published,
+                "chunks_encoded": self.chunks_encoded,
+                "latest_seq": frame.seq if frame else None,
+            }
+
+
+class ViewerSlot:
+    """One viewer's place in a LiveStreamHub. ``release`` is idempotent, so
+    the stream generator and the response close hook can both call it."""
+
+    def __init__(self, hub: LiveStreamHub):
+        self._hub = hub
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._hub._detach_viewer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
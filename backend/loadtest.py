@@ -0,0 +1,325 @@
+"""Load-test the HTTP API against stand-in agent and speech backends.
+
+    python backend/loadtest.py [--server flask|asgi] [--duration 20] [--concurrency 16]
+        [--mix status=70,command=10,transcribe=10,tts=10]
+        [--agent-latency-ms 0] [--tts-latency-ms 300] [--stt-latency-ms 400]
+        [--profile api.prof]
+
+The real app from main.py (or asgi.py) is served in-process on a free port.
+The agent and the speech providers are replaced by stand-ins with fixed
+latencies, so the numbers are about the serving layer only. Clients replay a
+weighted mix of /status polling, /command, /transcribe_audio and
+/text_to_speech. The report shows throughput, errors and 429s, and
+p50/p95/p99 latency per route. --profile writes cProfile stats of request
+handling in the Flask app (read them with ``python -m pstats api.prof``).
+"""
+import argparse
+import asyncio
+import cProfile
+import io
+import itertools
+import logging
+import math
+import os
+import pstats
+import random
+import socket
+import statistics
+import threading
+import time
+import wave
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+# the stand-in agent keeps no state worth resuming
+os.environ["CHECKPOINT_EVERY"] = "0"
+
+import requests  # noqa: E402
+
+import main  # noqa: E402
+from speech_providers import SpeechAudio, SpeechRouter  # noqa: E402
+from tts_prefetch import SpeechPrefetcher  # noqa: E402
+
+ROUTES = ("status", "command", "transcribe", "tts")
+
+
+class StandInSpeech:
+    """Speech provider that answers after a fixed delay."""
+
+    name = "standin"
+
+    def __init__(self, tts_latency: float, stt_latency: float):
+        self.tts_latency = tts_latency
+        self.stt_latency = stt_latency
+
+    def supports(self, kind: str) -> bool:
+        return True
+
+    def synthesize(self, text, voice_id, output_format=None):
+        time.sleep(self.tts_latency)
+        return SpeechAudio(b"\0" * 16000, "audio/mpeg", self.name)
+
+    def stream(self, text, voice_id, output_format=None):
+        return "audio/mpeg", iter([self.synthesize(text, voice_id).data])
+
+    def transcribe(self, path):
+        time.sleep(self.stt_latency)
+        return "open my calendar"
+
+    async def asynthesize(self, text, voice_id, output_format=None):
+        await asyncio.sleep(self.tts_latency)
+        return SpeechAudio(b"\0" * 16000, "audio/mpeg", self.name)
+
+    async def atranscribe(self, path):
+        await asyncio.sleep(self.stt_latency)
+        return "open my calendar"
+
+
+class StandInAgent:
+    """Agent with the AgentRunner API whose control calls take ``latency``."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.running = True
+        self.update_id = 0
+        self.current_goal = "summarize my assignments"
+        self.current_site = None
+        self.commands = 0
+        self._lock = threading.Lock()
+
+    def start(self, initial_goal=None, resume=False, site=None):
+        time.sleep(self.latency)
+        self.running = True
+        self.current_goal = initial_goal
+        self.current_site = site
+
+    def stop(self):
+        time.sleep(self.latency)
+        self.running = False
+
+    def enqueue_command(self, cmd):
+        time.sleep(self.latency)
+        with self._lock:
+            self.commands += 1
+            self.update_id += 1
+
+    def update_goal(self, new_goal, site=None):
+        time.sleep(self.latency)
+        with self._lock:
+            self.current_goal = new_goal
+            self.current_site = site
+            self.update_id += 1
+
+    def publish_answer(self, goal, answer):
+        pass
+
+    def request_capture(self):
+        pass
+
+    def release_capture(self):
+        pass
+
+    def add_frame_listener(self, fn):
+        pass
+
+    def add_answer_listener(self, fn):
+        pass
+
+    def add_update_listener(self, fn):
+        pass
+
+    def snapshot(self, debug=False):
+        return {
+            "running": self.running,
+            "last_results": [["click_at", {"clicked": [100, 200]}]] * 3,
+            "current_url": "https://canvas.example.edu/courses",
+            "current_goal": self.current_goal,
+            "goals_history": ["open canvas"] * 5,
+            "update_id": self.update_id,
+            "relevant_update": "You have three assignments due this week. " * 4,
+            "trace_id": "0" * 16,
+            "fanout": None,
+        }
+
+
+class _ProfiledApp:
+    """WSGI middleware profiling each request into one shared Stats."""
+
+    def __init__(self, app):
+        self.app = app
+        self.lock = threading.Lock()
+        self.stats: pstats.Stats | None = None
+
+    def __call__(self, environ, start_response):
+        profile = cProfile.Profile()
+        profile.enable()
+        body = None
+        try:
+            # materialize the body so its generation is profiled too
+            body = self.app(environ, start_response)
+            return [b"".join(body)]
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+            profile.disable()
+            with self.lock:
+                if self.stats is None:
+                    self.stats = pstats.Stats(profile, stream=io.StringIO())
+                else:
+                    self.stats.add(profile)
+
+
+def install_stand_ins(args):
+    agent = StandInAgent(args.agent_latency_ms / 1000)
+    main.agent = agent
+    main.replication.agent = agent
+    main.speech = SpeechRouter([StandInSpeech(args.tts_latency_ms / 1000, args.stt_latency_ms / 1000)])
+    main.tts_prefetch = SpeechPrefetcher(main.speech) if main.tts_prefetch is not None else None
+    return agent
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve(kind: str, port: int):
+    """Serve the app on ``port`` in a daemon thread."""
+    if kind == "flask":
+        from werkzeug.serving import make_server
+
+        # no access log line per request
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        server = make_server("127.0.0.1", port, main.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server.shutdown
+    import uvicorn
+
+    import asgi
+
+    server = uvicorn.Server(uvicorn.Config(asgi.app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    def stop():
+        server.should_exit = True
+
+    return stop
+
+
+def _wav(seconds: float = 1.0, rate: int = 16000) -> bytes:
+    # a tone, so audio preprocessing finds "speech" and STT is called
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        frames = bytearray()
+        for i in range(int(seconds * rate)):
+            v = int(8000 * math.sin(2 * math.pi * 220 * i / rate) * (0.6 + 0.4 * math.sin(2 * math.pi * 3 * i / rate)))
+            frames += v.to_bytes(2, "little", signed=True)
+        w.writeframes(bytes(frames))
+    return buf.getvalue()
+
+
+def _request(session, base: str, route: str, audio: bytes, n: int):
+    if route == "status":
+        return session.get(f"{base}/status")
+    if route == "command":
+        return session.post(f"{base}/command", json={"command": f"scroll down {n}"})
+    if route == "transcribe":
+        return session.post(f"{base}/transcribe_audio", files={"file": (f"clip{n}.wav", audio, "audio/wav")})
+    # distinct texts so the speech prefetcher cannot answer from memory
+    return session.post(f"{base}/text_to_speech", json={"text": f"You have {n} assignments due this week."})
+
+
+def run(args):
+    mix = dict.fromkeys(ROUTES, 0)
+    for item in args.mix.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in mix:
+            raise SystemExit(f"unknown route in --mix: {name}")
+        mix[name.strip()] = float(weight)
+    routes = [r for r in ROUTES if mix[r] > 0]
+    weights = [mix[r] for r in routes]
+
+    install_stand_ins(args)
+    profiler = None
+    if args.profile:
+        profiler = _ProfiledApp(main.app.wsgi_app)
+        main.app.wsgi_app = profiler
+    port = _free_port()
+    stop_server = serve(args.server, port)
+    base = f"http://127.0.0.1:{port}"
+    audio = _wav()
+
+    latencies = {r: [] for r in routes}
+    errors = dict.fromkeys(routes, 0)
+    rejected = dict.fromkeys(routes, 0)
+    lock = threading.Lock()
+    counter = itertools.count()
+    deadline = time.monotonic() + args.duration
+
+    def client(seed: int):
+        rng = random.Random(seed)
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            route = rng.choices(routes, weights)[0]
+            start = time.perf_counter()
+            try:
+                status = _request(session, base, route, audio, next(counter)).status_code
+            except requests.RequestException:
+                status = None
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies[route].append(elapsed)
+                if status == 429:
+                    rejected[route] += 1
+                elif status is None or status >= 400:
+                    errors[route] += 1
+            if route == "status" and args.poll_interval_ms:
+                time.sleep(args.poll_interval_ms / 1000)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.monotonic() - started
+    stop_server()
+
+    total = sum(len(v) for v in latencies.values())
+    print(f"server={args.server} concurrency={args.concurrency} duration={wall:.1f}s "
+          f"requests={total} throughput={total / wall:.1f} req/s")
+    print(f"{'route':<12}{'count':>8}{'req/s':>9}{'errors':>8}{'429':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for route in routes:
+        values = sorted(latencies[route])
+        if not values:
+            continue
+        q = statistics.quantiles(values, n=100) if len(values) > 1 else values * 99
+        print(f"{route:<12}{len(values):>8}{len(values) / wall:>9.1f}{errors[route]:>8}{rejected[route]:>6}"
+              f"{q[49] * 1000:>9.1f}{q[94] * 1000:>9.1f}{q[98] * 1000:>9.1f}")
+    if profiler is not None and profiler.stats is not None:
+        profiler.stats.dump_stats(args.profile)
+        print(f"profile written to {args.profile}")
+        out = io.StringIO()
+        profiler.stats.stream = out
+        profiler.stats.sort_stats("cumulative").print_stats(15)
+        print(out.getvalue())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--server", choices=("flask", "asgi"), default="flask")
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mix", default="status=70,command=10,transcribe=10,tts=10")
+    parser.add_argument("--poll-interval-ms", type=float, default=0.0,
+                        help="pause after each /status request, like a polling frontend")
+    parser.add_argument("--agent-latency-ms", type=float, default=0.0)
+    parser.add_argument("--tts-latency-ms", type=float, default=300.0)
+    parser.add_argument("--stt-latency-ms", type=float, default=400.0)
+    parser.add_argument("--profile", metavar="FILE")
+    run(parser.parse_args())
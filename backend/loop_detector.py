@@ -0,0 +1,144 @@
+import hashlib
+import os
+import threading
+from collections import deque
+
+# Detects agent turns that make no progress: the same action repeated on an
+# unchanged screen, back-and-forth moves that keep returning to the same
+# screens (e.g. scrolling down and up), or a screen that stays the same
+# whatever the model does. Responses escalate with each detection in a goal:
+#
+#   1. "hint"      a corrective note is added to the next model turn
+#   2. "escalate"  observations switch to fresh screenshots, plus a
+#                  stronger note listing the repeated actions
+#   3. "stop"      the goal ends with an explanatory relevant_update
+#
+# LOOP_DETECTOR=0 disables it; LOOP_REPEAT_THRESHOLD sets how many
+# no-progress turns count as a loop (default 3).
+
+HINT = "hint"
+ESCALATE = "escalate"
+STOP = "stop"
+
+_COORD_KEYS = {"x", "y", "destination_x", "destination_y"}
+
+
+def action_signature(name: str, args: dict) -> str:
+    """Stable signature of an action; coordinates are bucketed so clicks a
+    few pixels apart count as the same action."""
+    items = []
+    for key in sorted(args or {}):
+        value = args[key]
+        if key in _COORD_KEYS and isinstance(value, (int, float)):
+            value = int(value) // 20
+        items.append(f"{key}={value}")
+    return f"{name}({','.join(items)})"
+
+
+def screen_hash(data: bytes) -> str:
+    return hashlib.sha1(data or b"").hexdigest()[:16]
+
+
+class Verdict:
+    __slots__ = ("level", "reason", "message")
+
+    def __init__(self, level: str, reason: str, message: str):
+        self.level = level
+        self.reason = reason
+        self.message = message
+
+
+class LoopDetector:
+    def __init__(self, window: int = 8, repeat_threshold: int = 3):
+        self.window = window
+        self.repeat_threshold = max(2, repeat_threshold)
+        self._lock = threading.Lock()
+        self._turns = deque(maxlen=window)
+        self.level = 0
+        self.wasted_turns = 0
+        # totals across goals
+        self.total_wasted_turns = 0
+        self.hints = 0
+        self.escalations = 0
+        self.stops = 0
+
+    @classmethod
+    def from_env(cls) -> "LoopDetector | None":
+        if os.getenv("LOOP_DETECTOR", "1").lower() in ("0", "false", "no"):
+            return None
+        return cls(repeat_threshold=int(os.getenv("LOOP_REPEAT_THRESHOLD", "3")))
+
+    def reset(self):
+        """Start tracking a new goal."""
+        with self._lock:
+            self._turns.clear()
+            self.level = 0
+            self.wasted_turns = 0
+
+    def observe(self, actions: list[tuple[str, dict]], screenshot: bytes, url: str) -> Verdict | None:
+        """Record one turn (its actions and the resulting screen) and return
+        a verdict when the recent turns look like a loop."""
+        signature = "|".join(action_signature(n, a) for n, a in actions)
+        state = (screen_hash(screenshot), url or "")
+        with self._lock:
+            self._turns.append((signature, state))
+            found = self._detect()
+            if found is None:
+                return None
+            reason, wasted = found
+            self.wasted_turns += wasted
+            self.total_wasted_turns += wasted
+            self.level += 1
+            repeated = sorted({sig for sig, _ in list(self._turns)[-self.repeat_threshold:]})
+            # start over so the next verdict needs fresh evidence
+            self._turns.clear()
+            if self.level == 1:
+                self.hints += 1
+                return Verdict(HINT, reason, (
+                    f"Note: your last {self.repeat_threshold} actions did not change the page ({reason}). "
+                    "Do not repeat them. Try a different element, navigate directly to a URL, "
+                    "or finish with what you already know."
+                ))
+            if self.level == 2:
+                self.escalations += 1
+                return Verdict(ESCALATE, reason, (
+                    f"Warning: you are still not making progress ({reason}). These actions had no effect: "
+                    f"{'; '.join(repeated)}. The screenshot is now freshly captured. Choose a clearly "
+                    "different approach, or stop and report what you found."
+                ))
+            self.stops += 1
+            return Verdict(STOP, reason, (
+                "I stopped because I kept repeating the same steps without making progress "
+                f"({reason}). Please rephrase the request or point me to the right page."
+            ))
+
+    def _detect(self) -> tuple[str, int] | None:
+        """Return (reason, wasted turns) for a loop in the recent turns."""
+        turns = list(self._turns)
+        n = self.repeat_threshold
+        if len(turns) < n:
+            return None
+        recent = turns[-n:]
+        states = {state for _, state in recent}
+        signatures = {sig for sig, _ in recent}
+        if len(states) == 1 and len(signatures) == 1:
+            return "same action on an unchanged screen", n - 1
+        if len(states) == 1:
+            return "screen unchanged", n - 1
+        # back-and-forth: the screen keeps alternating between two states
+        if len(turns) >= 4:
+            a, b, c, d = (state for _, state in turns[-4:])
+            if a == c and b == d and a != b:
+                return "moving back and forth between the same screens", 2
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "goal_wasted_turns": self.wasted_turns,
+                "level": self.level,
+                "total_wasted_turns": self.total_wasted_turns,
+                "hints": self.hints,
+                "escalations": self.escalations,
+                "stops": self.stops,
+            }
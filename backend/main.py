@@ -1,5 +1,6 @@
 import os 
 import sys
+import threading
 from pathlib import Path
 
 # Get the project root directory (parent of backend folder)
@@ -10,43 +11,177 @@ from dotenv import load_dotenv
 
 # Load environment variables from a .env file
 load_dotenv()
-from google import genai
-from elevenlabs_utils import transcribe_audio_file
-from elevenlabs_tts import text_to_speech, text_to_speech_stream
+from audio_preprocess import preprocess_audio_file, audio_stats
+from streaming_stt import TranscriptionStreams, streaming_backend_from_env
+from admission import AdmissionController
+from speech_providers import SpeechProviderError, speech_router_from_env
 from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 from agent_runner import AgentRunner
-
-# Initialize genai from environment to avoid embedding secrets in code.
-api_key = os.getenv("GOOGLE_API_KEY")
-if api_key:
-    client = genai.Client(api_key=api_key)
-else:
-    sys.exit(
-        "Missing API credentials for Google GenAI.\n"
-        "Set the environment variable GOOGLE_API_KEY with your API key, or configure\n"
-        "the client with vertexai/project/location per the SDK docs.\n"
-        "(Also: remove any hard-coded keys from source and rotate them if exposed.)"
-    )
+from live_stream import LiveStreamHub, BOUNDARY as LIVE_BOUNDARY
+from worker_pool import AgentSupervisor, ProcessAgent, tree_rss_bytes
+from tracing import get_logger
+from genai_client import MISSING_KEY_MESSAGE, genai_configured, genai_initialized, get_genai_client
+from startup import Warmup
+from answer_cache import AnswerCache
+from tts_prefetch import SpeechPrefetcher
+from state_store import SessionReplicator, replica_id_from_env, state_store_from_env
+from checkpoint import SessionCheckpointer
+
+logger = get_logger("api")
+
+# The Gemini client (GOOGLE_API_KEY), ElevenLabs clients and Playwright are
+# all created on first use, so the API boots without them; /readyz reports
+# what is available.
+if not genai_configured():
+    logger.warning(MISSING_KEY_MESSAGE + " The agent cannot start until it is set.")
 
 # Constants for screen dimensions
 SCREEN_WIDTH = 1440
 SCREEN_HEIGHT = 900
 
-# Playwright/browser placeholders (initialized on FastAPI startup to avoid event-loop conflicts)
-playwright = None
-browser = None
-context = None
-page = None
-
 # Specify predefined functions to exclude (optional)
 excluded_functions = []
 
+# TTS/STT go through a provider router with failover (SPEECH_PROVIDERS)
+speech = speech_router_from_env()
+
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["Retry-After"])
+
+# Bounded worker pools per endpoint class; requests beyond a pool's queue get
+# 429 + Retry-After. Agent control has its own pool so /stop never waits
+# behind slow speech requests.
+admission = AdmissionController()
+admission.add_pool("speech", int(os.getenv("SPEECH_CONCURRENCY", "4")), int(os.getenv("SPEECH_QUEUE", "8")))
+admission.add_pool("control", int(os.getenv("CONTROL_CONCURRENCY", "8")), int(os.getenv("CONTROL_QUEUE", "32")))
+admission.add_pool("status", int(os.getenv("STATUS_CONCURRENCY", "16")), int(os.getenv("STATUS_QUEUE", "64")))
 # Agent will initialize Playwright and page inside its thread; do not start
 # Playwright at module import time to avoid greenlet/thread issues.
-agent = AgentRunner(client)
+# With AGENT_ISOLATION=process each session runs in a supervised worker
+# process instead of a thread of this one.
+supervisor = None
+if os.getenv("AGENT_ISOLATION", "thread").lower() == "process":
+    supervisor = AgentSupervisor.from_env(SCREEN_WIDTH, SCREEN_HEIGHT)
+    # fixed checkpoint name so CHECKPOINT_RESUME finds it after a restart
+    agent = ProcessAgent(supervisor, checkpoint_name="session")
+else:
+    agent = AgentRunner()
+# Live view of the agent's page. The hub is fed straight from the agent's
+# screencast frames; the screencast itself starts when the first viewer asks
+# and stops again once nobody is watching.
+live_hub = LiveStreamHub(
+    max_fps=float(os.getenv("LIVE_MAX_FPS", "5")),
+    on_idle=lambda: agent.release_capture(),
+)
+agent.add_frame_listener(live_hub.publish)
+
+# Final answers of finished goals, served again for repeated questions. The
+# agent carries the site scope a goal was submitted with and reports it back
+# with the answer.
+answers = AnswerCache.from_env()
+
+
+def _remember_answer(goal, finish_text, summary, site=None):
+    answers.put(goal, finish_text, summary, site=site)
+
+
+agent.add_answer_listener(_remember_answer)
+
+# Speculative TTS: synthesize each settled relevant_update in the background
+# so /text_to_speech can answer from memory (TTS_PREFETCH=0 disables).
+tts_prefetch = SpeechPrefetcher.from_env(speech)
+if tts_prefetch is not None:
+    agent.add_update_listener(tts_prefetch.schedule)
+
+
+def _cached_answer(goal, payload):
+    """Serve ``goal`` from the answer cache unless the request asks for a
+    fresh run. Returns the response for a hit, else None."""
+    if not goal or payload.get('fresh'):
+        return None
+    hit = answers.get(goal, payload.get('site'))
+    if hit is None:
+        return None
+    agent.publish_answer(goal, hit.answer)
+    return jsonify({"status": "cached", **hit.as_dict()})
+
+
+def _warm_speech():
+    if os.getenv("ELEVENLABS_API_KEY"):
+        from elevenlabs_tts import get_client
+        get_client()
+
+
+def _warm_playwright():
+    import playwright.sync_api  # noqa: F401
+
+
+# Optional background warm-up (WARMUP=1): pay the SDK import and client
+# construction costs right after boot instead of on the first request.
+warmup = Warmup()
+if genai_configured():
+    warmup.add_step("genai", get_genai_client)
+warmup.add_step("playwright", _warm_playwright)
+warmup.add_step("speech", _warm_speech)
+
+
+def _apply_control(op, payload):
+    """Apply a control request forwarded by another replica."""
+    if op == "command" and agent.running:
+        agent.enqueue_command(payload['command'])
+    elif op == "update_goal" and agent.running:
+        agent.update_goal(payload['goal'], site=payload.get('site'))
+    elif op == "stop" and agent.running:
+        agent.stop()
+
+
+# Shared state (STATE_STORE): the replica running the session publishes its
+# snapshots, so any replica can answer /status and /events, and control
+# requests reaching another replica are forwarded to the owner.
+replication = SessionReplicator(state_store_from_env(), replica_id_from_env(), agent, _apply_control)
+
+_services_lock = threading.Lock()
+_services_started = False
+
+
+def start_services():
+    """Start the background work of the API process: replication, the
+    optional warm-up and resuming a checkpointed session.
+
+    Not done at import time: agent worker processes are spawned and
+    re-import this module as ``__mp_main__``, and must not start any of it.
+    Called by the dev server below and by the ASGI app on startup.
+    """
+    global _services_started
+    with _services_lock:
+        if _services_started:
+            return
+        _services_started = True
+    replication.start()
+    if os.getenv("WARMUP", "0").lower() in ("1", "true", "yes"):
+        warmup.start()
+    # CHECKPOINT_RESUME=1: continue a session the previous process left
+    # behind (crash or kill) from its last checkpoint.
+    if os.getenv("CHECKPOINT_RESUME", "0").lower() in ("1", "true", "yes") and genai_configured():
+        checkpoints = SessionCheckpointer.from_env()
+        if checkpoints is not None and checkpoints.exists() and replication.claim():
+            try:
+                agent.start(resume=True)
+                logger.info("resumed agent session from checkpoint")
+            except RuntimeError as e:
+                replication.release()
+                logger.warning("could not resume agent session: %s", e)
+
+
+def _forwarded(op, payload):
+    """Forward ``op`` to the replica running the session, if that is
+    another one. Returns the response when forwarded, else None."""
+    owner = replication.forward(op, payload)
+    if owner is None:
+        return None
+    return jsonify({"status": "forwarded", "op": op, "replica": owner}), 202
+
 
 # Define helper functions. Copy/paste from steps 3 and 4
 def denormalize_x(x: int, screen_width: int) -> int:
@@ -58,6 +193,7 @@ def denormalize_y(y: int, screen_height: int) -> int:
     return int(y / 1000 * screen_height)
 
 @app.route('/transcribe_audio', methods=['POST'])
+@admission.limit('speech')
 def api_transcribe_audio():
     if 'file' not in request.files:
         return jsonify({"error": "No file provided"}), 400
@@ -66,56 +202,136 @@ def api_transcribe_audio():
     temp_path = f"/tmp/{file.filename}"
     file.save(temp_path)
 
+    processed = None
     try:
-        transcription = transcribe_audio_file(temp_path)
+        # Trim silence and compact the recording; skip STT entirely when
+        # there is no speech in it.
+        processed = preprocess_audio_file(temp_path)
+        if not processed.speech:
+            return jsonify({"status": "no_speech", "text": "", "audio": processed.stats})
+
+        try:
+            transcription = speech.transcribe(processed.path)
+        except SpeechProviderError as e:
+            logger.error("transcription failed: %s", e)
+            transcription = ""
         
         # Queue transcription text into the agent if it's running
         if agent.running and transcription:
             agent.enqueue_command(transcription)
     finally:
+        if processed is not None:
+            processed.cleanup()
         if os.path.exists(temp_path):
             os.remove(temp_path)
 
-    return jsonify({"status": "transcribed", "text": transcription})
+    return jsonify({"status": "transcribed", "text": transcription, "audio": processed.stats})
+
+transcription_streams = TranscriptionStreams(backend_factory=lambda: streaming_backend_from_env(speech))
+
+
+def _enqueue_transcription(text: str):
+    if agent.running and text:
+        agent.enqueue_command(text)
+
+
+@app.route('/transcribe_stream', methods=['POST'])
+@admission.limit('speech')
+def api_transcribe_stream_open():
+    """Open a streaming transcription. ``format`` is 'pcm16' (16 kHz mono
+    PCM16 chunks) or 'container' (e.g. webm chunks from MediaRecorder)."""
+    payload = request.get_json(silent=True) or {}
+    input_format = payload.get('format') or request.args.get('format', 'pcm16')
+    try:
+        stream_id, stream = transcription_streams.open(on_final=_enqueue_transcription, input_format=input_format)
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 429
+    return jsonify({"status": "open", "stream_id": stream_id, "format": stream.input_format})
+
+
+@app.route('/transcribe_stream/<stream_id>/chunk', methods=['POST'])
+@admission.limit('speech')
+def api_transcribe_stream_chunk(stream_id):
+    """Append an audio chunk (raw request body) and return the current text."""
+    stream = transcription_streams.get(stream_id)
+    if stream is None:
+        return jsonify({"error": "unknown stream"}), 404
+    stream.add_chunk(request.get_data())
+    return jsonify(stream.state())
+
+
+@app.route('/transcribe_stream/<stream_id>', methods=['GET'])
+@admission.limit('status')
+def api_transcribe_stream_state(stream_id):
+    stream = transcription_streams.get(stream_id)
+    if stream is None:
+        return jsonify({"error": "unknown stream"}), 404
+    return jsonify(stream.state())
+
+
+@app.route('/transcribe_stream/<stream_id>/finish', methods=['POST'])
+@admission.limit('speech')
+def api_transcribe_stream_finish(stream_id):
+    """Close the stream. The last utterance is queued into the agent;
+    earlier ones were delivered when they stabilized. ``text`` is all of it."""
+    stream = transcription_streams.close(stream_id)
+    if stream is None:
+        return jsonify({"error": "unknown stream"}), 404
+    text = stream.finish()
+    return jsonify({"status": "transcribed", "text": text, **stream.state()})
+
 
 @app.route('/start', methods=['POST'])
+@admission.limit('control')
 def api_start():
     payload = request.get_json() or {}
     goal = payload.get('goal')
+    owner = replication.remote_owner()
+    if owner is not None:
+        return jsonify({"error": "session is running on another replica", "replica": owner}), 409
+    if not agent.running:
+        cached = _cached_answer(goal, payload)
+        if cached is not None:
+            return cached
     try:
-        agent.start(goal)
+        if not agent.running and not replication.claim():
+            return jsonify({"error": "session is running on another replica"}), 409
+        agent.start(goal, site=payload.get('site'))
         return jsonify({"status": "started", "goal": goal})
     except RuntimeError as e:
+        if not agent.running:
+            replication.release()
         return jsonify({"error": str(e)}), 400
 
 
 @app.route('/command', methods=['POST'])
+@admission.limit('control')
 def api_command():
-    if not agent.running:
-        return jsonify({"error": "Agent not running"}), 400
     payload = request.get_json() or {}
     cmd = payload.get('command')
     if not cmd:
         return jsonify({"error": "missing command"}), 400
+    forwarded = _forwarded("command", {"command": cmd})
+    if forwarded is not None:
+        return forwarded
+    if not agent.running:
+        return jsonify({"error": "Agent not running"}), 400
     agent.enqueue_command(cmd)
     return jsonify({"status": "queued", "command": cmd})
 
 
 @app.route('/status', methods=['GET'])
+@admission.limit('status')
 def api_status():
-    return jsonify({
-        "running": agent.running,
-        "last_results": agent.last_results,
-    "current_url": (getattr(agent, "page", None).url if getattr(agent, "page", None) is not None else ""), # type: ignore
-        "current_goal": agent.current_goal,
-        "goals_history": agent.goals_history,
-        "update_id": agent.update_id,
-        "relevant_update": getattr(agent, 'relevant_update', None),
-    })
+    return jsonify(replication.snapshot())
 
 
 @app.route('/stop', methods=['POST'])
+@admission.limit('control')
 def api_stop():
+    forwarded = _forwarded("stop", {})
+    if forwarded is not None:
+        return forwarded
     if not agent.running:
         return jsonify({"status": "not_running"})
     agent.stop()
@@ -123,125 +339,193 @@ def api_stop():
 
 
 @app.route('/update_goal', methods=['POST'])
+@admission.limit('control')
 def api_update_goal():
-    if not agent.running:
-        return jsonify({"error": "Agent not running"}), 400
     payload = request.get_json() or {}
     goal = payload.get('goal')
     if not goal:
         return jsonify({"error": "missing goal"}), 400
-    agent.update_goal(goal)
+    forwarded = _forwarded("update_goal", {"goal": goal, "site": payload.get('site')})
+    if forwarded is not None:
+        return forwarded
+    if not agent.running:
+        return jsonify({"error": "Agent not running"}), 400
+    cached = _cached_answer(goal, payload)
+    if cached is not None:
+        return cached
+    agent.update_goal(goal, site=payload.get('site'))
     return jsonify({"status": "updated", "goal": goal})
 
 
 @app.route('/debug', methods=['GET'])
+@admission.limit('status')
 def api_debug():
     """Return debugging info about the agent internals for diagnosis."""
-    thread_alive = False
+    info = agent.snapshot(debug=True)
+    info['live'] = live_hub.stats()
+    info['audio'] = audio_stats()
+    info['speech'] = speech.stats()
+    info['admission'] = admission.stats()
+    info['answer_cache'] = answers.stats()
+    info['tts_prefetch'] = tts_prefetch.stats() if tts_prefetch is not None else None
+    info['state_store'] = replication.stats()
+    # resident memory of this process and its children (local Chromium)
+    info['memory'] = {'rss_bytes': tree_rss_bytes(os.getpid())}
+    return jsonify(info)
+
+
+@app.route('/healthz', methods=['GET'])
+def api_healthz():
+    """Liveness: the process is up and serving requests."""
+    return jsonify({"status": "ok"})
+
+
+@app.route('/readyz', methods=['GET'])
+def api_readyz():
+    """Readiness: which subsystems are available. 503 until the agent can
+    be started (GOOGLE_API_KEY set) and any warm-up has finished."""
+    subsystems = {
+        "genai": {"configured": genai_configured(), "initialized": genai_initialized()},
+        "playwright": {"loaded": "playwright.sync_api" in sys.modules},
+        "speech": {
+            p.name: {"tts": p.supports("tts"), "stt": p.supports("stt")} for p in speech.providers
+        },
+        "agent": {"running": agent.running, "isolation": "process" if supervisor else "thread"},
+        "warmup": warmup.stats(),
+    }
+    ready = genai_configured() and not warmup.in_progress
+    return jsonify({"ready": ready, "subsystems": subsystems}), 200 if ready else 503
+
+
+@app.route('/live', methods=['GET'])
+def api_live():
+    """Stream the agent's page as MJPEG-style multipart frames."""
+    if not agent.running:
+        return jsonify({"error": "Agent not running"}), 503
+    # attach first: the hub stops the screencast whenever it has no viewers
+    slot = live_hub.attach_viewer()
+    if slot is None:
+        return jsonify({"error": "too many live viewers"}), 429
+    agent.request_capture()
     try:
-        t = getattr(agent, '_thread', None)
-        thread_alive = bool(t is not None and getattr(t, 'is_alive', lambda: False)())
-    except Exception:
-        thread_alive = False
+        fps = float(request.args.get('fps', live_hub.max_fps))
+    except ValueError:
+        fps = live_hub.max_fps
+    response = Response(
+        live_hub.stream(slot, fps=fps, alive=lambda: agent.running),
+        mimetype=f'multipart/x-mixed-replace; boundary={LIVE_BOUNDARY}',
+        headers={'Cache-Control': 'no-cache'}
+    )
+    # frees the slot even if the body is never iterated
+    response.call_on_close(slot.release)
+    return response
 
-    # Build a small preview of the latest contents (texts only)
-    preview = []
-    try:
-        for c in (agent.contents or [])[-6:]:
-            # collect text parts where available
-            parts = []
-            for p in getattr(c, 'parts', []) or []:
-                t = getattr(p, 'text', None)
-                if t:
-                    parts.append(t)
-            preview.append({'role': getattr(c, 'role', None), 'texts': parts})
-    except Exception:
-        preview = []
-
-    return jsonify({
-        'running': agent.running,
-        'thread_alive': thread_alive,
-        'contents_len': len(agent.contents) if getattr(agent, 'contents', None) is not None else 0,
-        'contents_preview': preview,
-        'last_results': agent.last_results,
-        'current_goal': agent.current_goal,
-        'goals_history': agent.goals_history,
-        'update_id': agent.update_id,
-        'relevant_update': getattr(agent, 'relevant_update', None),
-    'page_url': (getattr(getattr(agent, 'page', None), 'url', '') if getattr(agent, 'page', None) is not None else ''),
-    })
+
+@app.route('/live/frame', methods=['GET'])
+@admission.limit('status')
+def api_live_frame():
+    """Return the latest frame of the agent's page as a single image."""
+    if not agent.running:
+        return jsonify({"error": "Agent not running"}), 503
+    live_hub.hold()
+    agent.request_capture()
+    frame = live_hub.latest()
+    if frame is None:
+        return jsonify({"error": "no frame yet"}), 404
+    return Response(frame.data, mimetype=frame.mime_type, headers={'Cache-Control': 'no-cache'})
 
 
 @app.route('/text_to_speech', methods=['POST'])
+@admission.limit('speech')
 def api_text_to_speech():
-    """Convert text to speech using ElevenLabs and return audio"""
+    """Convert text to speech and return audio"""
     payload = request.get_json() or {}
     text = payload.get('text')
     voice_id = payload.get('voice_id', 'JBFqnCBsd6RMkjVDRZzb')  # Default: George
+    output_format = payload.get('output_format')
     
     if not text:
         return jsonify({"error": "missing text"}), 400
     
-    # Generate audio
-    audio_bytes = text_to_speech(text, voice_id)
-    
-    if not audio_bytes:
-        return jsonify({"error": "Failed to generate audio"}), 500
+    # Audio pre-generated when the agent published this text, if any
+    audio = None
+    if tts_prefetch is not None:
+        audio = tts_prefetch.lookup(text, voice_id, output_format, update_id=payload.get('update_id'))
+    prefetched = audio is not None
+
+    # Generate audio (fails over between providers)
+    if audio is None:
+        try:
+            audio = speech.synthesize(text, voice_id, output_format=output_format)
+        except SpeechProviderError as e:
+            logger.error("text-to-speech failed: %s", e)
+            return jsonify({"error": "Failed to generate audio"}), 500
     
-    # Return audio as MP3
     return Response(
-        audio_bytes,
-        mimetype='audio/mpeg',
+        audio.data,
+        mimetype=audio.mime_type,
         headers={
-            'Content-Disposition': 'inline; filename="speech.mp3"',
-            'Content-Type': 'audio/mpeg'
+            'Content-Disposition': 'inline; filename="speech"',
+            'Content-Type': audio.mime_type,
+            'X-Speech-Provider': audio.provider,
+            'X-Speech-Prefetched': '1' if prefetched else '0',
         }
     )
 
 
 @app.route('/text_to_speech_stream', methods=['POST'])
+@admission.limit('speech')
 def api_text_to_speech_stream():
     """Stream text-to-speech audio"""
     payload = request.get_json() or {}
     text = payload.get('text')
     voice_id = payload.get('voice_id', 'JBFqnCBsd6RMkjVDRZzb')
+    output_format = payload.get('output_format')
     
     if not text:
         return jsonify({"error": "missing text"}), 400
     
     # Stream audio
-    audio_generator = text_to_speech_stream(text, voice_id)
+    try:
+        mime_type, audio_generator = speech.stream(text, voice_id, output_format=output_format)
+    except SpeechProviderError as e:
+        logger.error("text-to-speech streaming failed: %s", e)
+        return jsonify({"error": "Failed to generate audio"}), 500
     
     return Response(
         audio_generator,
-        mimetype='audio/mpeg',
+        mimetype=mime_type,
         headers={
-            'Content-Type': 'audio/mpeg',
+            'Content-Type': mime_type,
             'Cache-Control': 'no-cache'
         }
     )
 
 
+def shutdown():
+    """Stop the agent (which closes its browser and Playwright) and any
+    worker processes. Used by both the dev server and the ASGI app."""
+    logger.info("shutting down; closing browser")
+    replication.stop()
+    try:
+        if agent and agent.running:
+            agent.stop()
+    except Exception:
+        pass
+    try:
+        if supervisor:
+            supervisor.shutdown()
+    except Exception:
+        pass
+
+
 if __name__ == "__main__":
+    start_services()
     try:
-        # Run Flask app (development server). For production, use a WSGI server.
+        # Run Flask app (development server). For production use the ASGI
+        # app: uvicorn --app-dir backend asgi:app --host 0.0.0.0 --port 8000
         # Listen on 0.0.0.0 so the app is reachable from the Docker host when
         # the container publishes port 8000.
         app.run(host="0.0.0.0", port=8000)
     finally:
-        print("\nClosing browser...")
-        try:
-            if agent and agent.running:
-                agent.stop()
-        except Exception:
-            pass
-        try:
-            if browser:
-                browser.close()
-        except Exception:
-            pass
-        try:
-            if playwright:
-                playwright.stop()
-        except Exception:
-            pass
+        shutdown()
@@ -0,0 +1,270 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+
+from tracing import debug_event, get_logger, span
+
+# Model routing: every model call names a kind ("turn" for computer-use
+# turns, "summary" for relevant_update summaries, "plan" for fan-out
+# planning) plus a few features of the call (turn_type, contents_len). The
+# first matching rule picks the model and generation settings; its
+# fallbacks are tried when the model is throttled, failing or cooling down.
+#
+# A rule is a dict:
+#
+#   {"kind": "turn",
+#    "when": {"turn_type": ["continue"], "min_contents": 12,
+#             "max_latency_ms": 8000, "max_error_rate": 0.5},
+#    "model": "...", "settings": {"temperature": 0.2, "thinking_budget": 0},
+#    "fallbacks": ["..."]}
+#
+# The default rules keep the caller's generation config unchanged; settings
+# such as thinking_budget only apply where a rule sets them.
+#
+# turn_type is "first" (new goal), "command" (a user command was added),
+# "error" (the last action failed) or "continue". max_latency_ms and
+# max_error_rate are checked against the rule's model's recent stats, so a
+# slow or failing model hands its calls to the next matching rule.
+#
+# MODEL_ROUTES      JSON file with rules tried before the defaults
+# MODEL_TURN / MODEL_SUMMARY / MODEL_PLAN            default models
+# MODEL_TURN_FALLBACKS / MODEL_SUMMARY_FALLBACKS / MODEL_PLAN_FALLBACKS
+#                   comma-separated fallback models
+# MODEL_COOLDOWN    seconds a throttled model is skipped (default 30)
+
+logger = get_logger("model_router")
+
+DEFAULT_MODELS = {
+    "turn": "gemini-2.5-computer-use-preview-10-2025",
+    "summary": "gemini-2.5-flash",
+    "plan": "gemini-2.5-flash",
+}
+
+def _extract_retry_seconds_from_error(err_json: dict) -> float | None:
+    # Look for RetryInfo in the error details and parse retryDelay like '30s' or '30.905037304s'
+    try:
+        details = err_json.get("error", {}).get("details", [])
+        for d in details:
+            if d.get("@type", "").endswith("RetryInfo") and "retryDelay" in d:
+                delay = d["retryDelay"]
+                m = re.match(r"([0-9.]+)s", delay)
+                if m:
+                    return float(m.group(1))
+    except Exception:
+        return None
+    return None
+
+
+def _request_summary(kwargs: dict, attempt: int) -> dict:
+    # Short description of an outgoing request; only built when debug
+    # logging is enabled for this call.
+    cfg = kwargs.get("config")
+    tools = getattr(cfg, "tools", None) or []
+    return {
+        "model": kwargs.get("model"),
+        "attempt": attempt,
+        "contents_len": len(kwargs.get("contents") or []),
+        "tools": [
+            "computerUse" if getattr(t, "computer_use", None) is not None else type(t).__name__
+            for t in tools
+        ],
+    }
+
+
+def generate_content_with_retries(client, max_attempts: int = 5, **kwargs):
+    from google.genai import errors as genai_errors
+
+    backoff = 1.0
+    for attempt in range(1, max_attempts + 1):
+        try:
+            debug_event(logger, "generate_content", lambda: _request_summary(kwargs, attempt))
+            with span(logger, "generate_content", model=kwargs.get("model"), attempt=attempt):
+                return client.models.generate_content(**kwargs)
+        except genai_errors.ClientError as e:
+            # Try to extract a suggested retry delay from the server response
+            resp_json = getattr(e, "response_json", None) or {}
+            retry_seconds = _extract_retry_seconds_from_error(resp_json)
+            if attempt == max_attempts:
+                # Re-raise the exception after max attempts
+                raise
+            wait = retry_seconds if retry_seconds is not None else backoff
+            logger.warning("API returned %s. Retrying in %.1fs (attempt %d/%d)", e, wait, attempt, max_attempts)
+            time.sleep(wait)
+            backoff = min(backoff * 2, 60)
+        except Exception:
+            # Non-API errors should bubble up
+            raise
+
+
+def _split(value: str | None) -> list[str]:
+    return [v.strip() for v in (value or "").split(",") if v.strip()]
+
+
+def _default_rules() -> list[dict]:
+    rules = []
+    for kind, model in DEFAULT_MODELS.items():
+        name = kind.upper()
+        rules.append({
+            "kind": kind,
+            "model": os.getenv(f"MODEL_{name}", model),
+            "fallbacks": _split(os.getenv(f"MODEL_{name}_FALLBACKS")),
+        })
+    return rules
+
+
+def apply_settings(config, settings: dict):
+    """``config`` (a GenerateContentConfig or None) with ``settings`` applied."""
+    from google.genai import types
+
+    if not settings:
+        return config
+    settings = dict(settings)
+    update = {}
+    if "thinking_budget" in settings:
+        update["thinking_config"] = types.ThinkingConfig(thinking_budget=settings.pop("thinking_budget"))
+    update.update(settings)
+    if config is None:
+        return types.GenerateContentConfig(**update)
+    return config.model_copy(update=update)
+
+
+class _ModelStats:
+    __slots__ = ("calls", "ok", "errors", "throttled", "latencies", "outcomes", "cooldown_until")
+
+    def __init__(self):
+        self.calls = 0
+        self.ok = 0
+        self.errors = 0
+        self.throttled = 0
+        self.latencies = deque(maxlen=50)
+        # recent successes (True) and failures (False)
+        self.outcomes = deque(maxlen=20)
+        self.cooldown_until = 0.0
+
+    def latency_ms(self) -> float | None:
+        return sorted(self.latencies)[len(self.latencies) // 2] * 1000 if self.latencies else None
+
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def view(self) -> dict:
+        ordered = sorted(self.latencies)
+        return {
+            "calls": self.calls,
+            "ok": self.ok,
+            "errors": self.errors,
+            "throttled": self.throttled,
+            "p50_ms": round(ordered[len(ordered) // 2] * 1000) if ordered else None,
+            "p95_ms": round(ordered[int(len(ordered) * 0.95)] * 1000) if ordered else None,
+            "error_rate": round(self.error_rate(), 3),
+            "cooling_down": self.cooldown_until > time.monotonic(),
+        }
+
+
+def _is_throttle(e) -> bool:
+    return getattr(e, "code", None) in (429, 503) or "RESOURCE_EXHAUSTED" in str(e)
+
+
+class ModelRouter:
+    def __init__(self, rules: list[dict], cooldown: float = 30.0):
+        self.rules = rules
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._stats: dict[str, _ModelStats] = {}
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        rules = []
+        path = os.getenv("MODEL_ROUTES")
+        if path:
+            try:
+                with open(path) as f:
+                    rules = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning("ignoring MODEL_ROUTES %s: %s", path, e)
+        return cls(rules + _default_rules(), cooldown=float(os.getenv("MODEL_COOLDOWN", "30")))
+
+    def _stat(self, model: str) -> _ModelStats:
+        # caller holds self._lock
+        stat = self._stats.get(model)
+        if stat is None:
+            stat = self._stats[model] = _ModelStats()
+        return stat
+
+    def _matches(self, rule: dict, kind: str, features: dict) -> bool:
+        if rule.get("kind") != kind or not rule.get("model"):
+            return False
+        when = rule.get("when") or {}
+        turn_types = when.get("turn_type")
+        if turn_types and features.get("turn_type") not in turn_types:
+            return False
+        contents_len = features.get("contents_len", 0)
+        if contents_len < when.get("min_contents", 0) or contents_len > when.get("max_contents", float("inf")):
+            return False
+        stat = self._stat(rule["model"])
+        latency = stat.latency_ms()
+        if "max_latency_ms" in when and latency is not None and latency > when["max_latency_ms"]:
+            return False
+        if "max_error_rate" in when and stat.error_rate() > when["max_error_rate"]:
+            return False
+        return True
+
+    def select(self, kind: str, **features) -> list[tuple[str, dict]]:
+        """Candidate (model, settings) pairs for a call, best first; models
+        cooling down after throttling go last."""
+        with self._lock:
+            rule = next((r for r in self.rules if self._matches(r, kind, features)), None)
+            if rule is None:
+                rule = {"model": DEFAULT_MODELS[kind]}
+            settings = rule.get("settings") or {}
+            candidates = [(rule["model"], settings)] + [(m, settings) for m in rule.get("fallbacks") or []]
+            now = time.monotonic()
+            candidates.sort(key=lambda c: self._stat(c[0]).cooldown_until > now)
+        return candidates
+
+    def _record(self, model: str, elapsed: float | None, error=None):
+        with self._lock:
+            stat = self._stat(model)
+            stat.calls += 1
+            if error is None:
+                stat.ok += 1
+                stat.latencies.append(elapsed)
+                stat.outcomes.append(True)
+                return
+            stat.errors += 1
+            stat.outcomes.append(False)
+            if _is_throttle(error):
+                stat.throttled += 1
+                stat.cooldown_until = time.monotonic() + self.cooldown
+
+    def generate(self, client, kind: str, contents, config=None, max_attempts: int = 5, **features):
+        """Run a model call through the routing rules. Throttled or failing
+        models fall through to the rule's fallbacks; the last candidate
+        retries like generate_content_with_retries."""
+        candidates = self.select(kind, contents_len=len(contents) if isinstance(contents, list) else 0, **features)
+        for i, (model, settings) in enumerate(candidates):
+            last = i == len(candidates) - 1
+            start = time.monotonic()
+            try:
+                response = generate_content_with_retries(
+                    client,
+                    max_attempts=max_attempts if last else 1,
+                    model=model,
+                    contents=contents,
+                    config=apply_settings(config, settings),
+                )
+            except Exception as e:
+                self._record(model, None, e)
+                if last:
+                    raise
+                logger.warning("model %s failed (%s); falling back to %s", model, e, candidates[i + 1][0])
+                continue
+            self._record(model, time.monotonic() - start)
+            return response
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {model: stat.view() for model, stat in self._stats.items()}
@@ -0,0 +1,172 @@
+import os
+import time
+
+from tracing import get_logger
+
+# Tabs of a browser context. Clicks on LMS and login flows often open a new
+# tab or popup; without this the agent keeps observing the old tab. The
+# manager listens for pages opened in the context and makes the newest one
+# active; when the active page closes (e.g. an OAuth popup closing itself)
+# the most recently active remaining page takes over. Event handlers only
+# record what happened; ``sync()`` applies it on the agent thread between
+# actions and observations.
+#
+# Background tabs other than the active page's opener are frozen (CDP
+# Page.setWebLifecycleState, Chromium only) so they stop running scripts and
+# timers, and resumed when they become active again. Other background tabs
+# idle for TAB_IDLE_SECONDS (default 300) are closed, as are the least
+# recently active ones beyond TAB_LIMIT open tabs (default 4).
+# TAB_TRACKING=0 keeps the agent on its first page.
+
+logger = get_logger("page_manager")
+
+
+class _Tab:
+    __slots__ = ("page", "opened", "last_active", "frozen", "cdp")
+
+    def __init__(self, page):
+        self.page = page
+        self.opened = time.monotonic()
+        self.last_active = self.opened
+        self.frozen = False
+        self.cdp = None
+
+
+class PageManager:
+    def __init__(self, context, page, limit: int = 4, idle_seconds: float = 300.0):
+        self.context = context
+        self.limit = max(1, limit)
+        self.idle_seconds = idle_seconds
+        self._tabs = [_Tab(page)]
+        self._active = self._tabs[0]
+        # pages opened/closed since the last sync(), filled by event handlers
+        self._opened = []
+        self._closed = []
+        self.opened = 0
+        self.switches = 0
+        self.closed = 0
+        self.last_switch: dict | None = None
+        context.on("page", self._on_page)
+        page.on("close", self._on_close)
+
+    @classmethod
+    def from_env(cls, context, page) -> "PageManager | None":
+        if os.getenv("TAB_TRACKING", "1").lower() in ("0", "false", "no"):
+            return None
+        return cls(
+            context,
+            page,
+            limit=int(os.getenv("TAB_LIMIT", "4")),
+            idle_seconds=float(os.getenv("TAB_IDLE_SECONDS", "300")),
+        )
+
+    @property
+    def active(self):
+        return self._active.page
+
+    def _on_page(self, page):
+        self._opened.append(page)
+        page.on("close", self._on_close)
+
+    def _on_close(self, page):
+        self._closed.append(page)
+
+    def _tab(self, page) -> _Tab | None:
+        return next((t for t in self._tabs if t.page is page), None)
+
+    def sync(self) -> dict | None:
+        """Apply tab events since the last call (agent thread only). Returns
+        a description of the switch when the active page changed."""
+        opened, self._opened = self._opened, []
+        closed, self._closed = self._closed, []
+        for page in opened:
+            if self._tab(page) is None:
+                self._tabs.append(_Tab(page))
+                self.opened += 1
+        for page in closed:
+            tab = self._tab(page)
+            if tab is not None:
+                self._tabs.remove(tab)
+        previous = self._active
+        if opened and self._tab(opened[-1]) is not None:
+            self._active = self._tab(opened[-1])
+        elif self._active not in self._tabs:
+            if not self._tabs:
+                # the last tab closed itself; keep a page to work in
+                self._tabs.append(_Tab(self.context.new_page()))
+            self._active = max(self._tabs, key=lambda t: t.last_active)
+        switch = None
+        if self._active is not previous:
+            switch = self._switch(previous, reason="opened" if self._active.page in opened else "closed")
+        self._active.last_active = time.monotonic()
+        self._trim()
+        return switch
+
+    def _switch(self, previous: _Tab, reason: str) -> dict:
+        tab = self._active
+        self._set_frozen(tab, False)
+        opener = self._opener()
+        # an opener stays live: login popups report back to it via postMessage
+        if previous in self._tabs and previous.page is not opener:
+            self._set_frozen(previous, True)
+        try:
+            tab.page.wait_for_load_state(timeout=5000)
+        except Exception:
+            pass
+        try:
+            tab.page.bring_to_front()
+        except Exception:
+            pass
+        try:
+            url = tab.page.url
+        except Exception:
+            url = ""
+        self.switches += 1
+        self.last_switch = {"reason": reason, "url": url, "tabs": len(self._tabs)}
+        logger.info("switched active tab", extra={"fields": self.last_switch})
+        return self.last_switch
+
+    def _opener(self):
+        try:
+            return self._active.page.opener()
+        except Exception:
+            return None
+
+    def _set_frozen(self, tab: _Tab, frozen: bool):
+        if tab.frozen == frozen:
+            return
+        try:
+            if tab.cdp is None:
+                tab.cdp = self.context.new_cdp_session(tab.page)
+            tab.cdp.send("Page.setWebLifecycleState", {"state": "frozen" if frozen else "active"})
+            tab.frozen = frozen
+        except Exception as e:
+            # not Chromium, or the page is already gone
+            logger.debug("failed to set lifecycle state of tab: %s", e)
+
+    def _trim(self):
+        now = time.monotonic()
+        opener = self._opener()
+        background = sorted(
+            (t for t in self._tabs if t is not self._active and t.page is not opener), key=lambda t: t.last_active
+        )
+        excess = len(self._tabs) - self.limit
+        for tab in background:
+            if excess > 0 or now - tab.last_active > self.idle_seconds:
+                excess -= 1
+                self._tabs.remove(tab)
+                self.closed += 1
+                try:
+                    tab.page.close()
+                except Exception:
+                    pass
+
+    def view(self) -> dict:
+        return {
+            "open": len(self._tabs),
+            "frozen": sum(t.frozen for t in self._tabs),
+            "opened": self.opened,
+            "switches": self.switches,
+            "closed": self.closed,
+            "last_switch": self.last_switch,
+        }
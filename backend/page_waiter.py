@@ -0,0 +1,73 @@
+import time
+
+# Condition-based waiting for the model's wait_5_seconds action: instead of
+# sleeping the full five seconds, return as soon as the page has settled
+# (no requests in flight, no DOM mutations and two identical frames, each
+# for ``quiet`` seconds) and never wait longer than the cap.
+
+# Installs a MutationObserver on first use (and again after a navigation)
+# and returns the milliseconds since the DOM last changed.
+_DOM_IDLE_JS = """
+() => {
+  if (!window.__settleObserver) {
+    window.__settleLastMutation = performance.now();
+    window.__settleObserver = new MutationObserver(() => { window.__settleLastMutation = performance.now(); });
+    window.__settleObserver.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+  }
+  return performance.now() - window.__settleLastMutation;
+}
+"""
+
+
+def wait_until_settled(page, max_seconds: float = 5.0, quiet: float = 0.5, poll: float = 0.1) -> dict:
+    """Wait until ``page`` stops changing or ``max_seconds`` pass; returns
+    how long it waited and whether the page settled."""
+    start = time.monotonic()
+    deadline = start + max_seconds
+    network = {"in_flight": 0, "last": start}
+
+    def on_request(_request):
+        network["in_flight"] += 1
+        network["last"] = time.monotonic()
+
+    def on_done(_request):
+        network["in_flight"] = max(0, network["in_flight"] - 1)
+        network["last"] = time.monotonic()
+
+    page.on("request", on_request)
+    page.on("requestfinished", on_done)
+    page.on("requestfailed", on_done)
+    settled = False
+    previous_frame = None
+    try:
+        while time.monotonic() < deadline:
+            # wait_for_timeout keeps dispatching Playwright events (requests,
+            # screencast frames) while we wait
+            page.wait_for_timeout(int(poll * 1000))
+            now = time.monotonic()
+            if network["in_flight"] or now - network["last"] < quiet:
+                previous_frame = None
+                continue
+            try:
+                dom_idle = page.evaluate(_DOM_IDLE_JS) / 1000
+            except Exception:
+                # mid-navigation: the document is being replaced
+                dom_idle = 0
+            if dom_idle < quiet:
+                previous_frame = None
+                continue
+            try:
+                frame = page.screenshot(type="png")
+            except Exception:
+                frame = None
+            if frame is not None and frame == previous_frame:
+                settled = True
+                break
+            previous_frame = frame
+    finally:
+        for event, fn in (("request", on_request), ("requestfinished", on_done), ("requestfailed", on_done)):
+            try:
+                page.remove_listener(event, fn)
+            except Exception:
+                pass
+    return {"waited_seconds": round(time.monotonic() - start, 2), "settled": settled, "max_wait_seconds": max_seconds}
@@ -0,0 +1,89 @@
+import json
+import os
+
+# Fast-render profile (FAST_RENDER=1). Pages settle into a screenshot-ready
+# state sooner when nothing on them moves: CSS animations and transitions
+# are disabled, smooth scrolling becomes instant, autoplaying media is
+# paused and the context emulates prefers-reduced-motion. The Chromium flags
+# below trim work a headless, CPU-only host doesn't need.
+#
+# Launch flags only apply to locally launched browsers; browser servers
+# from BROWSER_ENDPOINTS are configured where they are started.
+
+FAST_RENDER_CSS = """
+*, *::before, *::after {
+  animation-duration: 0s !important;
+  animation-delay: 0s !important;
+  animation-iteration-count: 1 !important;
+  transition-duration: 0s !important;
+  transition-delay: 0s !important;
+  scroll-behavior: auto !important;
+}
+"""
+
+# Runs before any page script in every frame of the context.
+FAST_RENDER_INIT_SCRIPT = """
+(() => {
+  const css = %s;
+  const addStyle = () => {
+    if (document.getElementById('__fast_render')) return;
+    const style = document.createElement('style');
+    style.id = '__fast_render';
+    style.textContent = css;
+    (document.head || document.documentElement).appendChild(style);
+  };
+  const pauseMedia = (root) => {
+    root.querySelectorAll && root.querySelectorAll('video, audio').forEach((m) => {
+      m.autoplay = false;
+      try { m.pause(); } catch (e) {}
+    });
+  };
+  if (document.documentElement) addStyle();
+  document.addEventListener('DOMContentLoaded', () => { addStyle(); pauseMedia(document); });
+  new MutationObserver((records) => {
+    for (const r of records) r.addedNodes.forEach((n) => n.nodeType === 1 && pauseMedia(n.parentNode || n));
+  }).observe(document, { childList: true, subtree: true });
+  // scripted smooth scrolling (scrollTo/scrollBy/scrollIntoView options)
+  const instant = (fn) => function (...args) {
+    if (args[0] && typeof args[0] === 'object' && args[0].behavior === 'smooth') {
+      args[0] = Object.assign({}, args[0], { behavior: 'instant' });
+    }
+    return fn.apply(this, args);
+  };
+  window.scrollTo = instant(window.scrollTo);
+  window.scrollBy = instant(window.scrollBy);
+  Element.prototype.scrollTo = instant(Element.prototype.scrollTo);
+  Element.prototype.scrollBy = instant(Element.prototype.scrollBy);
+  Element.prototype.scrollIntoView = instant(Element.prototype.scrollIntoView);
+})();
+""" % json.dumps(FAST_RENDER_CSS)
+
+FAST_RENDER_LAUNCH_ARGS = [
+    "--disable-gpu",
+    "--disable-dev-shm-usage",
+    "--disable-smooth-scrolling",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-renderer-backgrounding",
+    "--disable-backgrounding-occluded-windows",
+    "--mute-audio",
+    "--autoplay-policy=user-gesture-required",
+]
+
+
+def fast_render_from_env() -> bool:
+    return os.getenv("FAST_RENDER", "0").lower() in ("1", "true", "yes")
+
+
+def launch_args(fast: bool) -> list[str]:
+    return list(FAST_RENDER_LAUNCH_ARGS) if fast else []
+
+
+def context_options(fast: bool) -> dict:
+    """Extra ``browser.new_context`` options for the profile."""
+    return {"reduced_motion": "reduce"} if fast else {}
+
+
+def apply_to_context(context, fast: bool):
+    if fast:
+        context.add_init_script(FAST_RENDER_INIT_SCRIPT)
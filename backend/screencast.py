@@ -0,0 +1,185 @@
+import base64
+import os
+import threading
+import time
+from collections import deque
+
+from tracing import get_logger
+
+logger = get_logger("screencast")
+
+
+class Frame:
+    """A single screencast frame. The payload stays base64-encoded until read."""
+
+    __slots__ = ("seq", "timestamp", "mime_type", "_b64", "_data")
+
+    def __init__(self, seq: int, timestamp: float, mime_type: str, b64: str):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.mime_type = mime_type
+        self._b64 = b64
+        self._data = None
+
+    @property
+    def data(self) -> bytes:
+        # decode lazily so frames that are never read cost nothing but storage
+        if self._data is None:
+            try:
+                self._data = base64.b64decode(self._b64)
+            except Exception:
+                self._data = b""
+        return self._data
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.timestamp
+
+
+class ScreencastCapture:
+    """Keeps the latest frames of a page using Chromium's CDP screencast.
+
+    Frames are pushed by Chromium whenever the page repaints, so reading the
+    latest one is free compared to a ``page.screenshot`` round trip. Frames are
+    kept in a small ring buffer; when frames arrive faster than
+    ``min_interval`` or the buffer is full, older/extra frames are dropped.
+
+    Like every Playwright sync object, the CDP session is bound to the thread
+    that created the page: ``start``/``stop`` must be called from the agent
+    thread. Reading frames (``latest``) is safe from any thread.
+    """
+
+    def __init__(self, page, buffer_size: int = 8, image_format: str = "png", quality: int = 80, min_interval: float = 0.0):
+        self.page = page
+        self.image_format = image_format if image_format in ("png", "jpeg") else "png"
+        self.quality = quality
+        self.min_interval = min_interval
+        self._frames: deque[Frame] = deque(maxlen=max(1, buffer_size))
+        self._lock = threading.Lock()
+        self._session = None
+        self._seq = 0
+        self._listeners = []
+        self.running = False
+        self.frames_received = 0
+        self.frames_dropped = 0
+
+    def start(self) -> bool:
+        """Open a CDP session on the page and start the screencast.
+
+        Returns False (and leaves the capture stopped) if the browser does not
+        support CDP, e.g. non-Chromium engines.
+        """
+        if self.running:
+            return True
+        try:
+            self._session = self.page.context.new_cdp_session(self.page)
+            self._session.on("Page.screencastFrame", self._on_frame)
+            vp = getattr(self.page, "viewport_size", None) or {}
+            params = {"format": self.image_format, "everyNthFrame": 1}
+            if self.image_format == "jpeg":
+                params["quality"] = self.quality
+            if vp:
+                params["maxWidth"] = vp.get("width")
+                params["maxHeight"] = vp.get("height")
+            self._session.send("Page.startScreencast", params)
+            self.running = True
+        except Exception as e:
+            logger.warning("failed to start screencast capture: %s", e)
+            self._session = None
+            self.running = False
+        return self.running
+
+    def stop(self):
+        if self._session is not None:
+            try:
+                self._session.send("Page.stopScreencast")
+            except Exception:
+                pass
+            try:
+                self._session.detach()
+            except Exception:
+                pass
+        self._session = None
+        self.running = False
+
+    def add_listener(self, fn):
+        """Register ``fn(frame)`` to be called for every stored frame.
+
+        Listeners run on the agent thread inside the CDP event dispatch, so
+        they must be cheap and must not call Playwright.
+        """
+        self._listeners.append(fn)
+
+    def remove_listener(self, fn):
+        try:
+            self._listeners.remove(fn)
+        except ValueError:
+            pass
+
+    def _on_frame(self, params):
+        # Ack first so Chromium keeps producing frames even if we drop this one.
+        try:
+            self._session.send("Page.screencastFrameAck", {"sessionId": params.get("sessionId")})  # type: ignore
+        except Exception:
+            pass
+        self.frames_received += 1
+        now = time.time()
+        with self._lock:
+            last = self._frames[-1] if self._frames else None
+            if last is not None and self.min_interval and now - last.timestamp < self.min_interval:
+                self.frames_dropped += 1
+                return
+            if len(self._frames) == self._frames.maxlen:
+                self.frames_dropped += 1
+            self._seq += 1
+            frame = Frame(self._seq, now, f"image/{self.image_format}", params.get("data", ""))
+            self._frames.append(frame)
+        for fn in list(self._listeners):
+            try:
+                fn(frame)
+            except Exception:
+                pass
+
+    def latest(self, max_age: float | None = None) -> Frame | None:
+        """Return the newest frame, or None if there is none (or it is too old)."""
+        with self._lock:
+            frame = self._frames[-1] if self._frames else None
+        if frame is None:
+            return None
+        if max_age is not None and frame.age > max_age:
+            return None
+        return frame
+
+    def frames(self) -> list[Frame]:
+        with self._lock:
+            return list(self._frames)
+
+    def stats(self) -> dict:
+        frame = self.latest()
+        return {
+            "running": self.running,
+            "format": self.image_format,
+            "frames_received": self.frames_received,
+            "frames_dropped": self.frames_dropped,
+            "latest_seq": frame.seq if frame else None,
+            "latest_age": round(frame.age, 3) if frame else None,
+        }
+
+
+def capture_backend_from_env() -> str:
+    """Return the configured capture backend: 'screenshot' (default) or 'screencast'."""
+    backend = os.getenv("CAPTURE_BACKEND", "screenshot").strip().lower()
+    return backend if backend in ("screenshot", "screencast") else "screenshot"
+
+
+def capture_observation(page, capture: "ScreencastCapture | None" = None) -> tuple[bytes, str]:
+    """Return (image_bytes, mime_type) for the page's current state.
+
+    Uses the latest screencast frame when a running capture has one and falls
+    back to a synchronous ``page.screenshot`` otherwise.
+    """
+    if capture is not None and capture.running:
+        frame = capture.latest()
+        if frame is not None and frame.data:
+            return frame.data, frame.mime_type
+    return page.screenshot(type="png"), "image/png"
@@ -0,0 +1,389 @@
+import asyncio
+import io
+import os
+import shutil
+import subprocess
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from tracing import get_logger
+
+# Pluggable TTS/STT providers behind a router that tracks per-provider latency
+# and errors and fails over to the next provider when one errors, is over
+# quota or is too slow.
+#
+# SPEECH_PROVIDERS sets the order (default "elevenlabs,local"). Providers that
+# are not configured (missing key, missing binary/model) are skipped.
+
+logger = get_logger("speech")
+
+
+class SpeechProviderError(RuntimeError):
+    """A provider could not serve a request. ``quota`` marks rate/quota limits."""
+
+    def __init__(self, message: str, quota: bool = False):
+        super().__init__(message)
+        self.quota = quota
+
+
+class SpeechAudio:
+    def __init__(self, data: bytes, mime_type: str, provider: str):
+        self.data = data
+        self.mime_type = mime_type
+        self.provider = provider
+
+
+def mime_for_output_format(output_format: str) -> str:
+    """MIME type of an ElevenLabs ``output_format`` as served to the browser."""
+    if output_format.startswith("mp3"):
+        return "audio/mpeg"
+    if output_format.startswith("opus"):
+        return "audio/ogg"
+    if output_format.startswith("ulaw"):
+        return "audio/basic"
+    # pcm_* is wrapped into a WAV container before it is returned
+    return "audio/wav"
+
+
+def pcm_to_wav(pcm: bytes, sample_rate: int) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(pcm)
+    return buf.getvalue()
+
+
+class ElevenLabsProvider:
+    """ElevenLabs TTS and STT.
+
+    ELEVENLABS_TTS_MODEL and ELEVENLABS_OUTPUT_FORMAT pick latency-oriented
+    settings, e.g. ``eleven_flash_v2_5`` with ``opus_48000_64`` or
+    ``pcm_16000`` instead of the default mp3.
+    """
+
+    name = "elevenlabs"
+
+    def __init__(self):
+        self.tts_model_id = os.getenv("ELEVENLABS_TTS_MODEL", "eleven_multilingual_v2")
+        self.output_format = os.getenv("ELEVENLABS_OUTPUT_FORMAT", "mp3_44100_128")
+        self.stt_model_id = os.getenv("ELEVENLABS_STT_MODEL", "scribe_v1")
+
+    def supports(self, kind: str) -> bool:
+        return bool(os.getenv("ELEVENLABS_API_KEY"))
+
+    @staticmethod
+    def _wrap(e: Exception) -> SpeechProviderError:
+        status = getattr(e, "status_code", None)
+        text = str(e)
+        quota = status in (401, 429) or "quota" in text.lower()
+        return SpeechProviderError(f"elevenlabs: {text[:300]}", quota=quota)
+
+    def synthesize(self, text: str, voice_id: str, output_format: str | None = None) -> SpeechAudio:
+        from elevenlabs_tts import synthesize
+
+        fmt = output_format or self.output_format
+        try:
+            data = b"".join(synthesize(text, voice_id, model_id=self.tts_model_id, output_format=fmt))
+        except Exception as e:
+            raise self._wrap(e)
+        if not data:
+            raise SpeechProviderError("elevenlabs: empty audio")
+        if fmt.startswith("pcm_"):
+            data = pcm_to_wav(data, int(fmt.split("_")[1]))
+        return SpeechAudio(data, mime_for_output_format(fmt), self.name)
+
+    def stream(self, text: str, voice_id: str, output_format: str | None = None):
+        from elevenlabs_tts import synthesize
+
+        fmt = output_format or self.output_format
+        if fmt.startswith("pcm_"):
+            # raw PCM is not playable as a stream in the browser
+            fmt = "mp3_44100_128"
+        try:
+            chunks = iter(synthesize(text, voice_id, model_id=self.tts_model_id, output_format=fmt))
+            first = next(chunks)
+        except StopIteration:
+            raise SpeechProviderError("elevenlabs: empty audio")
+        except Exception as e:
+            raise self._wrap(e)
+        return mime_for_output_format(fmt), _prepend(first, chunks)
+
+    def transcribe(self, path: str) -> str:
+        from elevenlabs_utils import request_transcription
+
+        try:
+            return request_transcription(path, model_id=self.stt_model_id)
+        except Exception as e:
+            raise self._wrap(e)
+
+    # asyncio variants, used by the ASGI app so upstream waits hold no thread
+
+    async def asynthesize(self, text: str, voice_id: str, output_format: str | None = None) -> SpeechAudio:
+        from elevenlabs_tts import asynthesize
+
+        fmt = output_format or self.output_format
+        try:
+            data = b"".join([chunk async for chunk in asynthesize(text, voice_id, model_id=self.tts_model_id, output_format=fmt)])
+        except Exception as e:
+            raise self._wrap(e)
+        if not data:
+            raise SpeechProviderError("elevenlabs: empty audio")
+        if fmt.startswith("pcm_"):
+            data = pcm_to_wav(data, int(fmt.split("_")[1]))
+        return SpeechAudio(data, mime_for_output_format(fmt), self.name)
+
+    async def astream(self, text: str, voice_id: str, output_format: str | None = None):
+        from elevenlabs_tts import asynthesize
+
+        fmt = output_format or self.output_format
+        if fmt.startswith("pcm_"):
+            fmt = "mp3_44100_128"
+        try:
+            chunks = asynthesize(text, voice_id, model_id=self.tts_model_id, output_format=fmt).__aiter__()
+            first = await chunks.__anext__()
+        except StopAsyncIteration:
+            raise SpeechProviderError("elevenlabs: empty audio")
+        except Exception as e:
+            raise self._wrap(e)
+        return mime_for_output_format(fmt), _aprepend(first, chunks)
+
+    async def atranscribe(self, path: str) -> str:
+        from elevenlabs_utils import arequest_transcription
+
+        try:
+            return await arequest_transcription(path, model_id=self.stt_model_id)
+        except Exception as e:
+            raise self._wrap(e)
+
+
+def _prepend(first, rest):
+    yield first
+    yield from rest
+
+
+async def _aprepend(first, rest):
+    yield first
+    async for chunk in rest:
+        yield chunk
+
+
+async def _aiter_sync(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+class LocalSpeechProvider:
+    """Offline engine: espeak-ng/espeak for TTS and Vosk for STT.
+
+    Both are optional: TTS needs an espeak binary on PATH, STT needs the
+    ``vosk`` package and a model directory in VOSK_MODEL_PATH.
+    """
+
+    name = "local"
+
+    def __init__(self):
+        self.espeak = shutil.which("espeak-ng") or shutil.which("espeak")
+        self.vosk_model_path = os.getenv("VOSK_MODEL_PATH")
+        self._vosk_model = None
+        self._vosk_lock = threading.Lock()
+
+    def supports(self, kind: str) -> bool:
+        if kind == "tts":
+            return self.espeak is not None
+        if not self.vosk_model_path:
+            return False
+        try:
+            import vosk  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def synthesize(self, text: str, voice_id: str, output_format: str | None = None) -> SpeechAudio:
+        if self.espeak is None:
+            raise SpeechProviderError("local: espeak is not installed")
+        try:
+            proc = subprocess.run(
+                [self.espeak, "--stdout", "-s", "170", text],
+                capture_output=True, timeout=30, check=True,
+            )
+        except Exception as e:
+            raise SpeechProviderError(f"local: {e}")
+        return SpeechAudio(proc.stdout, "audio/wav", self.name)
+
+    def stream(self, text: str, voice_id: str, output_format: str | None = None):
+        audio = self.synthesize(text, voice_id)
+        return audio.mime_type, iter([audio.data])
+
+    def transcribe(self, path: str) -> str:
+        import json
+        import vosk
+        from audio_preprocess import SAMPLE_RATE, decode_audio_file
+
+        with self._vosk_lock:
+            if self._vosk_model is None:
+                self._vosk_model = vosk.Model(self.vosk_model_path)
+        try:
+            samples = decode_audio_file(path)
+        except Exception as e:
+            raise SpeechProviderError(f"local: cannot decode audio: {e}")
+        recognizer = vosk.KaldiRecognizer(self._vosk_model, SAMPLE_RATE)
+        recognizer.AcceptWaveform(samples.tobytes())
+        return json.loads(recognizer.FinalResult()).get("text", "")
+
+
+PROVIDER_TYPES = {
+    ElevenLabsProvider.name: ElevenLabsProvider,
+    LocalSpeechProvider.name: LocalSpeechProvider,
+}
+
+
+class _ProviderStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.consecutive_errors = 0
+        self.latency_ewma: float | None = None
+        self.last_error: str | None = None
+        self.cooldown_until = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "latency_ms": round(self.latency_ewma * 1000, 1) if self.latency_ewma is not None else None,
+            "last_error": self.last_error,
+            "cooling_down": self.cooldown_until > time.monotonic(),
+        }
+
+
+class SpeechRouter:
+    """Tries providers in order, skipping ones that are cooling down.
+
+    A provider that takes longer than ``timeout`` is abandoned for this request
+    (its call finishes in the background) and the next one is tried. Quota
+    errors cool a provider down for ``quota_cooldown`` seconds; three
+    consecutive failures cool it down for ``error_cooldown`` seconds.
+    """
+
+    def __init__(self, providers, timeout: float = 15.0, error_cooldown: float = 30.0, quota_cooldown: float = 300.0):
+        self.providers = list(providers)
+        self.timeout = timeout
+        self.error_cooldown = error_cooldown
+        self.quota_cooldown = quota_cooldown
+        self._lock = threading.Lock()
+        self._stats = {(p.name, kind): _ProviderStats() for p in self.providers for kind in ("tts", "stt")}
+        self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="speech")
+
+    def _candidates(self, kind: str):
+        now = time.monotonic()
+        ready, cooling = [], []
+        for p in self.providers:
+            if not p.supports(kind):
+                continue
+            (cooling if self._stats[(p.name, kind)].cooldown_until > now else ready).append(p)
+        # if every provider is cooling down, still try them rather than fail outright
+        return ready or cooling
+
+    def _record(self, provider, kind: str, elapsed: float, error: Exception | None = None, timeout: bool = False):
+        with self._lock:
+            st = self._stats[(provider.name, kind)]
+            st.calls += 1
+            st.latency_ewma = elapsed if st.latency_ewma is None else 0.8 * st.latency_ewma + 0.2 * elapsed
+            if error is None:
+                st.consecutive_errors = 0
+                return
+            st.errors += 1
+            st.timeouts += int(timeout)
+            st.consecutive_errors += 1
+            st.last_error = str(error)[:300]
+            if getattr(error, "quota", False):
+                st.cooldown_until = time.monotonic() + self.quota_cooldown
+            elif timeout or st.consecutive_errors >= 3:
+                st.cooldown_until = time.monotonic() + self.error_cooldown
+
+    def _call(self, kind: str, fn_name: str, *args, **kwargs):
+        errors = []
+        for provider in self._candidates(kind):
+            start = time.monotonic()
+            future = self._executor.submit(getattr(provider, fn_name), *args, **kwargs)
+            try:
+                result = future.result(timeout=self.timeout)
+            except FutureTimeout:
+                err = SpeechProviderError(f"{provider.name}: no response within {self.timeout:.0f}s")
+                self._record(provider, kind, time.monotonic() - start, err, timeout=True)
+                errors.append(str(err))
+                continue
+            except Exception as e:
+                self._record(provider, kind, time.monotonic() - start, e)
+                errors.append(str(e))
+                logger.warning("speech provider %s failed (%s): %s", provider.name, kind, e)
+                continue
+            self._record(provider, kind, time.monotonic() - start)
+            return result
+        raise SpeechProviderError("; ".join(errors) or f"no speech provider available for {kind}")
+
+    async def _acall(self, kind: str, fn_name: str, *args, **kwargs):
+        """asyncio version of _call. Providers without an ``a<fn_name>``
+        coroutine run their blocking method in a worker thread."""
+        errors = []
+        for provider in self._candidates(kind):
+            start = time.monotonic()
+            afn = getattr(provider, "a" + fn_name, None)
+            if afn is not None:
+                coro = afn(*args, **kwargs)
+            else:
+                coro = asyncio.to_thread(getattr(provider, fn_name), *args, **kwargs)
+            try:
+                result = await asyncio.wait_for(coro, timeout=self.timeout)
+            except asyncio.TimeoutError:
+                err = SpeechProviderError(f"{provider.name}: no response within {self.timeout:.0f}s")
+                self._record(provider, kind, time.monotonic() - start, err, timeout=True)
+                errors.append(str(err))
+                continue
+            except Exception as e:
+                self._record(provider, kind, time.monotonic() - start, e)
+                errors.append(str(e))
+                logger.warning("speech provider %s failed (%s): %s", provider.name, kind, e)
+                continue
+            self._record(provider, kind, time.monotonic() - start)
+            return result
+        raise SpeechProviderError("; ".join(errors) or f"no speech provider available for {kind}")
+
+    async def asynthesize(self, text: str, voice_id: str, output_format: str | None = None) -> SpeechAudio:
+        return await self._acall("tts", "synthesize", text, voice_id, output_format=output_format)
+
+    async def astream(self, text: str, voice_id: str, output_format: str | None = None):
+        """Return (mime_type, async chunk iterator)."""
+        mime_type, chunks = await self._acall("tts", "stream", text, voice_id, output_format=output_format)
+        if not hasattr(chunks, "__aiter__"):
+            chunks = _aiter_sync(chunks)
+        return mime_type, chunks
+
+    async def atranscribe(self, path: str) -> str:
+        return await self._acall("stt", "transcribe", path)
+
+    def synthesize(self, text: str, voice_id: str, output_format: str | None = None) -> SpeechAudio:
+        return self._call("tts", "synthesize", text, voice_id, output_format=output_format)
+
+    def stream(self, text: str, voice_id: str, output_format: str | None = None):
+        """Return (mime_type, chunk iterator); fails over until the first chunk."""
+        return self._call("tts", "stream", text, voice_id, output_format=output_format)
+
+    def transcribe(self, path: str) -> str:
+        return self._call("stt", "transcribe", path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {f"{name}:{kind}": st.as_dict() for (name, kind), st in self._stats.items()}
+
+
+def speech_router_from_env() -> SpeechRouter:
+    names = [n.strip() for n in os.getenv("SPEECH_PROVIDERS", "elevenlabs,local").split(",") if n.strip()]
+    providers = [PROVIDER_TYPES[n]() for n in names if n in PROVIDER_TYPES]
+    return SpeechRouter(providers, timeout=float(os.getenv("SPEECH_TIMEOUT", "15")))
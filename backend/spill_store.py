@@ -0,0 +1,203 @@
+import mmap
+import os
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+
+# Screenshot payloads dominate a session's memory: every turn adds a full
+# PNG to the conversation sent to the model. The spill store keeps the most
+# recent images in memory and appends older ones to a per-session file that
+# is read back through mmap, so resident memory per session stays bounded
+# however long the task runs.
+#
+# Conversation parts hold a marker instead of the bytes (an inline blob with
+# empty data and display_name "spill:<key>"); ``materialize`` swaps the bytes
+# back in only while a request is being built.
+#
+# SESSION_IMAGE_MEMORY_MB  in-memory image budget per session (default 16)
+# SESSION_HOT_IMAGES       images always kept in memory (default 3)
+# SPILL_DIR                directory for spill files (default: system temp)
+
+SPILL_PREFIX = "spill:"
+
+
+class SpillStore:
+    def __init__(self, memory_limit_bytes: int | None = None, hot_items: int | None = None, spill_dir: str | None = None):
+        if memory_limit_bytes is None:
+            memory_limit_bytes = int(float(os.getenv("SESSION_IMAGE_MEMORY_MB", "16")) * 1024 * 1024)
+        if hot_items is None:
+            hot_items = int(os.getenv("SESSION_HOT_IMAGES", "3"))
+        self.memory_limit_bytes = memory_limit_bytes
+        self.hot_items = max(1, hot_items)
+        self.spill_dir = spill_dir or os.getenv("SPILL_DIR") or tempfile.gettempdir()
+        self._lock = threading.Lock()
+        self._hot: OrderedDict[str, bytes] = OrderedDict()
+        self._hot_bytes = 0
+        # key -> (offset, length) in the spill file
+        self._spilled: dict[str, tuple[int, int]] = {}
+        self._file = None
+        self._file_size = 0
+        self._map: mmap.mmap | None = None
+        self._map_size = 0
+        self.spill_count = 0
+
+    # -- writing --------------------------------------------------------
+
+    def put(self, data: bytes) -> str:
+        key = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._hot[key] = data
+            self._hot_bytes += len(data)
+            self._enforce_limit()
+        return key
+
+    def _enforce_limit(self):
+        # Keep at least ``hot_items`` recent images in memory; beyond that
+        # spill the oldest until under the memory budget.
+        while len(self._hot) > self.hot_items and (
+            self._hot_bytes > self.memory_limit_bytes or len(self._hot) > self.hot_items * 4
+        ):
+            key, data = self._hot.popitem(last=False)
+            self._hot_bytes -= len(data)
+            self._spill(key, data)
+
+    def _spill(self, key: str, data: bytes):
+        if self._file is None:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            fd, path = tempfile.mkstemp(prefix="agent-spill-", suffix=".bin", dir=self.spill_dir)
+            # unlink right away: the file lives as long as the handle and is
+            # reclaimed even if the process dies
+            os.unlink(path)
+            self._file = os.fdopen(fd, "w+b")
+        self._file.seek(self._file_size)
+        self._file.write(data)
+        self._file.flush()
+        self._spilled[key] = (self._file_size, len(data))
+        self._file_size += len(data)
+        self.spill_count += 1
+
+    # -- reading --------------------------------------------------------
+
+    def get(self, key: str) -> bytes:
+        with self._lock:
+            data = self._hot.get(key)
+            if data is not None:
+                return data
+            loc = self._spilled.get(key)
+            if loc is None:
+                return b""
+            offset, length = loc
+            if self._map is None or self._map_size < offset + length:
+                if self._map is not None:
+                    self._map.close()
+                self._map = mmap.mmap(self._file.fileno(), self._file_size, access=mmap.ACCESS_READ)  # type: ignore
+                self._map_size = self._file_size
+            return self._map[offset:offset + length]
+
+    # -- lifecycle ------------------------------------------------------
+
+    def clear(self):
+        """Drop every stored image (the conversation was reset)."""
+        with self._lock:
+            self._hot.clear()
+            self._hot_bytes = 0
+            self._spilled.clear()
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+                self._map_size = 0
+            if self._file is not None:
+                self._file.truncate(0)
+                self._file_size = 0
+
+    def close(self):
+        self.clear()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hot_images": len(self._hot),
+                "hot_bytes": self._hot_bytes,
+                "spilled_images": len(self._spilled),
+                "spilled_bytes": self._file_size,
+                "memory_limit_bytes": self.memory_limit_bytes,
+                "spill_count": self.spill_count,
+            }
+
+
+def _is_marker(blob) -> bool:
+    name = getattr(blob, "display_name", None)
+    return bool(name) and name.startswith(SPILL_PREFIX)
+
+
+def _blobs(content):
+    """Yield (holder, blob) for every inline image in a Content."""
+    for part in getattr(content, "parts", None) or []:
+        blob = getattr(part, "inline_data", None)
+        if blob is not None:
+            yield part, blob
+        fr = getattr(part, "function_response", None)
+        for fr_part in getattr(fr, "parts", None) or []:
+            blob = getattr(fr_part, "inline_data", None)
+            if blob is not None:
+                yield fr_part, blob
+
+
+def spill_content(content, store: SpillStore, min_bytes: int = 4096):
+    """Move the image payloads of ``content`` into ``store`` (in place).
+
+    Identical payloads (one screenshot attached to every function response
+    of a turn) are stored once and share a marker.
+    """
+    keys: dict[bytes, str] = {}
+    for _, blob in _blobs(content):
+        data = blob.data
+        if data and len(data) >= min_bytes and not _is_marker(blob):
+            key = keys.get(data)
+            if key is None:
+                key = keys[data] = store.put(data)
+            blob.display_name = SPILL_PREFIX + key
+            blob.data = b""
+    return content
+
+
+def materialize(contents: list, store: SpillStore) -> list:
+    """Return ``contents`` with spilled images loaded back.
+
+    Only the Content objects that hold markers are copied; the stored
+    conversation keeps its markers.
+    """
+    out = []
+    loaded: dict[str, bytes] = {}
+    for content in contents:
+        if not any(_is_marker(blob) for _, blob in _blobs(content)):
+            out.append(content)
+            continue
+        copy = content.model_copy(deep=True)
+        for _, blob in _blobs(copy):
+            if _is_marker(blob):
+                key = blob.display_name[len(SPILL_PREFIX):]
+                if key not in loaded:
+                    loaded[key] = store.get(key)
+                blob.data = loaded[key]
+                blob.display_name = None
+        out.append(copy)
+    return out
+
+
+def compact_result(result, max_chars: int = 500):
+    """Shrink an action result for status reporting (long strings cut)."""
+    if isinstance(result, dict):
+        return {k: compact_result(v, max_chars) for k, v in result.items()}
+    if isinstance(result, (list, tuple)):
+        return [compact_result(v, max_chars) for v in result[:20]]
+    if isinstance(result, bytes):
+        return f"<{len(result)} bytes>"
+    if isinstance(result, str) and len(result) > max_chars:
+        return result[:max_chars - 3] + "..."
+    return result
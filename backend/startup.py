@@ -0,0 +1,54 @@
+import threading
+import time
+
+from tracing import get_logger
+
+# Optional warm-up after boot (WARMUP=1). The API starts serving
+# immediately; heavy SDK imports and client construction then run in the
+# background so the first real request doesn't pay for them. /readyz reports
+# not-ready until warm-up has finished.
+
+logger = get_logger("startup")
+
+
+class Warmup:
+    def __init__(self):
+        self._steps = []
+        self.status = "disabled"
+        self.results: dict[str, dict] = {}
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+
+    def add_step(self, name: str, fn):
+        self._steps.append((name, fn))
+
+    def start(self):
+        if self.status != "disabled":
+            return
+        self.status = "running"
+        self.started_at = time.monotonic()
+        threading.Thread(target=self._run, name="warmup", daemon=True).start()
+
+    def _run(self):
+        failed = False
+        for name, fn in self._steps:
+            start = time.monotonic()
+            try:
+                fn()
+                self.results[name] = {"ok": True}
+            except Exception as e:
+                failed = True
+                self.results[name] = {"ok": False, "error": str(e)}
+                logger.warning("warm-up step %s failed: %s", name, e)
+            self.results[name]["ms"] = round((time.monotonic() - start) * 1000, 1)
+        self.finished_at = time.monotonic()
+        # a failed step only means that subsystem initializes on first use
+        self.status = "failed" if failed else "done"
+        logger.info("warm-up %s", self.status, extra={"fields": {"ms": round((self.finished_at - self.started_at) * 1000, 1)}})  # type: ignore
+
+    @property
+    def in_progress(self) -> bool:
+        return self.status == "running"
+
+    def stats(self) -> dict:
+        return {"status": self.status, "steps": dict(self.results)}
@@ -0,0 +1,399 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+
+from tracing import get_logger
+
+# Agent state shared between backend replicas.
+#
+# The replica that runs a session (its "owner") publishes snapshots and events
+# into the store and renews a lease on the session; any replica can then
+# answer /status (latest snapshot) and /events (the event log) for it.
+# Control requests (/command, /update_goal, /stop) that reach another
+# replica are queued in the store for the owner, which applies them; /start
+# there is refused with 409 since the session is already running.
+#
+# STATE_STORE       "memory" (default, single replica) or "sqlite"
+# STATE_STORE_PATH  SQLite file shared by replicas on one host or volume
+#                   (default /tmp/emberhacks-state.db)
+# REPLICA_ID        name of this replica (default hostname-pid)
+
+logger = get_logger("state_store")
+
+DEFAULT_SESSION = "default"
+LEASE_SECONDS = 10.0
+MAX_EVENTS = 1000
+
+
+def replica_id_from_env() -> str:
+    return os.getenv("REPLICA_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+
+class StateStore(ABC):
+    """Interface of the state stores."""
+
+    @abstractmethod
+    def claim(self, session_id: str, replica_id: str, lease: float = LEASE_SECONDS) -> bool:
+        """Take or renew ownership of a session; False if another replica holds it."""
+
+    @abstractmethod
+    def release(self, session_id: str, replica_id: str):
+        ...
+
+    @abstractmethod
+    def owner(self, session_id: str) -> str | None:
+        """Replica holding an unexpired lease on the session, if any."""
+
+    @abstractmethod
+    def publish_snapshot(self, session_id: str, replica_id: str, snapshot: dict):
+        ...
+
+    @abstractmethod
+    def get_snapshot(self, session_id: str) -> dict | None:
+        ...
+
+    @abstractmethod
+    def append_event(self, session_id: str, kind: str, data: dict) -> int:
+        ...
+
+    @abstractmethod
+    def events_since(self, session_id: str, after: int = 0, limit: int = 100) -> list[dict]:
+        """Events with a sequence number above ``after``, oldest first."""
+
+    @abstractmethod
+    def last_event_seq(self, session_id: str) -> int:
+        """Sequence number of the newest event of the session (0 if none)."""
+
+    @abstractmethod
+    def enqueue_control(self, replica_id: str, session_id: str, op: str, payload: dict):
+        ...
+
+    @abstractmethod
+    def take_controls(self, replica_id: str) -> list[dict]:
+        """Pop the control requests queued for ``replica_id``, oldest first."""
+
+    def stats(self) -> dict:
+        return {"backend": type(self).__name__}
+
+
+class InProcessStateStore(StateStore):
+    """Single-replica store: plain dicts guarded by a lock."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._leases: dict[str, tuple[str, float]] = {}
+        self._snapshots: dict[str, dict] = {}
+        self._events: dict[str, deque] = {}
+        self._seq = 0
+        self._controls: dict[str, list[dict]] = {}
+
+    def claim(self, session_id, replica_id, lease=LEASE_SECONDS):
+        now = time.time()
+        with self._lock:
+            holder = self._leases.get(session_id)
+            if holder and holder[0] != replica_id and holder[1] > now:
+                return False
+            self._leases[session_id] = (replica_id, now + lease)
+            return True
+
+    def release(self, session_id, replica_id):
+        with self._lock:
+            holder = self._leases.get(session_id)
+            if holder and holder[0] == replica_id:
+                del self._leases[session_id]
+
+    def owner(self, session_id):
+        with self._lock:
+            holder = self._leases.get(session_id)
+            return holder[0] if holder and holder[1] > time.time() else None
+
+    def publish_snapshot(self, session_id, replica_id, snapshot):
+        with self._lock:
+            self._snapshots[session_id] = dict(snapshot, replica=replica_id)
+
+    def get_snapshot(self, session_id):
+        with self._lock:
+            snap = self._snapshots.get(session_id)
+            return dict(snap) if snap is not None else None
+
+    def append_event(self, session_id, kind, data):
+        with self._lock:
+            self._seq += 1
+            self._events.setdefault(session_id, deque(maxlen=MAX_EVENTS)).append(
+                {"seq": self._seq, "kind": kind, "data": data, "ts": time.time()}
+            )
+            return self._seq
+
+    def events_since(self, session_id, after=0, limit=100):
+        with self._lock:
+            return [e for e in self._events.get(session_id, ()) if e["seq"] > after][:limit]
+
+    def last_event_seq(self, session_id):
+        with self._lock:
+            events = self._events.get(session_id)
+            return events[-1]["seq"] if events else 0
+
+    def enqueue_control(self, replica_id, session_id, op, payload):
+        with self._lock:
+            self._controls.setdefault(replica_id, []).append({"session_id": session_id, "op": op, "payload": payload})
+
+    def take_controls(self, replica_id):
+        with self._lock:
+            return self._controls.pop(replica_id, [])
+
+
+class SQLiteStateStore(StateStore):
+    """File-backed store for several replicas sharing one SQLite file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS leases (
+                    session_id TEXT PRIMARY KEY, replica_id TEXT NOT NULL, expires REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    session_id TEXT PRIMARY KEY, replica_id TEXT, data TEXT NOT NULL, updated REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS events (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL,
+                    kind TEXT NOT NULL, data TEXT NOT NULL, ts REAL NOT NULL);
+                CREATE INDEX IF NOT EXISTS events_session ON events (session_id, seq);
+                CREATE TABLE IF NOT EXISTS controls (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, replica_id TEXT NOT NULL,
+                    session_id TEXT NOT NULL, op TEXT NOT NULL, payload TEXT NOT NULL);
+            """)
+
+    def _conn(self) -> sqlite3.Connection:
+        # one connection per thread; WAL lets readers run alongside the writer
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def claim(self, session_id, replica_id, lease=LEASE_SECONDS):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT replica_id, expires FROM leases WHERE session_id = ?", (session_id,)).fetchone()
+            if row and row[0] != replica_id and row[1] > now:
+                conn.execute("ROLLBACK")
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO leases (session_id, replica_id, expires) VALUES (?, ?, ?)",
+                (session_id, replica_id, now + lease),
+            )
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def release(self, session_id, replica_id):
+        self._conn().execute("DELETE FROM leases WHERE session_id = ? AND replica_id = ?", (session_id, replica_id))
+
+    def owner(self, session_id):
+        row = self._conn().execute(
+            "SELECT replica_id FROM leases WHERE session_id = ? AND expires > ?", (session_id, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def publish_snapshot(self, session_id, replica_id, snapshot):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO snapshots (session_id, replica_id, data, updated) VALUES (?, ?, ?, ?)",
+            (session_id, replica_id, json.dumps(snapshot, default=str), time.time()),
+        )
+
+    def get_snapshot(self, session_id):
+        row = self._conn().execute(
+            "SELECT replica_id, data FROM snapshots WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return dict(json.loads(row[1]), replica=row[0]) if row else None
+
+    def append_event(self, session_id, kind, data):
+        conn = self._conn()
+        cur = conn.execute(
+            "INSERT INTO events (session_id, kind, data, ts) VALUES (?, ?, ?, ?)",
+            (session_id, kind, json.dumps(data, default=str), time.time()),
+        )
+        seq = cur.lastrowid
+        if seq % 100 == 0:
+            conn.execute("DELETE FROM events WHERE session_id = ? AND seq <= ?", (session_id, seq - MAX_EVENTS))
+        return seq
+
+    def events_since(self, session_id, after=0, limit=100):
+        rows = self._conn().execute(
+            "SELECT seq, kind, data, ts FROM events WHERE session_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+            (session_id, after, limit),
+        ).fetchall()
+        return [{"seq": r[0], "kind": r[1], "data": json.loads(r[2]), "ts": r[3]} for r in rows]
+
+    def last_event_seq(self, session_id):
+        row = self._conn().execute("SELECT MAX(seq) FROM events WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] or 0
+
+    def enqueue_control(self, replica_id, session_id, op, payload):
+        self._conn().execute(
+            "INSERT INTO controls (replica_id, session_id, op, payload) VALUES (?, ?, ?, ?)",
+            (replica_id, session_id, op, json.dumps(payload)),
+        )
+
+    def take_controls(self, replica_id):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT id, session_id, op, payload FROM controls WHERE replica_id = ? ORDER BY id", (replica_id,)
+            ).fetchall()
+            if rows:
+                conn.execute("DELETE FROM controls WHERE replica_id = ? AND id <= ?", (replica_id, rows[-1][0]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [{"session_id": r[1], "op": r[2], "payload": json.loads(r[3])} for r in rows]
+
+    def stats(self):
+        return {"backend": type(self).__name__, "path": self.path}
+
+
+def state_store_from_env() -> StateStore:
+    if os.getenv("STATE_STORE", "memory").lower() == "sqlite":
+        return SQLiteStateStore(os.getenv("STATE_STORE_PATH", "/tmp/emberhacks-state.db"))
+    return InProcessStateStore()
+
+
+class SessionReplicator:
+    """Mirrors one local agent into a state store.
+
+    A background thread renews this replica's lease while the agent runs,
+    publishes a snapshot (and a ``status`` event) whenever its update_id or
+    running state changes, and applies control requests other replicas
+    queued for it through ``apply_control(op, payload)``.
+    """
+
+    def __init__(self, store: StateStore, replica_id: str, agent, apply_control,
+                 session_id: str = DEFAULT_SESSION, interval: float = 0.25):
+        self.store = store
+        self.replica_id = replica_id
+        self.agent = agent
+        self.apply_control = apply_control
+        self.session_id = session_id
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._owned = False
+        self._seen_update = None
+        self._published = None
+        self._last_publish = 0.0
+        self.published = 0
+        self.controls_applied = 0
+        self.errors = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="state-replicator", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def remote_owner(self) -> str | None:
+        """The replica running the session when it is not this one."""
+        if self.agent.running:
+            return None
+        owner = self.store.owner(self.session_id)
+        return owner if owner and owner != self.replica_id else None
+
+    def claim(self) -> bool:
+        return self.store.claim(self.session_id, self.replica_id)
+
+    def release(self):
+        self.store.release(self.session_id, self.replica_id)
+
+    def snapshot(self) -> dict:
+        """Status of the session, from whichever replica runs it."""
+        if not self.agent.running:
+            # the owner's live state, or the last published one (e.g. the
+            # final answer of a session another replica has finished)
+            snap = self.store.get_snapshot(self.session_id)
+            if snap is not None and snap.get("replica") != self.replica_id:
+                return snap
+        return dict(self.agent.snapshot(), replica=self.replica_id)
+
+    def events(self, after: int = 0, limit: int = 100) -> list[dict]:
+        """Events of the session (``status`` snapshots, forwarded
+        ``control`` requests) after sequence number ``after``."""
+        return self.store.events_since(self.session_id, after, limit)
+
+    def last_event_seq(self) -> int:
+        return self.store.last_event_seq(self.session_id)
+
+    def forward(self, op: str, payload: dict) -> str | None:
+        """Queue a control request for the owning replica; returns its id,
+        or None when the session is local (or unowned)."""
+        owner = self.remote_owner()
+        if owner is None:
+            return None
+        self.store.enqueue_control(owner, self.session_id, op, payload)
+        self.store.append_event(self.session_id, "control", {"op": op, "from": self.replica_id, "to": owner})
+        return owner
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self._tick()
+            except Exception as e:
+                self.errors += 1
+                logger.warning("state replication failed: %s", e)
+
+    def _tick(self):
+        running = self.agent.running
+        if running:
+            self.claim()
+        for control in self.store.take_controls(self.replica_id):
+            self.controls_applied += 1
+            try:
+                self.apply_control(control["op"], control["payload"])
+            except Exception as e:
+                logger.warning("forwarded %s failed: %s", control["op"], e)
+        snap = self.agent.snapshot()
+        update_id = snap.get("update_id")
+        changed = self._seen_update is not None and update_id != self._seen_update
+        self._seen_update = update_id
+        if not running and not self._owned and not changed:
+            # idle replicas only publish their own news (e.g. a cached
+            # answer), so they never mask the owner's last state
+            return
+        key = (snap.get("update_id"), snap.get("running"), snap.get("current_goal"))
+        now = time.monotonic()
+        # republish periodically too, so readers see fresh frame/status fields
+        if key != self._published or (running and now - self._last_publish > LEASE_SECONDS / 2):
+            self.store.publish_snapshot(self.session_id, self.replica_id, snap)
+            if key != self._published:
+                self.store.append_event(self.session_id, "status", snap)
+            self._published = key
+            self._last_publish = now
+            self.published += 1
+        self._owned = running
+        if not running:
+            # final snapshot published; hand the session back
+            self.release()
+
+    def stats(self) -> dict:
+        return {
+            **self.store.stats(),
+            "replica": self.replica_id,
+            "owner": self.store.owner(self.session_id),
+            "published": self.published,
+            "controls_applied": self.controls_applied,
+            "errors": self.errors,
+        }
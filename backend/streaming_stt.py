@@ -0,0 +1,313 @@
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from array import array
+
+from audio_preprocess import SAMPLE_RATE, MIN_RMS, decode_audio_file, frame_energies, write_wav
+from tracing import get_logger
+
+# Streaming transcription: audio arrives in chunks while the user is still
+# speaking and is transcribed in overlapping windows. Completed windows are
+# committed; the unfinished tail is re-transcribed as a partial result. Once
+# the text stops changing and the audio ends in silence, the utterance is
+# final and handed to ``on_final`` (the API enqueues it into the agent).
+# Speech after that pause starts the next utterance; ``final_text`` is all
+# finished utterances so far, and finish() finalizes the last one.
+#
+# Chunks are either raw 16 kHz mono little-endian PCM16 ("pcm16", cheapest)
+# or pieces of a container stream such as webm/opus from MediaRecorder
+# ("container"). A container cannot be decoded from the middle, so it is
+# re-decoded as a whole with ffmpeg by the worker thread, outside the lock
+# and at most once per ``step_s`` of wall time.
+#
+# A backend is any callable ``transcribe(samples, start_sample) -> str``.
+
+logger = get_logger("stt")
+
+
+def _norm_word(w: str) -> str:
+    return re.sub(r"[^\w']", "", w.lower())
+
+
+def merge_overlap(left: str, right: str, max_words: int = 12) -> str:
+    """Join two transcripts whose audio overlapped, dropping repeated words."""
+    a = left.split()
+    b = right.split()
+    if not a:
+        return right.strip()
+    if not b:
+        return left.strip()
+    na = [_norm_word(w) for w in a]
+    nb = [_norm_word(w) for w in b]
+    for k in range(min(len(a), len(b), max_words), 0, -1):
+        if na[-k:] == nb[:k]:
+            return " ".join(a + b[k:])
+    return " ".join(a + b)
+
+
+class FakeSTTBackend:
+    """Deterministic local STT stand-in for development and tests.
+
+    Pretends the audio is ``script`` spoken at ``words_per_second`` from the
+    start of the stream and returns the words that fall inside each window.
+    """
+
+    def __init__(self, script: str = "open canvas and show my upcoming assignments", words_per_second: float = 2.5, latency: float = 0.0):
+        self.words = script.split()
+        self.words_per_second = words_per_second
+        self.latency = latency
+
+    def __call__(self, samples: array, start_sample: int = 0) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        start = start_sample / SAMPLE_RATE
+        end = (start_sample + len(samples)) / SAMPLE_RATE
+        i = int(start * self.words_per_second)
+        j = int(end * self.words_per_second)
+        return " ".join(self.words[i:j])
+
+
+class RouterWindowBackend:
+    """Transcribes a window through the speech router as a small WAV file."""
+
+    def __init__(self, router):
+        self.router = router
+
+    def __call__(self, samples: array, start_sample: int = 0) -> str:
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            write_wav(samples, path)
+            return self.router.transcribe(path) or ""
+        finally:
+            os.remove(path)
+
+
+def streaming_backend_from_env(router):
+    """Backend for new streams: the speech router, or the fake one when
+    STREAMING_STT_BACKEND=fake."""
+    if os.getenv("STREAMING_STT_BACKEND", "router").lower() == "fake":
+        return FakeSTTBackend()
+    return RouterWindowBackend(router)
+
+
+class StreamingTranscriber:
+    """Incremental transcription of one audio stream."""
+
+    def __init__(self, backend, on_final=None, input_format: str = "pcm16",
+                 window_s: float = 6.0, overlap_s: float = 1.0, step_s: float = 1.0,
+                 stable_updates: int = 2, trailing_silence_s: float = 0.6):
+        self.backend = backend
+        self.on_final = on_final
+        self.input_format = input_format if input_format in ("pcm16", "container") else "pcm16"
+        self.window = int(window_s * SAMPLE_RATE)
+        self.overlap = int(overlap_s * SAMPLE_RATE)
+        self.step = int(step_s * SAMPLE_RATE)
+        self.stable_updates = stable_updates
+        self.trailing_silence = int(trailing_silence_s * SAMPLE_RATE)
+        self._samples = array("h")
+        self._raw = bytearray()
+        self._decoded_bytes = 0
+        self._decoded_at = 0.0
+        self._pcm_remainder = b""
+        self._window_start = 0
+        self._partial_end = 0
+        self._unchanged = 0
+        self._cond = threading.Condition()
+        self._closing = False
+        # text of the current utterance: committed windows and the partial
+        # transcript including its tail
+        self.committed_text = ""
+        self._utterance_text = ""
+        # finished utterances
+        self.segments: list[str] = []
+        self.partial_text = ""
+        self.final_text: str | None = None
+        self.windows_transcribed = 0
+        self.created_at = time.time()
+        self.updated_at = time.time()
+        self.error: str | None = None
+        self._worker = threading.Thread(target=self._work, daemon=True)
+        self._worker.start()
+
+    # -- input ----------------------------------------------------------
+
+    def add_chunk(self, data: bytes):
+        if not data:
+            return
+        with self._cond:
+            if self.input_format == "pcm16":
+                data = self._pcm_remainder + data
+                usable = len(data) // 2 * 2
+                self._pcm_remainder = data[usable:]
+                self._samples.frombytes(data[:usable])
+            else:
+                self._raw.extend(data)
+            self.updated_at = time.time()
+            self._cond.notify_all()
+
+    def _decode_container(self, data: bytes) -> array | None:
+        fd, path = tempfile.mkstemp(suffix=".webm")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            return decode_audio_file(path)
+        except Exception:
+            # a partial container may not be decodable yet; keep what we had
+            return None
+        finally:
+            os.remove(path)
+
+    def _decode_pending(self, closing: bool):
+        # worker thread: decode new container bytes without holding the lock
+        with self._cond:
+            if len(self._raw) == self._decoded_bytes:
+                return
+            if not closing and time.monotonic() - self._decoded_at < self.step / SAMPLE_RATE:
+                return
+            data = bytes(self._raw)
+        samples = self._decode_container(data)
+        with self._cond:
+            self._decoded_bytes = len(data)
+            self._decoded_at = time.monotonic()
+            if samples is not None:
+                self._samples = samples
+
+    def finish(self, timeout: float = 30.0) -> str:
+        """Transcribe whatever is left and return the final text."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._worker.join(timeout)
+        return self.final_text if self.final_text is not None else self.partial_text
+
+    # -- processing -----------------------------------------------------
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._closing and not self._has_work():
+                    self._cond.wait(timeout=self.step / SAMPLE_RATE if self._raw else 1.0)
+                closing = self._closing
+            if self.input_format == "container":
+                self._decode_pending(closing)
+            with self._cond:
+                samples = self._samples
+            try:
+                self._process(samples, closing)
+            except Exception as e:
+                self.error = str(e)
+                logger.warning("streaming transcription failed: %s", e)
+            if closing:
+                self._finalize(self._utterance_text)
+                return
+
+    def _has_work(self) -> bool:
+        if len(self._raw) != self._decoded_bytes:
+            return time.monotonic() - self._decoded_at >= self.step / SAMPLE_RATE
+        total = len(self._samples)
+        return total - self._window_start >= self.window or total - self._partial_end >= self.step
+
+    def _process(self, samples: array, closing: bool):
+        total = len(samples)
+        # commit every complete window; the next one starts `overlap` earlier
+        while total - self._window_start >= self.window:
+            start = self._window_start
+            text = self.backend(samples[start:start + self.window], start)
+            self.windows_transcribed += 1
+            self.committed_text = merge_overlap(self.committed_text, text)
+            self._window_start = start + self.window - self.overlap
+
+        if total - self._partial_end < self.step and not closing:
+            return
+        self._partial_end = total
+        tail = samples[self._window_start:total]
+        tail_text = self.backend(tail, self._window_start) if len(tail) else ""
+        self.windows_transcribed += 1
+        utterance = merge_overlap(self.committed_text, tail_text)
+        if utterance and utterance == self._utterance_text:
+            self._unchanged += 1
+        else:
+            self._unchanged = 0
+        self._utterance_text = utterance
+        self.partial_text = " ".join(self.segments + [utterance]).strip()
+        self.updated_at = time.time()
+
+        if self._unchanged >= self.stable_updates and self._ends_in_silence(samples):
+            self._finalize(utterance)
+            # whatever is said after this pause is the next utterance
+            self._window_start = self._partial_end = total
+            self.committed_text = ""
+            self._unchanged = 0
+
+    def _ends_in_silence(self, samples: array) -> bool:
+        tail = samples[-self.trailing_silence:] if self.trailing_silence else array("h")
+        if len(tail) < self.trailing_silence:
+            return False
+        return all(e < MIN_RMS for e in frame_energies(tail))
+
+    def _finalize(self, text: str):
+        if not text:
+            return
+        self.segments.append(text)
+        self._utterance_text = ""
+        self.final_text = " ".join(self.segments)
+        self.partial_text = self.final_text
+        if self.on_final is not None:
+            try:
+                self.on_final(text)
+            except Exception as e:
+                logger.warning("failed to deliver final transcription: %s", e)
+
+    def state(self) -> dict:
+        return {
+            "partial": self.partial_text,
+            "final": self.final_text,
+            "stable": self.final_text is not None and not self._utterance_text,
+            "segments": list(self.segments),
+            "seconds": round(len(self._samples) / SAMPLE_RATE, 3),
+            "windows_transcribed": self.windows_transcribed,
+            "error": self.error,
+        }
+
+
+class TranscriptionStreams:
+    """Registry of open streams; idle streams are dropped after ``idle_timeout``."""
+
+    def __init__(self, backend_factory, idle_timeout: float = 60.0, max_streams: int = 32):
+        self.backend_factory = backend_factory
+        self.idle_timeout = idle_timeout
+        self.max_streams = max_streams
+        self._lock = threading.Lock()
+        self._streams: dict[str, StreamingTranscriber] = {}
+
+    def open(self, on_final=None, input_format: str = "pcm16") -> tuple[str, StreamingTranscriber]:
+        self._expire()
+        with self._lock:
+            if len(self._streams) >= self.max_streams:
+                raise RuntimeError("too many open transcription streams")
+            stream_id = uuid.uuid4().hex
+            stream = StreamingTranscriber(self.backend_factory(), on_final=on_final, input_format=input_format)
+            self._streams[stream_id] = stream
+            return stream_id, stream
+
+    def get(self, stream_id: str) -> StreamingTranscriber | None:
+        with self._lock:
+            return self._streams.get(stream_id)
+
+    def close(self, stream_id: str) -> StreamingTranscriber | None:
+        with self._lock:
+            return self._streams.pop(stream_id, None)
+
+    def _expire(self):
+        now = time.time()
+        with self._lock:
+            stale = [sid for sid, s in self._streams.items() if now - s.updated_at > self.idle_timeout]
+            streams = [self._streams.pop(sid) for sid in stale]
+        for stream in streams:
+            # abandoned streams must not turn into agent commands
+            stream.on_final = None
+            threading.Thread(target=stream.finish, daemon=True).start()
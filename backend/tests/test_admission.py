@@ -0,0 +1,65 @@
+import asyncio
+import threading
+import time
+
+from flask import Flask
+
+from admission import AdmissionController, AdmissionPool
+
+
+def test_pool_admits_queues_and_rejects():
+    pool = AdmissionPool("test", max_concurrent=1, max_queue=1, queue_timeout=2.0)
+    assert pool.try_acquire() is not None
+    result = {}
+    queued = threading.Thread(target=lambda: result.setdefault("waited", pool.try_acquire()))
+    queued.start()
+    while pool.waiting == 0:
+        time.sleep(0.005)
+    # the queue is full
+    assert pool.try_acquire() is None
+    pool.release(0.01)
+    queued.join(2)
+    assert result["waited"] is not None
+    stats = pool.stats()
+    assert stats["admitted"] == 2 and stats["rejected"] == 1 and stats["active"] == 1
+
+
+def test_queued_request_times_out():
+    pool = AdmissionPool("test", max_concurrent=1, max_queue=1, queue_timeout=0.05)
+    pool.try_acquire()
+    assert pool.try_acquire() is None
+    assert pool.stats()["timed_out"] == 1
+
+
+def test_async_acquire_does_not_block_the_loop():
+    pool = AdmissionPool("test", max_concurrent=1, max_queue=1, queue_timeout=1.0)
+
+    async def scenario():
+        assert await pool.acquire_async() == 0.0
+        waiter = asyncio.create_task(pool.acquire_async())
+        await asyncio.sleep(0.05)
+        assert pool.waiting == 1
+        pool.release(0.05)
+        return await waiter
+
+    assert asyncio.run(scenario()) is not None
+    assert pool.waiting == 0 and pool.active == 1
+
+
+def test_limit_returns_429_with_retry_after():
+    admission = AdmissionController()
+    admission.add_pool("control", max_concurrent=1, max_queue=0)
+    app = Flask(__name__)
+
+    @app.route("/op")
+    @admission.limit("control")
+    def op():
+        return "ok"
+
+    client = app.test_client()
+    assert client.get("/op").status_code == 200
+    admission.pools["control"].try_acquire()  # another request holds the slot
+    resp = client.get("/op")
+    assert resp.status_code == 429
+    assert int(resp.headers["Retry-After"]) >= 1
+    assert admission.stats()["control"]["rejected"] == 1
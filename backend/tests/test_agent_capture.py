@@ -0,0 +1,36 @@
+from agent_runner import AgentRunner
+
+
+class FakeCapture:
+    def __init__(self):
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+
+def test_viewer_screencast_stops_when_released(monkeypatch):
+    monkeypatch.setenv("CHECKPOINT_EVERY", "0")
+    agent = AgentRunner(client=object())
+    agent.capture_backend = "screenshot"
+    capture = agent.frame_capture = FakeCapture()
+    agent.page = object()
+
+    agent.request_capture()
+    agent._ensure_capture()
+    assert agent.frame_capture is capture
+
+    agent.release_capture()
+    agent._ensure_capture()
+    assert capture.stopped and agent.frame_capture is None
+
+
+def test_observation_screencast_keeps_running(monkeypatch):
+    monkeypatch.setenv("CHECKPOINT_EVERY", "0")
+    agent = AgentRunner(client=object())
+    agent.capture_backend = "screencast"
+    capture = agent.frame_capture = FakeCapture()
+    agent.page = object()
+    agent.release_capture()
+    agent._ensure_capture()
+    assert agent.frame_capture is capture and not capture.stopped
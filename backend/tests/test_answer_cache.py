@@ -0,0 +1,57 @@
+import time
+
+from answer_cache import AnswerCache, looks_failed, normalize_goal, normalize_site
+
+
+def test_goal_and_site_normalization():
+    assert normalize_goal("Hey, could you show my grades?") == "show my grades"
+    assert normalize_goal("SHOW my   grades") == "show my grades"
+    assert normalize_site("https://www.Canvas.example.edu/courses") == "canvas.example.edu"
+    assert normalize_site(None) == ""
+
+
+def test_answers_are_scoped_by_site():
+    cache = AnswerCache()
+    cache.put("when is the exam", "Friday", site="canvas.example.edu")
+    assert cache.get("When is the exam?", "https://canvas.example.edu/").answer == "Friday"
+    assert cache.get("when is the exam") is None
+    assert cache.get("when is the exam", "moodle.example.edu") is None
+
+
+def test_summary_is_preferred_and_entries_expire():
+    cache = AnswerCache(ttl=0.05)
+    cache.put("my grades", "Raw finish text", summary="You have an A")
+    assert cache.get("my grades").answer == "You have an A"
+    time.sleep(0.1)
+    assert cache.get("my grades") is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_least_recently_used_answers_are_evicted():
+    cache = AnswerCache(max_entries=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.get("a")
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats()["evicted"] == 1
+
+
+def test_failed_finishes_are_not_cached():
+    assert looks_failed("I couldn’t find any upcoming assignments.")
+    assert looks_failed("Error generating content: 500 INTERNAL")
+    assert not looks_failed("Your next assignment is due Friday.")
+    cache = AnswerCache()
+    cache.put("next assignment", "I was unable to log in to Canvas.")
+    cache.put("my grades", "Grades are listed", summary="Sorry, I can't access your grades right now.")
+    assert cache.get("next assignment") is None
+    assert cache.get("my grades") is None
+    assert cache.stats()["rejected"] == 2
+
+
+def test_disabled_cache_stores_nothing():
+    cache = AnswerCache(ttl=0)
+    cache.put("a", "1")
+    assert cache.get("a") is None
+    assert not cache.enabled
@@ -0,0 +1,45 @@
+import math
+from array import array
+
+from audio_preprocess import MIN_RMS, SAMPLE_RATE, detect_speech
+
+
+def _tone(seconds: float, amplitude: float, floor: float = 0.0) -> array:
+    """A 220 Hz tone whose level swings between ``floor`` and 1 (x amplitude) at 3 Hz."""
+    out = array("h")
+    for i in range(int(seconds * SAMPLE_RATE)):
+        t = i / SAMPLE_RATE
+        level = floor + (1 - floor) * (0.5 + 0.5 * math.sin(2 * math.pi * 3 * t))
+        out.append(int(amplitude * level * math.sin(2 * math.pi * 220 * t)))
+    return out
+
+
+def _silence(seconds: float) -> array:
+    return array("h", bytes(2 * int(seconds * SAMPLE_RATE)))
+
+
+def test_silence_is_no_speech():
+    assert detect_speech(_silence(2)) is None
+
+
+def test_quiet_noise_is_no_speech():
+    assert detect_speech(_tone(2, MIN_RMS / 2)) is None
+
+
+def test_trims_leading_and_trailing_silence():
+    samples = _silence(1) + _tone(1, 8000) + _silence(1)
+    start, end = detect_speech(samples)
+    assert 0.7 * SAMPLE_RATE <= start <= SAMPLE_RATE
+    assert 2 * SAMPLE_RATE <= end <= 2.3 * SAMPLE_RATE
+
+
+def test_steady_clip_without_silence_is_speech():
+    samples = _tone(3, 8000, floor=1.0)
+    assert detect_speech(samples) == (0, len(samples))
+
+
+def test_modulated_clip_without_silence_is_speech():
+    samples = _tone(2, 8000, floor=0.2)
+    span = detect_speech(samples)
+    assert span is not None
+    assert span[1] - span[0] >= SAMPLE_RATE
@@ -0,0 +1,150 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from browser_provider import BrowserEndpointPool, RemoteBrowserProvider
+
+
+class StubEndpoint:
+    """A listening TCP socket: passes the pool's health probe."""
+
+    def __init__(self):
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(8)
+        self.url = f"ws://127.0.0.1:{self.sock.getsockname()[1]}/"
+
+    def close(self):
+        self.sock.close()
+
+
+class FakeBrowser:
+    def __init__(self, url):
+        self.url = url
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeChromium:
+    def __init__(self):
+        self.down = set()
+        self.connects = []
+
+    def connect(self, url, timeout=None):
+        self.connects.append(url)
+        if url in self.down:
+            raise ConnectionError(f"{url} refused")
+        return FakeBrowser(url)
+
+
+class FakePlaywright:
+    def __init__(self):
+        self.chromium = FakeChromium()
+
+
+@pytest.fixture
+def endpoints():
+    stubs = [StubEndpoint(), StubEndpoint()]
+    yield stubs
+    for stub in stubs:
+        stub.close()
+
+
+def test_sessions_spread_over_endpoints_and_release_their_lease(endpoints):
+    pool = BrowserEndpointPool([e.url for e in endpoints], probe_interval=60)
+    provider = RemoteBrowserProvider(FakePlaywright(), pool)
+    first = provider.acquire()
+    second = provider.acquire()
+    assert {first.url, second.url} == {e.url for e in endpoints}
+    assert provider.endpoint_for(first) == first.url
+
+    provider.release(first)
+    assert first.closed
+    assert pool.stats()[first.url]["leases"] == 0
+    assert pool.stats()[second.url]["leases"] == 1
+    # the freed endpoint is now the least loaded one
+    assert provider.acquire().url == first.url
+
+
+def test_failed_connect_moves_on_to_the_next_endpoint(endpoints):
+    playwright = FakePlaywright()
+    down = endpoints[0].url
+    playwright.chromium.down.add(down)
+    pool = BrowserEndpointPool([e.url for e in endpoints], probe_interval=60)
+    provider = RemoteBrowserProvider(playwright, pool)
+    assert provider.acquire().url == endpoints[1].url
+    stats = pool.stats()[down]
+    assert not stats["healthy"] and stats["failures"] == 1
+
+
+def test_reconnect_after_disconnect_uses_a_healthy_endpoint(endpoints):
+    pool = BrowserEndpointPool([e.url for e in endpoints], probe_interval=60)
+    provider = RemoteBrowserProvider(FakePlaywright(), pool)
+    browser = provider.acquire()
+    # what the agent does when its browser connection drops
+    provider.release(browser, failed=True)
+    replacement = provider.acquire()
+    assert replacement.url != browser.url
+    assert not pool.stats()[browser.url]["healthy"]
+
+
+def test_failed_endpoint_is_readmitted_by_the_health_probe(endpoints):
+    pool = BrowserEndpointPool([endpoints[0].url], probe_interval=0.05, cooldown=0.1)
+    provider = RemoteBrowserProvider(FakePlaywright(), pool)
+    provider.release(provider.acquire(), failed=True)
+    with pytest.raises(RuntimeError):
+        provider.acquire()
+    deadline = time.monotonic() + 2
+    while not pool.stats()[endpoints[0].url]["healthy"] and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert provider.acquire().url == endpoints[0].url
+
+
+def _chromium_installed() -> bool:
+    try:
+        from playwright.sync_api import sync_playwright
+
+        with sync_playwright() as p:
+            return os.path.exists(p.chromium.executable_path)
+    except Exception:
+        return False
+
+
+@pytest.mark.skipif(not _chromium_installed(), reason="Playwright Chromium is not installed")
+def test_real_browser_server():
+    from playwright.sync_api import sync_playwright
+
+    probe = socket.socket()
+    probe.bind(("127.0.0.1", 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "playwright", "run-server", "--port", str(port), "--host", "127.0.0.1"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        url = f"ws://127.0.0.1:{port}/"
+        pool = BrowserEndpointPool([url], probe_interval=60)
+        deadline = time.monotonic() + 20
+        while not pool._probe(url) and time.monotonic() < deadline:
+            time.sleep(0.2)
+        with sync_playwright() as p:
+            provider = RemoteBrowserProvider(p, pool)
+            browser = provider.acquire()
+            page = browser.new_page()
+            page.set_content("<title>ok</title>")
+            assert page.title() == "ok"
+            provider.release(browser)
+            assert pool.stats()[url]["leases"] == 0
+            browser = provider.acquire()
+            assert browser.is_connected()
+            provider.release(browser)
+    finally:
+        server.terminate()
+        server.wait(10)
@@ -0,0 +1,117 @@
+import json
+import time
+
+from google.genai import types
+
+from checkpoint import SessionCheckpointer, compact_contents
+
+
+def _conversation(turns: int) -> list:
+    contents = [types.Content(role="user", parts=[
+        types.Part.from_text(text="show my grades"),
+        types.Part.from_bytes(data=b"\x89PNG" + bytes(64), mime_type="image/png"),
+    ])]
+    for i in range(turns):
+        contents.append(types.Content(role="model", parts=[
+            types.Part(function_call=types.FunctionCall(name="click_at", args={"x": i, "y": i})),
+        ]))
+        contents.append(types.Content(role="user", parts=[
+            types.Part(function_response=types.FunctionResponse(
+                name="click_at",
+                response={"url": f"https://example.edu/{i}"},
+                parts=[types.FunctionResponsePart(
+                    inline_data=types.FunctionResponseBlob(mime_type="image/png", data=bytes(64))
+                )],
+            )),
+        ]))
+    return contents
+
+
+def test_checkpoint_round_trip(tmp_path):
+    checkpoints = SessionCheckpointer(str(tmp_path / "session.json"))
+    contents = _conversation(2)
+    checkpoints.save({
+        "current_goal": "show my grades",
+        "current_site": "canvas.example.edu",
+        "url": "https://example.edu/1",
+        "commands": ["scroll down"],
+        "idle": False,
+        "contents": contents,
+    })
+    state = checkpoints.load()
+    assert state["current_goal"] == "show my grades"
+    assert state["current_site"] == "canvas.example.edu"
+    assert state["commands"] == ["scroll down"]
+    restored = state["contents"]
+    assert [c.role for c in restored] == [c.role for c in contents]
+    assert restored[0].parts[0].text == "show my grades"
+    assert restored[1].parts[0].function_call.args == {"x": 0, "y": 0}
+    assert restored[2].parts[0].function_response.response == {"url": "https://example.edu/0"}
+    # screenshots are not written
+    assert "inline_data" not in (tmp_path / "session.json").read_text()
+    assert checkpoints.stats()["saved"] == 1 and checkpoints.stats()["restored"] == 1
+
+
+def test_long_history_keeps_goal_and_starts_tail_at_model_turn():
+    compacted = compact_contents(_conversation(10), max_contents=6)
+    assert compacted[0]["parts"][0]["text"] == "show my grades"
+    assert compacted[1]["role"] == "model"
+    assert len(compacted) <= 6
+
+
+def test_stale_or_foreign_checkpoints_are_ignored(tmp_path):
+    path = tmp_path / "session.json"
+    checkpoints = SessionCheckpointer(str(path), max_age=60)
+    assert checkpoints.load() is None
+    path.write_text(json.dumps({"version": 1, "saved_at": time.time() - 120, "contents": []}))
+    assert checkpoints.load() is None
+    path.write_text(json.dumps({"version": 99, "saved_at": time.time(), "contents": []}))
+    assert checkpoints.load() is None
+    path.write_text("{broken")
+    assert checkpoints.load() is None
+    checkpoints.discard()
+    assert not checkpoints.exists()
+
+
+def test_checkpoints_are_due_every_n_turns(tmp_path):
+    checkpoints = SessionCheckpointer(str(tmp_path / "s.json"), every=3)
+    assert [t for t in range(10) if checkpoints.due(t)] == [3, 6, 9]
+
+
+def test_checkpoint_of_another_session_is_ignored(tmp_path):
+    checkpoints = SessionCheckpointer(str(tmp_path / "session.json"))
+    checkpoints.save({"trace_id": "old-session", "current_goal": "old goal", "contents": []})
+    assert checkpoints.load(session_id="new-session") is None
+    assert checkpoints.load(session_id="old-session")["current_goal"] == "old goal"
+
+
+def test_new_session_discards_stale_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.setenv("CHECKPOINT_DIR", str(tmp_path))
+    from agent_runner import AgentRunner
+
+    agent = AgentRunner(client=object(), checkpoint_name="stale")
+    agent._run_loop = lambda: None  # no browser in tests
+    agent.checkpoints.save({"trace_id": "old-session", "current_goal": "old goal", "commands": ["old"], "contents": []})
+
+    agent.start("new goal")
+    assert agent.current_goal == "new goal"
+    assert not agent.checkpoints.exists()
+    # what crash recovery and browser reconnects would load
+    agent.checkpoints.save({"trace_id": "old-session", "current_goal": "old goal", "contents": []})
+    assert agent._load_checkpoint() is None
+    agent.stop()
+
+
+def test_resumed_session_keeps_its_checkpoint_identity(tmp_path, monkeypatch):
+    monkeypatch.setenv("CHECKPOINT_DIR", str(tmp_path))
+    from agent_runner import AgentRunner
+
+    agent = AgentRunner(client=object(), checkpoint_name="resume")
+    agent._run_loop = lambda: None
+    agent.checkpoints.save({"trace_id": "crashed-session", "current_goal": "old goal", "contents": []})
+
+    agent.start("ignored", resume=True)
+    assert agent.current_goal == "old goal"
+    assert agent.trace_id == "crashed-session"
+    assert agent._load_checkpoint()["current_goal"] == "old goal"
+    agent.stop()
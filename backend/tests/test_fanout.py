@@ -0,0 +1,31 @@
+from fanout import CANCELLED, DONE, FAILED, FanOutConfig, FanOutRun, _parse_subgoals, looks_multi_part
+
+
+def test_only_multi_part_goals_qualify_for_planning():
+    config = FanOutConfig(min_words=6)
+    assert config.qualifies("compare the late policies of my three courses")
+    assert config.qualifies("get the due dates from canvas, piazza, gradescope and my email")
+    assert not config.qualifies("open canvas and show my upcoming assignments")
+    assert not config.qualifies("compare grades")  # too short
+    assert not config.qualifies(None)
+    assert looks_multi_part("check https://a.example.edu and https://b.example.edu")
+
+
+def test_planner_output_is_parsed_and_capped():
+    text = 'Sure: {"subgoals": ["a", " b ", "", 3, "c"]}'
+    assert _parse_subgoals(text, 2) == ["a", "b"]
+    assert _parse_subgoals("no json here", 4) == []
+    assert _parse_subgoals("{not json}", 4) == []
+
+
+def test_merged_text_reports_every_branch_in_order():
+    run = FanOutRun("goal", ["first", "second", "third"])
+    run.finish(run.branches[0], DONE, text="A")
+    run.finish(run.branches[1], FAILED, error="turn limit reached")
+    run.finish(run.branches[2], CANCELLED)
+    assert run.merged_text().splitlines() == [
+        "first: A",
+        "second: not completed (turn limit reached)",
+        "third: not completed (cancelled)",
+    ]
+    assert [b["status"] for b in run.view()["branches"]] == [DONE, FAILED, CANCELLED]
@@ -0,0 +1,62 @@
+from hit_index import _PROBE_JS, _TOPMOST_JS, HitIndex
+
+LINK = [100, 100, 80, 20, "a", "Submit"]
+BUTTON = [100, 130, 80, 20, "button", "Cancel"]
+
+
+def _index(*rects) -> HitIndex:
+    index = HitIndex(tolerance=12)
+    index._build("key", [list(r) for r in rects])
+    return index
+
+
+def test_snaps_near_miss_inside_target():
+    snap = _index(LINK).snap(95, 110)
+    assert snap["distance"] == 5.0
+    assert 100 < snap["x"] < 180 and 100 < snap["y"] < 120
+    assert snap["target"] == "a 'Submit'"
+
+
+def test_no_snap_on_target_or_beyond_tolerance():
+    index = _index(LINK)
+    assert index.snap(120, 110) is None
+    assert index.snap(60, 110) is None
+
+
+def test_no_snap_when_ambiguous():
+    # 5px below the link and 5px above the button
+    assert _index(LINK, BUTTON).snap(140, 125) is None
+
+
+class FakePage:
+    def __init__(self, on_target=False, topmost=True, rects=(LINK,)):
+        self.on_target = on_target
+        self.topmost = topmost
+        self.rects = [list(r) for r in rects]
+        self.collected = 0
+
+    def evaluate(self, script, arg):
+        if script is _TOPMOST_JS:
+            return self.topmost
+        assert script is _PROBE_JS
+        if arg["known"] == "key":
+            return {"key": "key", "onTarget": self.on_target}
+        self.collected += 1
+        return {"key": "key", "onTarget": self.on_target, "rects": self.rects}
+
+
+def test_snap_click_collects_rects_once_per_page_state():
+    page = FakePage()
+    index = HitIndex()
+    assert index.snap_click(page, 95, 110) is not None
+    assert index.snap_click(page, 95, 110) is not None
+    assert page.collected == 1
+    assert index.snaps == 2
+
+
+def test_snap_click_keeps_clicks_on_unindexed_clickables():
+    assert HitIndex().snap_click(FakePage(on_target=True), 95, 110) is None
+
+
+def test_snap_click_skips_covered_targets():
+    assert HitIndex().snap_click(FakePage(topmost=False), 95, 110) is None
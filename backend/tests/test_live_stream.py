@@ -0,0 +1,70 @@
+import threading
+
+from live_stream import LiveStreamHub
+from screencast import Frame
+
+
+def _frame(seq: int) -> Frame:
+    return Frame(seq, 0.0, "image/png", "aGVsbG8=")
+
+
+def test_fps_is_clamped_to_the_cap():
+    hub = LiveStreamHub(max_fps=5)
+    assert hub.clamp_fps(2) == 2
+    assert hub.clamp_fps(50) == 5
+    for bad in (None, 0, -1, float("nan")):
+        assert hub.clamp_fps(bad) == 5
+
+
+def test_viewer_slots_are_limited_and_released_once():
+    hub = LiveStreamHub(max_viewers=1)
+    slot = hub.attach_viewer()
+    assert slot is not None
+    assert hub.attach_viewer() is None
+    slot.release()
+    slot.release()
+    assert hub.viewers == 0
+
+
+def test_unstarted_stream_releases_on_close_hook():
+    hub = LiveStreamHub(max_viewers=1)
+    slot = hub.attach_viewer()
+    hub.stream(slot)  # never iterated
+    slot.release()  # what the response close hook does
+    assert hub.attach_viewer() is not None
+
+
+def test_stream_ends_when_agent_stops():
+    hub = LiveStreamHub(max_fps=100)
+    hub.publish(_frame(1))
+    running = threading.Event()
+    running.set()
+    slot = hub.attach_viewer()
+    stream = hub.stream(slot, alive=running.is_set)
+    assert next(stream).startswith(b"--frame")
+    running.clear()
+    assert list(stream) == []
+    assert hub.viewers == 0
+
+
+def test_on_idle_fires_when_the_last_viewer_leaves():
+    idle = []
+    hub = LiveStreamHub(on_idle=lambda: idle.append(True))
+    first = hub.attach_viewer()
+    second = hub.attach_viewer()
+    first.release()
+    assert idle == []
+    second.release()
+    second.release()
+    assert idle == [True]
+
+
+def test_single_frame_requests_hold_the_capture_briefly():
+    idle = threading.Event()
+    hub = LiveStreamHub(on_idle=idle.set, hold_seconds=0.1)
+    hub.hold()
+    slot = hub.attach_viewer()
+    slot.release()
+    # the viewer left, but a frame was asked for just now
+    assert not idle.is_set()
+    assert idle.wait(1.0)
@@ -0,0 +1,30 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def harness(monkeypatch):
+    # loadtest changes the environment and main's globals; undo both afterwards
+    monkeypatch.setenv("CHECKPOINT_EVERY", os.environ.get("CHECKPOINT_EVERY", "3"))
+    import loadtest
+    import main
+
+    for name in ("agent", "speech", "tts_prefetch"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+    monkeypatch.setattr(main.replication, "agent", main.replication.agent)
+    agent = loadtest.install_stand_ins(SimpleNamespace(agent_latency_ms=0, tts_latency_ms=0, stt_latency_ms=0))
+    agent.running = False
+    yield main.app.test_client(), agent
+    main.replication.release()
+
+
+def test_stand_in_agent_takes_control_calls_with_a_site(harness):
+    client, agent = harness
+    resp = client.post("/start", json={"goal": "show my grades", "site": "canvas.example.edu", "fresh": True})
+    assert resp.status_code == 200, resp.get_json()
+    assert agent.current_site == "canvas.example.edu"
+    resp = client.post("/update_goal", json={"goal": "show my exams", "site": "canvas.example.edu", "fresh": True})
+    assert resp.status_code == 200, resp.get_json()
+    assert agent.current_goal == "show my exams"
@@ -0,0 +1,83 @@
+from loop_detector import ESCALATE, HINT, STOP, LoopDetector, action_signature
+
+CLICK = [("click_at", {"x": 100, "y": 200})]
+SCREEN = b"same screen"
+
+
+def _repeat(detector, actions, screen, url="https://example.edu", turns=3):
+    return [detector.observe(actions, screen, url) for _ in range(turns)]
+
+
+def test_nearby_clicks_share_a_signature():
+    assert action_signature("click_at", {"x": 101, "y": 203}) == action_signature("click_at", {"y": 210, "x": 110})
+    assert action_signature("click_at", {"x": 100, "y": 200}) != action_signature("click_at", {"x": 300, "y": 200})
+
+
+def test_progress_gives_no_verdict():
+    detector = LoopDetector(repeat_threshold=3)
+    for i in range(6):
+        assert detector.observe(CLICK, f"screen {i}".encode(), "https://example.edu") is None
+    assert detector.stats()["goal_wasted_turns"] == 0
+
+
+def test_repeated_action_escalates_hint_escalate_stop():
+    detector = LoopDetector(repeat_threshold=3)
+    verdicts = _repeat(detector, CLICK, SCREEN)
+    assert verdicts[:2] == [None, None]
+    assert verdicts[2].level == HINT
+    assert verdicts[2].reason == "same action on an unchanged screen"
+
+    # every detection needs fresh evidence
+    verdicts = _repeat(detector, CLICK, SCREEN)
+    assert verdicts[:2] == [None, None] and verdicts[2].level == ESCALATE
+    assert "click_at(x=5,y=10)" in verdicts[2].message
+
+    assert _repeat(detector, CLICK, SCREEN)[2].level == STOP
+    stats = detector.stats()
+    assert (stats["hints"], stats["escalations"], stats["stops"]) == (1, 1, 1)
+    assert stats["goal_wasted_turns"] == 6
+
+
+def test_unchanged_screen_with_different_actions():
+    detector = LoopDetector(repeat_threshold=3)
+    detector.observe([("scroll_document", {"direction": "down"})], SCREEN, "u")
+    detector.observe([("key_combination", {"keys": "Tab"})], SCREEN, "u")
+    verdict = detector.observe(CLICK, SCREEN, "u")
+    assert verdict.level == HINT and verdict.reason == "screen unchanged"
+
+
+def test_back_and_forth_between_two_screens():
+    detector = LoopDetector(repeat_threshold=3)
+    down = [("scroll_document", {"direction": "down"})]
+    up = [("scroll_document", {"direction": "up"})]
+    verdicts = [
+        detector.observe(down, b"bottom", "u"),
+        detector.observe(up, b"top", "u"),
+        detector.observe(down, b"bottom", "u"),
+        detector.observe(up, b"top", "u"),
+    ]
+    assert verdicts[:3] == [None, None, None]
+    assert verdicts[3].level == HINT
+    assert verdicts[3].reason == "moving back and forth between the same screens"
+
+
+def test_reset_starts_a_new_goal_at_the_first_level():
+    detector = LoopDetector(repeat_threshold=3)
+    _repeat(detector, CLICK, SCREEN)
+    _repeat(detector, CLICK, SCREEN)
+    assert detector.level == 2
+    detector.reset()
+    assert detector.level == 0 and detector.stats()["goal_wasted_turns"] == 0
+    # turns before the reset do not count
+    detector.observe(CLICK, SCREEN, "u")
+    detector.reset()
+    verdicts = _repeat(detector, CLICK, SCREEN, url="u")
+    assert verdicts[:2] == [None, None] and verdicts[2].level == HINT
+    # totals survive across goals
+    assert detector.stats()["hints"] == 2 and detector.stats()["total_wasted_turns"] == 6
+
+
+def test_threshold_has_a_floor_of_two():
+    detector = LoopDetector(repeat_threshold=1)
+    assert detector.observe(CLICK, SCREEN, "u") is None
+    assert detector.observe(CLICK, SCREEN, "u").level == HINT
@@ -0,0 +1,22 @@
+from google.genai import types
+
+from model_router import ModelRouter, _default_rules, apply_settings
+
+
+def test_default_routes_keep_the_generation_config():
+    router = ModelRouter(_default_rules())
+    config = types.GenerateContentConfig(temperature=0.5)
+    for kind in ("turn", "summary", "plan"):
+        (model, settings), *_ = router.select(kind)
+        assert settings == {}
+        assert apply_settings(config, settings) is config
+
+
+def test_routing_policy_applies_thinking_budget():
+    rules = [{"kind": "summary", "when": {"min_contents": 3}, "model": "small", "settings": {"thinking_budget": 0}}]
+    router = ModelRouter(rules + _default_rules())
+    assert router.select("summary", contents_len=1)[0][1] == {}
+    model, settings = router.select("summary", contents_len=5)[0]
+    assert model == "small"
+    config = apply_settings(None, settings)
+    assert config.thinking_config.thinking_budget == 0
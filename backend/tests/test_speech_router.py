@@ -0,0 +1,104 @@
+import asyncio
+import time
+
+import pytest
+
+from speech_providers import SpeechAudio, SpeechProviderError, SpeechRouter
+
+
+class FakeProvider:
+    def __init__(self, name, fail=None, delay=0.0, kinds=("tts", "stt")):
+        self.name = name
+        self.fail = fail
+        self.delay = delay
+        self.kinds = kinds
+        self.calls = 0
+
+    def supports(self, kind):
+        return kind in self.kinds
+
+    def synthesize(self, text, voice_id, output_format=None):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail is not None:
+            raise self.fail
+        return SpeechAudio(text.encode(), "audio/mpeg", self.name)
+
+    def transcribe(self, path):
+        self.calls += 1
+        if self.fail is not None:
+            raise self.fail
+        return f"{self.name} heard {path}"
+
+
+def test_failing_provider_falls_over_to_the_next():
+    first = FakeProvider("first", fail=SpeechProviderError("first: down"))
+    second = FakeProvider("second")
+    router = SpeechRouter([first, second])
+    assert router.synthesize("hi", "voice").provider == "second"
+    assert router.transcribe("a.wav") == "second heard a.wav"
+    stats = router.stats()
+    assert stats["first:tts"]["errors"] == 1 and stats["second:tts"]["errors"] == 0
+
+
+def test_providers_without_the_capability_are_skipped():
+    tts_only = FakeProvider("tts-only", kinds=("tts",))
+    both = FakeProvider("both")
+    router = SpeechRouter([tts_only, both])
+    assert router.transcribe("a.wav") == "both heard a.wav"
+    assert tts_only.calls == 0
+
+
+def test_slow_provider_is_abandoned_and_cooled_down():
+    slow = FakeProvider("slow", delay=0.5)
+    fast = FakeProvider("fast")
+    router = SpeechRouter([slow, fast], timeout=0.05, error_cooldown=60)
+    assert router.synthesize("hi", "voice").provider == "fast"
+    assert router.stats()["slow:tts"]["timeouts"] == 1
+    assert router.stats()["slow:tts"]["cooling_down"]
+    router.synthesize("again", "voice")
+    assert slow.calls == 1
+
+
+def test_quota_error_cools_down_until_it_expires():
+    limited = FakeProvider("limited", fail=SpeechProviderError("limited: quota", quota=True))
+    backup = FakeProvider("backup")
+    router = SpeechRouter([limited, backup], quota_cooldown=0.2)
+    router.synthesize("one", "voice")
+    router.synthesize("two", "voice")
+    # skipped while cooling down
+    assert limited.calls == 1 and backup.calls == 2
+
+    time.sleep(0.25)
+    limited.fail = None
+    # re-admitted once the cooldown is over
+    assert router.synthesize("three", "voice").provider == "limited"
+    assert not router.stats()["limited:tts"]["cooling_down"]
+
+
+def test_three_consecutive_errors_cool_a_provider_down():
+    flaky = FakeProvider("flaky", fail=SpeechProviderError("flaky: 500"))
+    backup = FakeProvider("backup")
+    router = SpeechRouter([flaky, backup], error_cooldown=60)
+    for _ in range(4):
+        router.synthesize("hi", "voice")
+    assert flaky.calls == 3
+    assert router.stats()["flaky:tts"]["cooling_down"]
+
+
+def test_providers_cooling_down_are_still_tried_as_a_last_resort():
+    only = FakeProvider("only", fail=SpeechProviderError("only: quota", quota=True))
+    router = SpeechRouter([only], quota_cooldown=60)
+    with pytest.raises(SpeechProviderError):
+        router.synthesize("hi", "voice")
+    only.fail = None
+    assert router.synthesize("hi", "voice").provider == "only"
+
+
+def test_async_calls_fail_over_too():
+    first = FakeProvider("first", fail=SpeechProviderError("first: down"))
+    second = FakeProvider("second")
+    router = SpeechRouter([first, second])
+    audio = asyncio.run(router.asynthesize("hi", "voice"))
+    assert audio.provider == "second"
@@ -0,0 +1,40 @@
+from google.genai import types
+
+from spill_store import SpillStore, materialize, spill_content
+
+
+def _responses(screenshot: bytes, n: int) -> types.Content:
+    return types.Content(role="user", parts=[
+        types.Part(function_response=types.FunctionResponse(
+            name=f"action_{i}",
+            response={},
+            parts=[types.FunctionResponsePart(
+                inline_data=types.FunctionResponseBlob(mime_type="image/png", data=screenshot)
+            )],
+        ))
+        for i in range(n)
+    ])
+
+
+def test_screenshot_shared_by_function_responses_is_stored_once(tmp_path):
+    store = SpillStore(memory_limit_bytes=0, hot_items=1, spill_dir=str(tmp_path))
+    screenshot = b"\x89PNG" + bytes(8192)
+    content = spill_content(_responses(screenshot, 3), store)
+    names = {p.function_response.parts[0].inline_data.display_name for p in content.parts}
+    assert len(names) == 1
+    assert store.stats()["hot_images"] == 1
+
+    restored = materialize([content], store)[0]
+    assert all(p.function_response.parts[0].inline_data.data == screenshot for p in restored.parts)
+    # the stored conversation keeps its markers
+    assert content.parts[0].function_response.parts[0].inline_data.data == b""
+
+
+def test_spilled_images_are_read_back(tmp_path):
+    store = SpillStore(memory_limit_bytes=0, hot_items=1, spill_dir=str(tmp_path))
+    shots = [bytes([i]) * 8192 for i in range(3)]
+    contents = [spill_content(_responses(s, 1), store) for s in shots]
+    assert store.stats()["spilled_images"] == 2
+    restored = materialize(contents, store)
+    assert [c.parts[0].function_response.parts[0].inline_data.data for c in restored] == shots
+    store.close()
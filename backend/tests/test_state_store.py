@@ -0,0 +1,79 @@
+import pytest
+
+from state_store import InProcessStateStore, SessionReplicator, SQLiteStateStore, StateStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteStateStore(str(tmp_path / "state.db"))
+    return InProcessStateStore()
+
+
+def test_interface_is_abstract():
+    with pytest.raises(TypeError):
+        StateStore()
+
+
+def test_lease_is_exclusive_until_released(store):
+    assert store.claim("s", "a")
+    assert store.claim("s", "a")
+    assert not store.claim("s", "b")
+    assert store.owner("s") == "a"
+    store.release("s", "a")
+    assert store.owner("s") is None
+    assert store.claim("s", "b")
+
+
+def test_expired_lease_can_be_taken(store):
+    assert store.claim("s", "a", lease=-1)
+    assert store.owner("s") is None
+    assert store.claim("s", "b")
+
+
+def test_snapshots_and_events(store):
+    store.publish_snapshot("s", "a", {"update_id": 3})
+    assert store.get_snapshot("s") == {"update_id": 3, "replica": "a"}
+    assert store.last_event_seq("s") == 0
+    first = store.append_event("s", "status", {"update_id": 1})
+    second = store.append_event("s", "status", {"update_id": 2})
+    assert store.last_event_seq("s") == second
+    assert [e["data"]["update_id"] for e in store.events_since("s", first)] == [2]
+
+
+def test_controls_are_taken_once_in_order(store):
+    store.enqueue_control("a", "s", "command", {"command": "one"})
+    store.enqueue_control("a", "s", "stop", {})
+    assert [c["op"] for c in store.take_controls("a")] == ["command", "stop"]
+    assert store.take_controls("a") == []
+
+
+class FakeAgent:
+    def __init__(self, running=False):
+        self.running = running
+        self.update_id = 0
+
+    def snapshot(self, debug=False):
+        return {"running": self.running, "update_id": self.update_id, "current_goal": "g"}
+
+
+def test_replicas_share_a_session(tmp_path):
+    path = str(tmp_path / "state.db")
+    owner_agent, other_agent = FakeAgent(running=True), FakeAgent()
+    applied = []
+    owner = SessionReplicator(SQLiteStateStore(path), "a", owner_agent, lambda op, p: applied.append(op))
+    other = SessionReplicator(SQLiteStateStore(path), "b", other_agent, lambda op, p: None)
+
+    owner._tick()
+    assert other.remote_owner() == "a"
+    assert other.snapshot()["replica"] == "a"
+    assert [e["kind"] for e in other.events()] == ["status"]
+
+    assert other.forward("command", {"command": "scroll"}) == "a"
+    owner._tick()
+    assert applied == ["command"]
+
+    owner_agent.running = False
+    owner._tick()
+    assert other.remote_owner() is None
+    assert other.snapshot()["running"] is False
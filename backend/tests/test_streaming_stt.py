@@ -0,0 +1,77 @@
+import math
+from array import array
+
+from audio_preprocess import SAMPLE_RATE
+from streaming_stt import StreamingTranscriber, merge_overlap
+
+
+def _speech(seconds: float) -> bytes:
+    return array("h", (int(8000 * math.sin(2 * math.pi * 220 * i / SAMPLE_RATE))
+                       for i in range(int(seconds * SAMPLE_RATE)))).tobytes()
+
+
+def _silence(seconds: float) -> bytes:
+    return bytes(2 * int(seconds * SAMPLE_RATE))
+
+
+class ScriptedBackend:
+    """Hears each (text, start_s, end_s) phrase in windows overlapping it by
+    at least half a second."""
+
+    def __init__(self, *phrases):
+        self.phrases = phrases
+
+    def __call__(self, samples, start_sample=0):
+        start = start_sample / SAMPLE_RATE
+        end = start + len(samples) / SAMPLE_RATE
+        return " ".join(text for text, a, b in self.phrases if min(end, b) - max(start, a) >= 0.5)
+
+
+def test_merge_overlap_drops_repeated_words():
+    assert merge_overlap("open my canvas", "Canvas, and show grades") == "open my canvas and show grades"
+    assert merge_overlap("", "hello") == "hello"
+
+
+def test_speech_after_a_pause_is_kept():
+    delivered = []
+    stream = StreamingTranscriber(
+        ScriptedBackend(("open canvas", 0, 1.5), ("and show my grades", 3.5, 5.5)),
+        on_final=delivered.append,
+        step_s=0.5,
+        stable_updates=1,
+    )
+    for _ in range(3):
+        stream.add_chunk(_speech(0.5))
+    # pause long enough for the first utterance to stabilize and finalize
+    for _ in range(4):
+        stream.add_chunk(_silence(0.5))
+        _wait_idle(stream)
+    _wait_until(lambda: stream.segments)
+    assert delivered == ["open canvas"]
+
+    stream.add_chunk(_speech(2.0))
+    text = stream.finish()
+    assert text == "open canvas and show my grades"
+    assert delivered == ["open canvas", "and show my grades"]
+    assert stream.state()["stable"]
+
+
+def test_finish_without_pause_returns_everything():
+    delivered = []
+    stream = StreamingTranscriber(ScriptedBackend(("hello there", 0, 1.5)), on_final=delivered.append)
+    stream.add_chunk(_speech(1.5))
+    assert stream.finish() == "hello there"
+    assert delivered == ["hello there"]
+
+
+def _wait_idle(stream):
+    _wait_until(lambda: not stream._has_work())
+
+
+def _wait_until(predicate, timeout: float = 5.0):
+    import time
+
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
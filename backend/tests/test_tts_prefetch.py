@@ -0,0 +1,74 @@
+import threading
+
+from tts_prefetch import SpeechPrefetcher
+
+
+class FakeProvider:
+    name = "fake"
+
+    def supports(self, kind: str) -> bool:
+        return kind == "tts"
+
+
+class FakeRouter:
+    """Streams the text back as audio; texts in ``blocked`` hang until released."""
+
+    def __init__(self):
+        self.providers = [FakeProvider()]
+        self.release = threading.Event()
+        self.blocked = set()
+        self.started = threading.Event()
+        self.closed = []
+
+    def stream(self, text, voice_id, output_format=None):
+        router = self
+
+        def chunks():
+            try:
+                yield text.encode()
+                if text in router.blocked:
+                    router.started.set()
+                    router.release.wait(5)
+                yield b"."
+            finally:
+                router.closed.append(text)
+
+        return "audio/mpeg", chunks()
+
+
+def test_lookup_by_update_and_text():
+    prefetcher = SpeechPrefetcher(FakeRouter())
+    prefetcher.schedule(1, "hello there")
+    audio = prefetcher.lookup("hello there", update_id=1)
+    assert audio is not None and audio.data == b"hello there."
+    assert prefetcher.lookup("hello there").data == b"hello there."
+    # an update id the prefetcher never saw falls back to the text
+    assert prefetcher.lookup("hello there", update_id=7) is not None
+
+
+def test_lookup_misses_when_text_differs_from_update():
+    prefetcher = SpeechPrefetcher(FakeRouter())
+    prefetcher.schedule(1, "old text")
+    assert prefetcher.lookup("new text", update_id=1, wait=0.5) is None
+    assert prefetcher.stats()["misses"] == 1
+
+
+def test_lookup_misses_for_other_voice_or_format():
+    prefetcher = SpeechPrefetcher(FakeRouter())
+    prefetcher.schedule(1, "hello")
+    assert prefetcher.lookup("hello", voice_id="someone-else", update_id=1) is None
+    assert prefetcher.lookup("hello", output_format="pcm_16000", update_id=1) is None
+
+
+def test_newer_update_cancels_running_synthesis():
+    router = FakeRouter()
+    router.blocked.add("slow")
+    prefetcher = SpeechPrefetcher(router, max_concurrent=1)
+    prefetcher.schedule(1, "slow")
+    assert router.started.wait(2)
+    prefetcher.schedule(2, "fast")
+    router.release.set()
+    assert prefetcher.lookup("fast", update_id=2).data == b"fast."
+    assert prefetcher.lookup("slow", update_id=1, wait=0.5) is None
+    assert "slow" in router.closed
+    assert prefetcher.stats()["cancelled"] == 1
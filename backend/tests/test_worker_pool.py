@@ -0,0 +1,70 @@
+from worker_pool import ProcessAgent
+
+
+class FakeWorker:
+    pid = 1234
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, op, **kwargs):
+        self.sent.append(op)
+
+    def call(self, op, timeout=10.0, **kwargs):
+        self.sent.append(op)
+        return {"type": "reply", "op": op}
+
+
+class FakeSupervisor:
+    def __init__(self):
+        self.released = []
+
+    def acquire(self, owner):
+        return FakeWorker()
+
+    def release(self, worker):
+        self.released.append(worker)
+
+    def stats(self):
+        return {}
+
+
+def test_session_ends_when_the_worker_agent_gives_up():
+    supervisor = FakeSupervisor()
+    agent = ProcessAgent(supervisor, checkpoint_name="test")
+    agent.start("show my grades")
+    worker = agent._worker
+    agent._on_worker_message(worker, {"type": "snapshot", "data": {"running": True, "update_id": 3}})
+    assert agent.running and agent.snapshot()["running"]
+
+    agent._on_worker_message(worker, {"type": "snapshot", "data": {
+        "running": False, "update_id": 4, "relevant_update": "The agent stopped after an error: boom",
+    }})
+    assert not agent.running
+    assert agent.snapshot()["running"] is False
+    assert supervisor.released == [worker]
+    # a new session can start right away
+    agent.start("show my grades")
+    assert agent.running and agent._worker is not worker
+
+
+def test_snapshots_of_a_released_worker_are_ignored():
+    supervisor = FakeSupervisor()
+    agent = ProcessAgent(supervisor, checkpoint_name="test")
+    agent.start("goal")
+    old = agent._worker
+    agent.stop()
+    agent.start("goal")
+    agent._on_worker_message(old, {"type": "snapshot", "data": {"running": False}})
+    assert agent.running
+
+
+def test_capture_requests_are_forwarded_and_released():
+    agent = ProcessAgent(FakeSupervisor(), checkpoint_name="test")
+    agent.start("goal")
+    worker = agent._worker
+    agent.release_capture()  # nothing requested yet
+    agent.request_capture()
+    agent.request_capture()
+    agent.release_capture()
+    assert [op for op in worker.sent if op.endswith("capture")] == ["request_capture", "release_capture"]
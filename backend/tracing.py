@@ -0,0 +1,130 @@
+import contextvars
+import json
+import logging
+import os
+import random
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+
+# Structured logging for the backend.
+#
+# LOG_LEVEL        DEBUG/INFO/WARNING/ERROR (default INFO)
+# LOG_FORMAT       "text" (default) or "json" (one JSON object per line)
+# LOG_SAMPLE_RATE  fraction of sampled hot-path debug events/spans that are
+#                  emitted (default 1.0)
+#
+# Every record carries the trace id of the agent session (or request) that
+# produced it. Hot-path callers must guard expensive formatting with
+# ``logger.isEnabledFor(logging.DEBUG)`` or use ``debug_event``/``span`` so the
+# work is skipped entirely when debug logging is off.
+
+_trace_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("trace_id", default=None)
+_configured = False
+SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def set_trace_id(trace_id: str | None):
+    """Bind ``trace_id`` to the current thread/task context."""
+    _trace_id.set(trace_id)
+
+
+def get_trace_id() -> str | None:
+    return _trace_id.get()
+
+
+class _TraceFilter(logging.Filter):
+    def filter(self, record):
+        record.trace_id = _trace_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id  # type: ignore
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        trace_id = getattr(record, "trace_id", None)
+        fields = getattr(record, "fields", None)
+        if trace_id:
+            line = f"{line} [trace={trace_id}]"
+        if fields:
+            line = f"{line} " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+def configure_logging():
+    global _configured
+    if _configured:
+        return
+    _configured = True
+    handler = logging.StreamHandler(sys.stderr)
+    handler.addFilter(_TraceFilter())
+    if os.getenv("LOG_FORMAT", "text").lower() == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(TextFormatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root = logging.getLogger("emberhacks")
+    root.addHandler(handler)
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    root.propagate = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    configure_logging()
+    return logging.getLogger(f"emberhacks.{name}")
+
+
+def sampled(rate: float | None = None) -> bool:
+    rate = SAMPLE_RATE if rate is None else rate
+    return rate >= 1.0 or random.random() < rate
+
+
+def debug_event(logger: logging.Logger, msg: str, fields_fn=None, rate: float | None = None):
+    """Emit a sampled debug event. ``fields_fn`` builds the (possibly
+    expensive) fields and is only called when the event is emitted."""
+    if not logger.isEnabledFor(logging.DEBUG) or not sampled(rate):
+        return
+    fields = fields_fn() if fields_fn is not None else None
+    logger.debug(msg, extra={"fields": fields} if fields else None)
+
+
+@contextmanager
+def span(logger: logging.Logger, name: str, level: int = logging.DEBUG, **fields):
+    """Time a block and log its duration (sampled; free when disabled)."""
+    if not logger.isEnabledFor(level) or not sampled():
+        yield
+        return
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        fields["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        if error is not None:
+            fields["error"] = str(error)
+        logger.log(level, name, extra={"fields": fields})
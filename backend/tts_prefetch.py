@@ -0,0 +1,173 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from speech_providers import SpeechAudio
+from tracing import get_logger
+
+# Speculative TTS: as soon as the agent publishes a new relevant_update, its
+# audio is synthesized in the background and kept under the update id, so
+# the frontend's /text_to_speech request for that text is answered without a
+# synthesis round trip. A newer update supersedes older ones: queued
+# pre-generations are cancelled, and running ones are streamed so they can
+# stop between chunks (closing the provider's response) and are discarded.
+# Results of superseded runs are only kept if they already finished.
+#
+# TTS_PREFETCH=0 disables it; TTS_PREFETCH_CONCURRENCY caps concurrent
+# syntheses (default 2).
+
+logger = get_logger("tts_prefetch")
+
+DEFAULT_VOICE_ID = "JBFqnCBsd6RMkjVDRZzb"  # George
+
+
+def _key(text: str, voice_id: str, output_format: str | None) -> str:
+    return hashlib.sha1(f"{voice_id}|{output_format or ''}|{text.strip()}".encode()).hexdigest()
+
+
+class _Entry:
+    __slots__ = ("update_id", "done", "cancelled", "audio", "error", "created")
+
+    def __init__(self, update_id: int):
+        self.update_id = update_id
+        self.done = threading.Event()
+        self.cancelled = threading.Event()
+        self.audio: SpeechAudio | None = None
+        self.error: str | None = None
+        self.created = time.monotonic()
+
+
+class SpeechPrefetcher:
+    def __init__(self, router, max_concurrent: int = 2, max_entries: int = 16,
+                 voice_id: str = DEFAULT_VOICE_ID, output_format: str | None = None):
+        self.router = router
+        self.voice_id = voice_id
+        self.output_format = output_format
+        self.max_entries = max_entries
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="tts-prefetch")
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._by_update: dict[int, str] = {}
+        # (future, key, entry) of submitted syntheses
+        self._pending = []
+        self.scheduled = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.failed = 0
+        self.served = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls, router) -> "SpeechPrefetcher | None":
+        if os.getenv("TTS_PREFETCH", "1").lower() in ("0", "false", "no"):
+            return None
+        return cls(router, max_concurrent=int(os.getenv("TTS_PREFETCH_CONCURRENCY", "2")))
+
+    def schedule(self, update_id: int, text: str | None):
+        """Start synthesizing ``text`` for ``update_id`` (supersedes earlier ones)."""
+        text = (text or "").strip()
+        if not text or not any(p.supports("tts") for p in self.router.providers):
+            return
+        key = _key(text, self.voice_id, self.output_format)
+        with self._lock:
+            # drop work for older updates: queued runs never start, running
+            # ones stop at their next chunk
+            for future, old_key, old_entry in self._pending:
+                if old_key == key or future.done():
+                    continue
+                self.cancelled += 1
+                self._entries.pop(old_key, None)
+                old_entry.cancelled.set()
+                if future.cancel():
+                    old_entry.done.set()
+            self._pending = [p for p in self._pending if not p[0].done()]
+            self._by_update[update_id] = key
+            if len(self._by_update) > 4 * self.max_entries:
+                self._by_update = {u: k for u, k in self._by_update.items() if k in self._entries or k == key}
+            if key in self._entries:
+                self._entries[key].update_id = update_id
+                self._entries.move_to_end(key)
+                return
+            entry = _Entry(update_id)
+            self._entries[key] = entry
+            self._trim()
+            self.scheduled += 1
+            future = self._executor.submit(self._run, key, entry, text)
+            self._pending.append((future, key, entry))
+
+    def _run(self, key: str, entry: _Entry, text: str):
+        chunks = None
+        try:
+            mime_type, chunks = self.router.stream(text, self.voice_id, output_format=self.output_format)
+            data = bytearray()
+            for chunk in chunks:
+                if entry.cancelled.is_set():
+                    return
+                data.extend(chunk)
+            if entry.cancelled.is_set():
+                return
+            entry.audio = SpeechAudio(bytes(data), mime_type, "prefetch")
+            with self._lock:
+                self.completed += 1
+        except Exception as e:
+            entry.error = str(e)
+            with self._lock:
+                self.failed += 1
+                self._entries.pop(key, None)
+            logger.warning("speculative text-to-speech failed: %s", e)
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+            entry.done.set()
+
+    def _trim(self):
+        # caller holds self._lock
+        while len(self._entries) > self.max_entries:
+            key, _ = self._entries.popitem(last=False)
+            for uid in [u for u, k in self._by_update.items() if k == key]:
+                del self._by_update[uid]
+
+    def lookup(self, text: str | None = None, voice_id: str | None = None, output_format: str | None = None,
+               update_id: int | None = None, wait: float = 10.0) -> SpeechAudio | None:
+        """Return prefetched audio for ``update_id`` or ``text``, waiting up to
+        ``wait`` seconds for an in-flight synthesis. None on a miss.
+
+        When both are given the update's audio is only served if it was
+        synthesized from ``text``.
+        """
+        voice_id = voice_id or self.voice_id
+        if voice_id != self.voice_id or (output_format or None) != self.output_format:
+            return None
+        text_key = _key(text, voice_id, output_format) if text and text.strip() else None
+        with self._lock:
+            key = self._by_update.get(update_id) if update_id is not None else None
+            if key is None:
+                key = text_key
+            elif text_key is not None and key != text_key:
+                # the update was re-published with different text
+                key = None
+            entry = self._entries.get(key) if key else None
+        if entry is None or not entry.done.wait(wait) or entry.audio is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.served += 1
+        return entry.audio
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "in_flight": sum(1 for p in self._pending if not p[0].done()),
+                "scheduled": self.scheduled,
+                "completed": self.completed,
+                "cancelled": self.cancelled,
+                "failed": self.failed,
+                "served": self.served,
+                "misses": self.misses,
+            }
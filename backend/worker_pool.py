@@ -0,0 +1,550 @@
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+
+from agent_worker import worker_main
+from screencast import Frame
+from tracing import get_logger
+
+# Agent sessions can run in their own worker processes (AGENT_ISOLATION=process)
+# so a crashed or hung Chromium, or a CPU-heavy session, cannot stall the API
+# process. Parent and worker talk over a multiprocessing Pipe using small dict
+# messages:
+#
+#   parent -> worker  {"op": "start" | "command" | "update_goal" | "stop" |
+#                      "publish_answer" | "request_capture" |
+#                      "release_capture" | "shutdown" |
+#                      "ping", "id": n, ...}
+#   worker -> parent  {"type": "reply", "id": n, "op": ..., "error"?: str}
+#                     {"type": "snapshot", "data": AgentRunner.snapshot(debug=True)}
+#                     {"type": "heartbeat", "progress_age": seconds}
+#                     {"type": "frame", "seq", "timestamp", "mime_type", "b64"}
+#                     {"type": "answer", "goal", "finish_text", "summary", "site"}
+#                     {"type": "relevant_update", "update_id", "text"}
+#
+# Snapshots are sent when they change; one with running=False while the
+# session is live means the agent gave up, and the worker is released.
+# Heartbeats come every
+# HEARTBEAT_INTERVAL seconds and carry the agent thread's progress_age, the
+# time it has spent in its current browser step: a worker whose pipe loop is
+# fine but whose Chromium or page call hangs still stops "beating". The
+# start op names the session's checkpoint, so a replacement worker resumes
+# the session it took over. The worker loop itself lives in agent_worker,
+# a module without import-time side effects: spawned workers re-import the
+# parent's __main__, and the entry point must not drag more in.
+
+logger = get_logger("workers")
+
+def tree_rss_bytes(pid: int) -> int | None:
+    """Resident memory of a process and all its descendants (Linux only).
+
+    Chromium runs as children of the worker, so the tree is what matters.
+    """
+    try:
+        page_size = os.sysconf("SC_PAGE_SIZE")
+        children: dict[int, list[int]] = {}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    stat = f.read()
+                ppid = int(stat[stat.rindex(")") + 2:].split()[1])
+                children.setdefault(ppid, []).append(int(entry))
+            except Exception:
+                continue
+        total = 0
+        stack = [pid]
+        while stack:
+            p = stack.pop()
+            try:
+                with open(f"/proc/{p}/statm") as f:
+                    total += int(f.read().split()[1]) * page_size
+            except Exception:
+                pass
+            stack.extend(children.get(p, []))
+        return total
+    except Exception:
+        return None
+
+
+class WorkerHandle:
+    """Parent-side handle for one worker process."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, ctx, screen_width: int, screen_height: int):
+        parent_conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=worker_main, args=(child_conn, screen_width, screen_height), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.sessions_served = 0
+        self.started_at = time.monotonic()
+        self.last_heartbeat = time.monotonic()
+        # ProcessAgent currently bound to this worker (None when idle)
+        self.owner = None
+        self._send_lock = threading.Lock()
+        self._pending: dict[int, list] = {}
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def send(self, op: str, **kwargs) -> int:
+        msg_id = next(self._ids)
+        msg = {"op": op, "id": msg_id}
+        msg.update(kwargs)
+        with self._send_lock:
+            self.conn.send(msg)
+        return msg_id
+
+    def call(self, op: str, timeout: float = 10.0, **kwargs) -> dict:
+        """Send a message and wait for the worker's reply."""
+        done = threading.Event()
+        slot = [done, None]
+        msg_id = next(self._ids)
+        self._pending[msg_id] = slot
+        msg = {"op": op, "id": msg_id}
+        msg.update(kwargs)
+        try:
+            with self._send_lock:
+                self.conn.send(msg)
+            if not done.wait(timeout):
+                raise RuntimeError(f"agent worker did not answer '{op}' within {timeout}s")
+        finally:
+            self._pending.pop(msg_id, None)
+        reply = slot[1] or {}
+        if reply.get("error"):
+            raise RuntimeError(reply["error"])
+        return reply
+
+    def _read_loop(self):
+        while True:
+            try:
+                msg = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            if msg.get("type") == "heartbeat":
+                self.last_heartbeat = time.monotonic() - float(msg.get("progress_age") or 0.0)
+                continue
+            if msg.get("type") == "reply":
+                slot = self._pending.get(msg.get("id"))  # type: ignore
+                if slot is not None:
+                    slot[1] = msg
+                    slot[0].set()
+                continue
+            owner = self.owner
+            if owner is not None:
+                try:
+                    owner._on_worker_message(self, msg)
+                except Exception as e:
+                    logger.warning("failed to handle worker message: %s", e)
+        # worker is gone: fail any callers still waiting for a reply
+        for slot in list(self._pending.values()):
+            slot[1] = {"error": "agent worker exited"}
+            slot[0].set()
+
+    def rss_bytes(self) -> int | None:
+        return tree_rss_bytes(self.pid) if self.pid else None
+
+    def shutdown(self, timeout: float = 5.0):
+        try:
+            self.call("shutdown", timeout=timeout)
+        except Exception:
+            pass
+        self.kill()
+
+    def kill(self):
+        try:
+            self.process.join(timeout=0.5)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join(timeout=2)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join(timeout=2)
+        except Exception:
+            pass
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+
+class AgentSupervisor:
+    """Starts, recycles and restarts agent worker processes.
+
+    - Workers that die, stop heartbeating for ``hang_timeout`` seconds, or
+      whose process tree exceeds ``memory_limit_mb`` are killed; the session
+      bound to them is restarted on a fresh worker.
+    - Workers are retired after ``max_sessions_per_worker`` sessions so leaks
+      in Chromium or the SDKs cannot accumulate.
+    """
+
+    def __init__(self, max_workers: int = 4, max_sessions_per_worker: int = 20, memory_limit_mb: int = 0,
+                 hang_timeout: float = 30.0, check_interval: float = 2.0,
+                 screen_width: int = 1440, screen_height: int = 900):
+        self.max_workers = max_workers
+        self.max_sessions_per_worker = max_sessions_per_worker
+        self.memory_limit_mb = memory_limit_mb
+        self.hang_timeout = hang_timeout
+        self.check_interval = check_interval
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        # spawn (not fork): the API process has threads and must not share
+        # Playwright/gRPC state with workers
+        self._ctx = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._idle: list[WorkerHandle] = []
+        self._busy: list[WorkerHandle] = []
+        self._monitor = None
+        self._closed = False
+        self.workers_started = 0
+        self.restarts = 0
+        self.recycled = 0
+        self.memory_kills = 0
+
+    @classmethod
+    def from_env(cls, screen_width: int = 1440, screen_height: int = 900) -> "AgentSupervisor":
+        return cls(
+            max_workers=int(os.getenv("AGENT_WORKERS", "4")),
+            max_sessions_per_worker=int(os.getenv("AGENT_WORKER_MAX_SESSIONS", "20")),
+            memory_limit_mb=int(os.getenv("AGENT_WORKER_MEMORY_MB", "0")),
+            hang_timeout=float(os.getenv("AGENT_WORKER_HANG_TIMEOUT", "30")),
+            screen_width=screen_width,
+            screen_height=screen_height,
+        )
+
+    def acquire(self, owner) -> WorkerHandle:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("agent supervisor is shut down")
+            handle = None
+            while self._idle:
+                candidate = self._idle.pop()
+                if candidate.alive():
+                    handle = candidate
+                    break
+                candidate.kill()
+            if handle is None:
+                if len(self._busy) >= self.max_workers:
+                    raise RuntimeError("no agent workers available")
+                handle = WorkerHandle(self._ctx, self.screen_width, self.screen_height)
+                self.workers_started += 1
+            handle.owner = owner
+            handle.last_heartbeat = time.monotonic()
+            self._busy.append(handle)
+            if self._monitor is None:
+                self._monitor = threading.Thread(target=self._monitor_loop, daemon=True)
+                self._monitor.start()
+            return handle
+
+    def release(self, handle: WorkerHandle):
+        """Return a worker after its session stopped; recycle it if it is worn out."""
+        with self._lock:
+            if handle in self._busy:
+                self._busy.remove(handle)
+            handle.owner = None
+            handle.sessions_served += 1
+            retire = handle.sessions_served >= self.max_sessions_per_worker or not handle.alive()
+            if not retire:
+                self._idle.append(handle)
+        if retire:
+            self.recycled += 1
+            threading.Thread(target=handle.shutdown, daemon=True).start()
+
+    def _unhealthy_reason(self, handle: WorkerHandle) -> str | None:
+        if not handle.alive():
+            return f"worker exited with code {handle.process.exitcode}"
+        if time.monotonic() - handle.last_heartbeat > self.hang_timeout:
+            return f"worker unresponsive for {self.hang_timeout:.0f}s"
+        if self.memory_limit_mb:
+            rss = handle.rss_bytes()
+            if rss is not None and rss > self.memory_limit_mb * 1024 * 1024:
+                self.memory_kills += 1
+                return f"worker exceeded memory limit ({rss // (1024 * 1024)} MB > {self.memory_limit_mb} MB)"
+        return None
+
+    def _monitor_loop(self):
+        while not self._closed:
+            time.sleep(self.check_interval)
+            with self._lock:
+                handles = list(self._busy) + list(self._idle)
+            for handle in handles:
+                reason = self._unhealthy_reason(handle)
+                if reason is None:
+                    continue
+                logger.warning("agent worker %s: %s; restarting", handle.pid, reason)
+                handle.kill()
+                with self._lock:
+                    owner = handle.owner
+                    if handle in self._busy:
+                        self._busy.remove(handle)
+                    if handle in self._idle:
+                        self._idle.remove(handle)
+                    handle.owner = None
+                if owner is not None:
+                    self.restarts += 1
+                    try:
+                        owner._on_worker_lost(reason)
+                    except Exception as e:
+                        logger.error("failed to restart agent session: %s", e)
+
+    def stats(self) -> dict:
+        with self._lock:
+            workers = [
+                {
+                    "pid": h.pid,
+                    "busy": h in self._busy,
+                    "sessions_served": h.sessions_served,
+                    "uptime": round(time.monotonic() - h.started_at, 1),
+                    "rss_mb": (lambda r: round(r / (1024 * 1024), 1) if r is not None else None)(h.rss_bytes()),
+                }
+                for h in self._busy + self._idle
+            ]
+        return {
+            "workers": workers,
+            "workers_started": self.workers_started,
+            "restarts": self.restarts,
+            "recycled": self.recycled,
+            "memory_kills": self.memory_kills,
+        }
+
+    def shutdown(self):
+        self._closed = True
+        with self._lock:
+            handles = self._busy + self._idle
+            self._busy, self._idle = [], []
+        for handle in handles:
+            handle.shutdown()
+
+
+class ProcessAgent:
+    """AgentRunner-compatible facade for a session running in a worker process.
+
+    State is served from the latest snapshot the worker pushed, so API reads
+    never block on the worker.
+    """
+
+    def __init__(self, supervisor: AgentSupervisor, checkpoint_name: str | None = None):
+        self.supervisor = supervisor
+        # checkpoints of this session, whichever worker runs it
+        self.checkpoint_name = checkpoint_name or f"session-{uuid.uuid4().hex[:8]}"
+        self._worker: WorkerHandle | None = None
+        self._lock = threading.Lock()
+        self._snapshot: dict = {}
+        # update_id keeps increasing across worker restarts
+        self._update_base = 0
+        self._frame_listeners = []
+        self._answer_listeners = []
+        self._update_listeners = []
+        self._capture_requested = False
+        self._goal: str | None = None
+        self._site: str | None = None
+        self.running = False
+        self.worker_restarts = 0
+
+    # -- AgentRunner-like interface -------------------------------------
+
+    @property
+    def update_id(self) -> int:
+        return self._update_base + int(self._snapshot.get("update_id") or 0)
+
+    @property
+    def current_goal(self):
+        return self._snapshot.get("current_goal", self._goal)
+
+    @property
+    def goals_history(self):
+        return self._snapshot.get("goals_history", [])
+
+    @property
+    def relevant_update(self):
+        return self._snapshot.get("relevant_update")
+
+    @property
+    def last_results(self):
+        return self._snapshot.get("last_results", [])
+
+    def start(self, initial_goal: str | None = None, resume: bool = False, site: str | None = None):
+        with self._lock:
+            if self.running:
+                raise RuntimeError("Agent already running")
+            self._goal = initial_goal
+            self._site = site
+            self._start_worker(resume=resume)
+            self.running = True
+
+    def _start_worker(self, resume: bool = False):
+        # caller holds self._lock
+        worker = self.supervisor.acquire(self)
+        try:
+            if self._capture_requested:
+                worker.send("request_capture")
+            worker.call("start", goal=self._goal, site=self._site, resume=resume, checkpoint=self.checkpoint_name)
+        except Exception:
+            self.supervisor.release(worker)
+            raise
+        self._worker = worker
+
+    def stop(self):
+        with self._lock:
+            worker, self._worker = self._worker, None
+            self.running = False
+        if worker is not None:
+            try:
+                worker.call("stop", timeout=15)
+            except Exception as e:
+                logger.warning("agent worker did not stop cleanly: %s", e)
+            self.supervisor.release(worker)
+        self._snapshot = dict(self._snapshot, running=False)
+
+    def enqueue_command(self, cmd: str):
+        worker = self._worker
+        if worker is not None:
+            worker.send("command", text=cmd)
+
+    def update_goal(self, new_goal: str, site: str | None = None):
+        self._goal = new_goal
+        self._site = site
+        worker = self._worker
+        if worker is not None:
+            worker.send("update_goal", goal=new_goal, site=site)
+
+    def add_frame_listener(self, fn):
+        self._frame_listeners.append(fn)
+
+    def add_answer_listener(self, fn):
+        self._answer_listeners.append(fn)
+
+    def add_update_listener(self, fn):
+        self._update_listeners.append(fn)
+
+    def _notify_update(self, update_id: int, text: str):
+        for fn in list(self._update_listeners):
+            try:
+                fn(update_id, text)
+            except Exception as e:
+                logger.warning("update listener failed: %s", e)
+
+    def publish_answer(self, goal: str, answer: str):
+        self._goal = goal
+        worker = self._worker
+        if worker is not None:
+            worker.send("publish_answer", goal=goal, answer=answer)
+            return
+        # no session: show the answer from the facade's own state
+        with self._lock:
+            history = list(self._snapshot.get("goals_history", []))
+            prev = self._snapshot.get("current_goal")
+            if prev and prev != goal:
+                history.append(prev)
+            self._update_base = self.update_id + 1
+            self._snapshot = dict(
+                self._snapshot, update_id=0, current_goal=goal, goals_history=history[-20:], relevant_update=answer
+            )
+            update_id = self.update_id
+        self._notify_update(update_id, answer)
+
+    def request_capture(self):
+        if self._capture_requested:
+            return
+        self._capture_requested = True
+        worker = self._worker
+        if worker is not None:
+            worker.send("request_capture")
+
+    def release_capture(self):
+        if not self._capture_requested:
+            return
+        self._capture_requested = False
+        worker = self._worker
+        if worker is not None:
+            worker.send("release_capture")
+
+    def snapshot(self, debug: bool = False) -> dict:
+        snap = dict(self._snapshot)
+        snap["running"] = self.running
+        snap["update_id"] = self.update_id
+        snap.setdefault("current_goal", self._goal)
+        if not debug:
+            for key in ("thread_alive", "contents_len", "contents_preview", "frame_capture", "browser", "images",
+                        "fast_render", "loop_detector", "models", "checkpoint", "page_url"):
+                snap.pop(key, None)
+            return snap
+        worker = self._worker
+        snap["worker"] = {"pid": worker.pid if worker else None, "restarts": self.worker_restarts}
+        snap["supervisor"] = self.supervisor.stats()
+        return snap
+
+    # -- worker callbacks (reader / monitor threads) --------------------
+
+    def _on_worker_message(self, worker: WorkerHandle, msg: dict):
+        if worker is not self._worker:
+            return
+        kind = msg.get("type")
+        if kind == "snapshot":
+            data = msg.get("data") or {}
+            if data.get("current_goal"):
+                self._goal = data["current_goal"]
+            # keep a restart notice visible until the new worker has news
+            if data.get("relevant_update") is None and self._snapshot.get("relevant_update"):
+                data["relevant_update"] = self._snapshot["relevant_update"]
+            self._snapshot = data
+            if data.get("running") is False:
+                self._on_session_ended(worker)
+        elif kind == "answer":
+            for fn in list(self._answer_listeners):
+                try:
+                    fn(msg.get("goal"), msg.get("finish_text"), msg.get("summary"), msg.get("site"))
+                except Exception as e:
+                    logger.warning("answer listener failed: %s", e)
+        elif kind == "relevant_update":
+            # worker ids are relative to this session's base
+            self._notify_update(self._update_base + int(msg.get("update_id") or 0), msg.get("text") or "")
+        elif kind == "frame":
+            frame = Frame(msg["seq"], msg["timestamp"], msg["mime_type"], msg["b64"])
+            for fn in list(self._frame_listeners):
+                try:
+                    fn(frame)
+                except Exception:
+                    pass
+
+    def _on_session_ended(self, worker: WorkerHandle):
+        # The worker's agent gave up on its own (recoveries exhausted or a
+        # fatal error) and its thread has exited: end the session like thread
+        # mode does and hand the worker back for the next start.
+        with self._lock:
+            if worker is not self._worker or not self.running:
+                return
+            self._worker = None
+            self.running = False
+        logger.warning("agent session ended in worker %s", worker.pid)
+        self.supervisor.release(worker)
+
+    def _on_worker_lost(self, reason: str):
+        with self._lock:
+            self._update_base = self.update_id + 1
+            self._worker = None
+            notice = f"Agent worker restarted ({reason})."
+            self._snapshot = dict(self._snapshot, update_id=0, relevant_update=notice)
+            if not self.running:
+                return
+            self.worker_restarts += 1
+            try:
+                # continue from the session's last checkpoint, if any
+                self._start_worker(resume=True)
+            except Exception as e:
+                self.running = False
+                self._snapshot = dict(self._snapshot, relevant_update=f"Agent worker could not be restarted: {e}")